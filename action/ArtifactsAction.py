@@ -0,0 +1,151 @@
+"""
+This module contains actions related to the catalog of artifacts produced by MTH.
+"""
+
+import framework.utils.argparsing.completion as completion
+from framework.classes.RecordWriter import RecordWriter
+from action.ActionFactory import ActionFactory
+from dateutil import parser as date_parser
+import framework.utils.catalog as catalog
+import argparse
+import logging
+import time
+import sys
+import re
+
+log = logging.getLogger("action")
+
+# relative time, e.g. "7d", "12h" or "30m"
+AGE_REGEX = re.compile(r"^(\d+)([dhm])$")
+AGE_UNITS = {"d": 24 * 60 * 60, "h": 60 * 60, "m": 60}
+
+
+class ArtifactsAction(object):
+    """
+    Actions for catalog of artifacts.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "artifacts"
+        help = "Find screenshots, videos, logs and bundles produced by MTH"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        subparsers = parser.add_subparsers(title="Artifacts actions",
+                                           dest="artifacts",
+                                           help="List of available actions for artifacts")
+
+        parser = subparsers.add_parser("query", help="Find artifacts in catalog, the newest first")
+        ArtifactsAction._init_query_parser(parser)
+
+        subparsers.add_parser("prune", help="Remove artifacts whose files don't exist anymore from catalog")
+
+    def __call__(self, **kwargs):
+        subaction = kwargs[ArtifactsAction.Meta.action]
+        del kwargs[ArtifactsAction.Meta.action]
+
+        if subaction == "query":
+            ArtifactsAction._query(**kwargs)
+        elif subaction == "prune":
+            log.info("Removed {0} missing artifacts from catalog".format(catalog.prune()))
+        else:
+            log.error("Unknown subcommand given: '{0}'".format(subaction))
+            sys.exit(1)
+
+    @staticmethod
+    def _init_query_parser(parser):
+        parser.add_argument("-d", "--device",
+                            help="Optional, Device artifacts are produced from",
+                            default=None).completer = completion.all_devices
+        parser.add_argument("-p", "--platform",
+                            help="Optional, Platform of device",
+                            choices=("android", "ios"),
+                            default=None)
+        parser.add_argument("--model",
+                            help="Optional, Model of device, e.g. 'Nexus 5'",
+                            default=None)
+        parser.add_argument("--locale",
+                            help="Optional, Locale of device, e.g. ru-RU",
+                            default=None).completer = completion.supported_locales
+        parser.add_argument("-a", "--action",
+                            help="Optional, Action which produced artifacts",
+                            dest="producer",
+                            choices=("screenshot", "video", "logging", "bundle"),
+                            default=None)
+        parser.add_argument("-k", "--kind",
+                            help="Optional, Kind of artifacts",
+                            choices=sorted(set(catalog.KINDS.values())),
+                            default=None)
+        parser.add_argument("--since",
+                            help="Optional, The earliest time of artifacts, date (e.g. 2018-03-12) or age (e.g. 7d, "
+                                 "12h, 30m)",
+                            type=_parse_time,
+                            default=None)
+        parser.add_argument("--until",
+                            help="Optional, The latest time of artifacts, date or age",
+                            type=_parse_time,
+                            default=None)
+        parser.add_argument("-n", "--limit",
+                            help="Optional, Maximum number of artifacts to show, by default all",
+                            type=int,
+                            default=None)
+        parser.add_argument("-f", "--format",
+                            help="Optional, Output format, by default table",
+                            dest="output_format",
+                            choices=RecordWriter.formats,
+                            default="table")
+
+    @staticmethod
+    def _query(device, platform, model, locale, producer, kind, since, until, limit, output_format):
+        """
+        Prints artifacts matching all given conditions.
+
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param platform: string, "android" or "ios".
+        :param model: string, device model, e.g. "Nexus 5".
+        :param locale: string, device locale, e.g. "ru-RU".
+        :param producer: string, action which produced artifacts, e.g. "screenshot".
+        :param kind: string, kind of artifacts, e.g. "video".
+        :param since: int, the earliest time of artifacts, milliseconds since epoch.
+        :param until: int, the latest time of artifacts, milliseconds since epoch.
+        :param limit: int, maximum number of artifacts to show.
+        :param output_format: string, output format: "ndjson", "csv" or "table".
+        """
+        artifacts = catalog.query(since, until, limit, device=device, platform=platform, model=model, locale=locale,
+                                  action=producer, kind=kind)
+        if not artifacts:
+            log.info("No artifacts found")
+            return
+        writer = RecordWriter(output_format, catalog.COLUMNS)
+        try:
+            for artifact in artifacts:
+                if output_format == "table":
+                    artifact["created"] = time.strftime("%Y-%m-%d %H:%M:%S",
+                                                        time.localtime(artifact["created"] / 1000.0))
+                writer.write(artifact)
+        finally:
+            writer.close()
+
+
+def _parse_time(given_time):
+    """
+    :param given_time: string, date (e.g. "2018-03-12 10:00") or age (e.g. "7d").
+    :returns int: time, milliseconds since epoch.
+    """
+    match = AGE_REGEX.match(given_time)
+    if match:
+        return int((time.time() - int(match.group(1)) * AGE_UNITS[match.group(2)]) * 1000)
+    try:
+        return int(time.mktime(date_parser.parse(given_time).timetuple()) * 1000)
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError("Invalid time given: " + given_time)
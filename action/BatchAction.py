@@ -0,0 +1,111 @@
+"""
+This module contains actions related to executing many actions in one mth process.
+"""
+
+import framework.utils.argparsing.types as types
+from action.ActionFactory import ActionFactory
+import framework.utils.discovery as discovery
+import framework.utils.sessions as sessions
+import logging
+import shlex
+import time
+import sys
+
+log = logging.getLogger("action")
+
+
+class BatchAction(object):
+    """
+    Action to execute a script of actions.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "batch"
+        help = "Execute actions listed in file (one per line, as they are given to mth) in a single process"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("script",
+                            help="File with actions, one per line, e.g. 'screenshot --device TA9890AMTG', "
+                                 "'-' to read from stdin",
+                            type=types.existent_file_or_stdin)
+        parser.add_argument("-k", "--keep-going",
+                            help="Optional, Continue with the next line when some line fails, by default stop",
+                            action="store_true",
+                            default=False)
+
+    def __call__(self, script, keep_going):
+        """
+        Executes actions from the given script one by one. Device discovery and shell sessions to devices are shared
+        by all lines.
+
+        :param script: string, path to script file or "-" for stdin.
+        :param keep_going: boolean, True to continue after failed line, otherwise stop with its exit code.
+        """
+        # command line imports all actions including this one, so it is imported only when batch is executed
+        import framework.utils.cli as cli
+
+        own_discovery = not discovery.is_enabled()
+        own_sessions = not sessions.is_enabled()
+        if own_discovery:
+            discovery.enable()
+        if own_sessions:
+            sessions.enable()
+        script_file = sys.stdin if script == "-" else open(script)
+        failed = executed = 0
+        started = time.time()
+        try:
+            for number, line in enumerate(script_file, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                executed += 1
+                line_started = time.time()
+                code = BatchAction._execute_line(cli, line)
+                elapsed = time.time() - line_started
+                if code:
+                    failed += 1
+                    log.error("Line {0} '{1}' failed with code {2} in {3:.2f}s".format(number, line, code, elapsed))
+                    if not keep_going:
+                        sys.exit(code)
+                else:
+                    log.info("Line {0} '{1}' done in {2:.2f}s".format(number, line, elapsed))
+        finally:
+            if script_file is not sys.stdin:
+                script_file.close()
+            if own_sessions:
+                sessions.disable()
+            if own_discovery:
+                discovery.disable()
+        log.info("Executed {0} lines in {1:.2f}s, {2} failed".format(executed, time.time() - started, failed))
+        if failed:
+            sys.exit(1)
+
+    @staticmethod
+    def _execute_line(cli, line):
+        """
+        Parses and executes single line of script.
+
+        :param cli: module framework.utils.cli.
+        :param line: string, action with arguments, e.g. "screenshot --device TA9890AMTG".
+        :returns int: exit code, 0 if action succeeded.
+        """
+        try:
+            # parser is created per line because defaults depend on devices connected at the moment
+            cli.execute(cli.create_parser().parse_args(shlex.split(line)))
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            log.exception("Execution failed for '{0}'".format(line))
+            return 1
+        return 0
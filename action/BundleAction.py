@@ -0,0 +1,197 @@
+"""
+This module contains actions related to collecting everything needed for a bug report into one archive.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from framework.classes.ScreenshotArchive import ScreenshotArchive
+from action.ActionFactory import ActionFactory
+from collections import OrderedDict
+import framework.utils.properties as properties
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+import framework.utils.catalog as catalog
+import framework.utils.ios as ios
+import tempfile
+import logging
+import shutil
+import json
+import time
+import sys
+import os
+
+log = logging.getLogger("action")
+
+MANIFEST_NAME = "manifest.json"
+
+# device properties saved to "device.json" of Android devices
+ANDROID_INFO = ("manufacturer", "model", "os_version", "sdk_version", "locale", "resolution", "cpu_frequency",
+                "ram_size", "ip_address", "boot_id")
+
+
+class BundleAction(object):
+    """
+    Action to collect bug report bundle.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "bundle"
+        help = "Collect device info, log, screenshot and optionally video of devices into one archive"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to collect bundle from, by default all connected devices",
+                            type=types.connected_device,
+                            nargs="+",
+                            default=None).completer = completion.all_devices
+        parser.add_argument("--video",
+                            help="Optional, Record video of Android devices for the given number of seconds, "
+                                 "by default no video",
+                            metavar="SECONDS",
+                            type=int,
+                            default=0)
+        parser.add_argument("--log-seconds",
+                            help="Optional, How long to capture syslog of iOS devices, it can't be read back as "
+                                 "logcat, by default 5",
+                            type=float,
+                            default=5.0)
+        parser.add_argument("--archive",
+                            help="Optional, Archive format, by default zip",
+                            choices=ScreenshotArchive.formats,
+                            default="zip")
+        parser.add_argument("-j", "--jobs",
+                            help="Optional, How many collectors to run at the same time, by default 16",
+                            type=int,
+                            default=16)
+
+    def __call__(self, devices, video, log_seconds, archive, jobs):
+        """
+        Collects bundle of the given devices. All collectors of all devices run at the same time, so the bundle takes
+        as long as the slowest collector (e.g. video) rather than all of them one after another. Every file is moved
+        into the archive as soon as it is collected, and the manifest lists what was collected, when and how long it
+        took, including collectors which failed.
+
+        :param devices: list, device identifiers (e.g. "TA9890AMTG"), None for all connected devices.
+        :param video: int, duration of video to record from Android devices, seconds, 0 for no video.
+        :param log_seconds: float, how long to capture syslog of iOS devices, seconds.
+        :param archive: string, "zip" or "tar".
+        :param jobs: int, how many collectors to run concurrently.
+        """
+        android_devices = android.list_devices()
+        ios_devices = ios.list_devices()
+        if devices:
+            for device in set(devices) - set(android_devices + ios_devices):
+                log.error("Unknown device given: '{0}'".format(device))
+                sys.exit(1)
+        targets = [(device, "android") for device in android_devices if not devices or device in devices]
+        targets += [(device, "ios") for device in ios_devices if not devices or device in devices]
+        if not targets:
+            log.error("No connected devices to collect bundle from")
+            sys.exit(1)
+
+        collectors = ["info", "log", "screenshot"] + (["video"] if video else [])
+        tasks = [(device, platform, kind) for device, platform in targets for kind in collectors
+                 if kind != "video" or platform == "android"]
+        if video and any(platform == "ios" for _, platform in targets):
+            log.warning("Video is recorded from Android devices only")
+
+        created = int(time.time() * 1000)
+        bundle = ScreenshotArchive(os.path.join(os.getcwd(), "bundle_{0}.{1}".format(created, archive)), archive)
+        temp_dir = tempfile.mkdtemp(prefix="mth")
+        options = {"video": video, "log_seconds": log_seconds}
+        manifest = OrderedDict((("created", created), ("devices", OrderedDict(
+            (device, {"platform": platform, "items": []}) for device, platform in targets))))
+        try:
+            for device, item, path in parallel.imap_unordered(
+                    lambda task: BundleAction._collect(task[0], task[1], task[2], temp_dir, options), tasks, jobs):
+                if path:
+                    bundle.add(path, item["name"])
+                    log.info("Collected {0} of device '{1}' in {2:.2f}s".format(item["kind"], device, item["elapsed"]))
+                else:
+                    log.warning("Failed to collect {0} of device '{1}': {2}".format(item["kind"], device,
+                                                                                    item["error"]))
+                manifest["devices"][device]["items"].append(item)
+            manifest["elapsed"] = round(time.time() - created / 1000.0, 3)
+            manifest_path = os.path.join(temp_dir, MANIFEST_NAME)
+            with open(manifest_path, "w") as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+            bundle.add(manifest_path, MANIFEST_NAME)
+        finally:
+            bundle.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        catalog.add([catalog.artifact(bundle.path, "bundle", device, platform, **catalog.describe(device, platform))
+                     for device, platform in targets])
+        log.info("Collected bundle of {0} devices in {1:.2f}s".format(len(targets), manifest["elapsed"]))
+        log.info("Find result at " + bundle.path)
+
+    @staticmethod
+    def _collect(device, platform, kind, temp_dir, options):
+        """
+        Runs one collector, its failure doesn't stop the others.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param platform: string, "android" or "ios".
+        :param kind: string, "info", "log", "screenshot" or "video".
+        :param temp_dir: string, directory to collect files into before they are archived.
+        :param options: dict, "video" duration and "log_seconds" of iOS syslog.
+        :returns tuple: device identifier, manifest item and path to collected file (None if collector failed).
+        """
+        file_names = {"info": "device.json", "log": "log.txt", "screenshot": "screenshot.png", "video": "video.mp4"}
+        # device identifiers of network devices have colons, they are not welcome in file names
+        name = "{0}/{1}".format(device.replace(":", "_"), file_names[kind])
+        path = os.path.join(temp_dir, name.replace("/", "_"))
+        started = time.time()
+        item = OrderedDict((("kind", kind), ("name", name), ("started", int(started * 1000))))
+        try:
+            if kind == "info":
+                BundleAction._save_info(device, platform, path)
+            elif kind == "log" and platform == "android":
+                android.dump_log(device, path)
+            elif kind == "log":
+                ios.dump_log(device, path, options["log_seconds"])
+            elif kind == "screenshot" and platform == "android":
+                android.capture_screen(device, path)
+            elif kind == "screenshot":
+                ios.take_screenshot(device, temp_dir, os.path.basename(path))
+            else:
+                device_path = android.record_video(device, options["video"])
+                android.download_file(device, device_path, path)
+                android.remove_file(device, device_path)
+            item["size"] = os.path.getsize(path)
+        except SystemExit as e:
+            # the failed command is logged by console
+            item["error"] = "exited with code {0}".format(e.code)
+            path = None
+        except Exception as e:
+            item["error"] = str(e) or type(e).__name__
+            path = None
+        item["elapsed"] = round(time.time() - started, 3)
+        return device, item, path
+
+    @staticmethod
+    def _save_info(device, platform, path):
+        """
+        Saves device info.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param platform: string, "android" or "ios".
+        :param path: string, path to save info to.
+        """
+        if platform == "android":
+            info = properties.get(device, *ANDROID_INFO)
+        else:
+            info = ios.get_info(device, refresh=True)
+        with open(path, "w") as info_file:
+            json.dump(OrderedDict((("serial", device), ("platform", platform), ("info", info))), info_file, indent=2,
+                      default=str)
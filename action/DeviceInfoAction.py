@@ -3,16 +3,50 @@ This module contains actions related to getting info about connected mobile devi
 """
 
 import framework.utils.argparsing.completion as completion
-import framework.utils.argparsing.defaults as defaults
 import framework.utils.argparsing.types as types
+from framework.classes.RecordWriter import RecordWriter
 from action.ActionFactory import ActionFactory
+import framework.utils.discovery as discovery
+import framework.utils.properties as properties
+import framework.utils.parallel as parallel
 import framework.utils.android as android
+import framework.utils.console as console
+import framework.utils.facts as facts
 import framework.utils.ios as ios
+import threading
 import logging
+import Queue
 import sys
 
 log = logging.getLogger("action")
 
+# how often devices of platforms without attach/detach events are looked up while watching, seconds
+WATCH_INTERVAL = 1.0
+
+# name, group, iOS getter (None if not available for the platform), Android fields are device properties of the same
+# name, so all of them are queried at once
+FIELDS = (
+    ("manufacturer", "identity", lambda device: "Apple"),
+    ("model", "identity", ios.get_device_model),
+    ("os_version", "software", ios.get_ios_version),
+    ("cpu_frequency", "hardware", None),
+    ("ram_size", "hardware", None),
+    ("resolution", "hardware", None),
+    ("sdk_version", "hardware", None),
+)
+
+# facts which never change for a device between reboots, so they are served from the cache
+ANDROID_STATIC_FACTS = ("manufacturer", "model", "os_version", "cpu_frequency", "ram_size", "resolution",
+                        "sdk_version")
+
+TEXT_LABELS = {
+    "os_version": "{platform} version: {0}",
+    "cpu_frequency": "CPU frequency: {0}GHz",
+    "ram_size": "RAM size: {0}GB",
+    "resolution": "Screen resolution: {0}",
+    "sdk_version": "SDK version: {0}",
+}
+
 
 class DeviceInfoAction(object):
     """
@@ -38,7 +72,7 @@ class DeviceInfoAction(object):
         parser.add_argument("-d", "--device",
                             help="Optional, Device to get info, by default all connected devices",
                             type=types.connected_device,
-                            default=defaults.connected_device()).completer = completion.all_devices
+                            default=None).completer = completion.all_devices
         parser.add_argument("-p", "--platform",
                             help="Optional, Platform (android or ios) to get info, by default all platforms",
                             type=types.supported_platform,
@@ -51,41 +85,245 @@ class DeviceInfoAction(object):
                             help="Optional, If only software info is needed, by default all info",
                             action="store_true",
                             default=False)
+        parser.add_argument("--refresh",
+                            help="Optional, Re-query all info bypassing the device facts cache",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("--prune-cache",
+                            help="Optional, Remove cached device facts not updated for the given number of days",
+                            metavar="DAYS",
+                            type=int,
+                            default=None)
+        parser.add_argument("-f", "--format",
+                            help="Optional, Output format, by default human-readable text",
+                            dest="output_format",
+                            choices=("text",) + RecordWriter.formats,
+                            default="text")
+        parser.add_argument("--fields",
+                            help="Optional, Fields to query, by default all fields of the chosen info (hw/sw)",
+                            choices=[name for name, _, _ in FIELDS],
+                            nargs="+",
+                            default=None)
+        parser.add_argument("-j", "--jobs",
+                            help="Optional, How many devices to query at the same time, by default 8",
+                            type=int,
+                            default=8)
+        parser.add_argument("-w", "--watch",
+                            help="Optional, Keep running and print devices as they are attached or detached, "
+                                 "till Ctrl+C is pressed",
+                            action="store_true",
+                            default=False)
 
-    def __call__(self, device, platform, hardware, software):
+    def __call__(self, device, platform, hardware, software, refresh, prune_cache, output_format, fields, jobs, watch):
         """
-        Prints info for the given device or for all (if device is not specified).
+        Prints info for the given device or for all (if device is not specified). Every device is printed as soon as
+        its info is queried, so large fleets are streamed rather than printed at the end.
 
         :param device: string, device identifier (e.g. "TA9890AMTG").
         :param hardware: boolean, True if only hardware info is needed, otherwise False.
         :param software: boolean, True if only software info is needed, otherwise False.
+        :param refresh: boolean, True to re-query cached facts from devices, otherwise False.
+        :param prune_cache: int, if given, removes cached facts older than this number of days and exits.
+        :param output_format: string, output format: "text", "ndjson", "csv" or "table".
+        :param fields: list, names of fields to query, by default all fields.
+        :param jobs: int, how many devices to query concurrently.
+        :param watch: boolean, True to keep printing attached and detached devices, otherwise False.
+        """
+        if prune_cache is not None:
+            log.info("Removed {0} stale device facts entries".format(facts.prune(prune_cache)))
+            return
+
+        events = Queue.Queue()
+        arrived = threading.Event()
+        # the watcher is started first, so a device attached while the initial list is printed is reported as attached
+        unsubscribe = DeviceInfoAction._subscribe(device, platform, events, arrived) if watch else None
+        try:
+            DeviceInfoAction._show(device, platform, hardware, software, refresh, output_format, fields, jobs, watch,
+                                   events, arrived)
+        finally:
+            if unsubscribe:
+                unsubscribe()
+
+    @staticmethod
+    def _show(device, platform, hardware, software, refresh, output_format, fields, jobs, watch, events, arrived):
+        """
+        Prints info for the given device or for all, then watches devices if it's asked, see __call__.
+
+        :param events: Queue.Queue, device events to print while watching.
+        :param arrived: threading.Event, set when an event is put into the queue.
         """
         android_devices = android.list_devices()
         ios_devices = ios.list_devices()
-        if device is None:
-            devices = android_devices + ios_devices
-            if not devices:
-                log.error("No connected devices")
-                sys.exit(1)
+        if device is not None:
+            android_devices = [device] if device in android_devices else []
+            ios_devices = [device] if device in ios_devices else []
+        if platform and platform != "android":
+            android_devices = []
+        if platform and platform != "ios":
+            ios_devices = []
+        targets = [(serial, "android") for serial in android_devices] + [(serial, "ios") for serial in ios_devices]
+        if not targets and not watch:
+            log.error("No connected devices")
+            sys.exit(1)
 
         show_hardware = hardware or (not hardware and not software)
         show_software = software or (not hardware and not software)
+        groups = ["identity"] + (["hardware"] if show_hardware else []) + (["software"] if show_software else [])
+        names = [name for name, group, _ in FIELDS if group in groups and (not fields or name in fields)]
+
+        columns = (["event"] if watch else []) + ["serial", "platform"] + names
+        writer = None if output_format == "text" else RecordWriter(output_format, columns)
+        records = parallel.imap_unordered(lambda target: DeviceInfoAction._get_record(target[0], target[1], names,
+                                                                                      refresh), targets, jobs)
+        try:
+            for record in records:
+                if watch:
+                    record["event"] = "present"
+                DeviceInfoAction._write_record(record, writer)
+            if watch:
+                DeviceInfoAction._watch(names, writer, events, arrived, set(targets))
+        finally:
+            if writer:
+                writer.close()
+
+    @staticmethod
+    def _subscribe(device, platform, events, arrived):
+        """
+        Starts watching attach/detach events of devices, unless they are watched already (e.g. by MTH server).
+
+        :param device: string, device identifier to watch (e.g. "TA9890AMTG"), None for all devices.
+        :param platform: string, platform to watch ("android" or "ios"), None for all platforms.
+        :param events: Queue.Queue, queue to put tuples of event, platform and device into.
+        :param arrived: threading.Event, event to set when an event is put into the queue.
+        :returns function: function without arguments to stop watching.
+        """
+        def on_event(event, event_platform, serial):
+            if (device is None or serial == device) and (platform is None or event_platform == platform):
+                events.put((event, event_platform, serial))
+                arrived.set()
+
+        own_discovery = not discovery.is_enabled()
+        own_watcher = not discovery.is_watching()
+        discovery.subscribe(on_event)
+        if own_watcher:
+            discovery.watch()
+        discovery.wait_tracked()
+
+        def unsubscribe():
+            discovery.unsubscribe(on_event)
+            if own_watcher:
+                discovery.unwatch()
+            if own_discovery:
+                discovery.disable()
 
-        for device in android_devices:
-            if platform and platform != "android":
-                break
-            log.info("\nAndroid device: {0} ({1} {2})".format(device, android.get_manufacturer(device),
-                                                              android.get_device_model(device)))
-            if show_software:
-                log.info("Android version: {0}".format(android.get_android_version(device)))
-            if show_hardware:
-                log.info("CPU frequency: {0}GHz".format(android.get_cpu_frequency(device)))
-                log.info("RAM size: {0}GB".format(android.get_ram_size(device)))
-                log.info("Screen resolution: {0}".format(android.get_resolution(device)))
-                log.info("SDK version: {0}".format(android.get_sdk_version(device)))
-                # log.info("IP address: {0}".format(android.get_ip_address(device)))
-
-        for device in ios_devices:
-            if platform and platform != "ios":
-                break
-            log.info("\niOS device: {0} ({1})".format(device, ios.get_device_model(device)))
+        return unsubscribe
+
+    @staticmethod
+    def _watch(names, writer, events, arrived, present):
+        """
+        Prints devices as they are attached or detached till Ctrl+C is pressed. Attached devices are printed with the
+        requested info, detached ones only with serial and platform.
+
+        :param names: list, names of fields to query for attached devices.
+        :param writer: RecordWriter, writer to print records with, None to print text.
+        :param events: Queue.Queue, device events, see _subscribe.
+        :param arrived: threading.Event, set when an event is put into the queue.
+        :param present: set, tuples of device and platform printed already, events which repeat them are skipped (e.g.
+        device was attached right before the initial list was taken).
+        """
+        log.info("Watching devices... To finish press Ctrl+C")
+        try:
+            while True:
+                # devices of platforms without events (e.g. of other adb servers) are looked up when the table expires
+                listers = [lister for name, lister in (("android", android.list_devices), ("ios", ios.list_devices))
+                           if not discovery.is_tracked(name)]
+                if not console.wait(arrived, WATCH_INTERVAL if listers else None):
+                    for lister in listers:
+                        lister()
+                arrived.clear()
+                while not events.empty():
+                    event, event_platform, serial = events.get()
+                    if (event == "attach") == ((serial, event_platform) in present):
+                        continue
+                    if event == "attach":
+                        present.add((serial, event_platform))
+                        record = DeviceInfoAction._get_record(serial, event_platform, names)
+                    else:
+                        present.discard((serial, event_platform))
+                        record = {"serial": serial, "platform": event_platform}
+                    record["event"] = event
+                    DeviceInfoAction._write_record(record, writer)
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    def _write_record(record, writer):
+        """
+        Prints the given device record with writer or as human-readable text.
+
+        :param record: dict, device record.
+        :param writer: RecordWriter, writer to print record with, None to print text.
+        """
+        if writer:
+            writer.write(record)
+        elif record.get("event") == "detach":
+            log.info("\n{0} device detached: {1}".format("Android" if record["platform"] == "android" else "iOS",
+                                                         record["serial"]))
+        else:
+            DeviceInfoAction._log_record(record)
+
+    @staticmethod
+    def _get_record(device, platform, names, refresh=False):
+        """
+        Queries the given fields of device.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param platform: string, "android" or "ios".
+        :param names: list, names of fields to query.
+        :param refresh: boolean, True to ignore the cache and query all facts from device.
+        :returns dict: record with device serial, platform and requested fields.
+        """
+        record = {"serial": device, "platform": platform}
+        if platform == "android":
+            record.update(DeviceInfoAction._get_android_facts(device, names, refresh))
+        else:
+            for name, _, getter in FIELDS:
+                if name in names and getter:
+                    record[name] = getter(device)
+        return record
+
+    @staticmethod
+    def _get_android_facts(device, names, refresh=False):
+        """
+        Returns static facts for the given Android device, queries only those which are not cached for its current boot.
+        Facts which are not cached are queried at once, together with boot ID if the cache is not used at all.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param names: list, names of facts to return.
+        :param refresh: boolean, True to ignore the cache and query all facts from device.
+        :returns dict: facts by name, e.g. {"model": "Nexus 5"}.
+        """
+        query = properties.query(device)
+        boot_id = query.get("boot_id", *(names if refresh else []))["boot_id"]
+        device_facts = {} if refresh else facts.load(device, boot_id)
+        missing = [name for name in names if name not in device_facts]
+        device_facts.update(query.get(*missing))
+        if any(name in ANDROID_STATIC_FACTS for name in missing):
+            facts.save(device, boot_id, dict((name, value) for name, value in device_facts.items()
+                                             if name in ANDROID_STATIC_FACTS))
+        return dict((name, value) for name, value in device_facts.items() if name in names)
+
+    @staticmethod
+    def _log_record(record):
+        """
+        Prints the given device record as human-readable text.
+
+        :param record: dict, device record.
+        """
+        platform = "Android" if record["platform"] == "android" else "iOS"
+        title = " ".join(record[name] for name in ("manufacturer", "model")
+                         if record.get(name) and not (name == "manufacturer" and platform == "iOS"))
+        log.info("\n{0} device: {1}{2}".format(platform, record["serial"], " ({0})".format(title) if title else ""))
+        for name, _, _ in FIELDS:
+            if name in TEXT_LABELS and record.get(name) is not None:
+                log.info(TEXT_LABELS[name].format(record[name], platform=platform))
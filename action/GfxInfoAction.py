@@ -0,0 +1,148 @@
+"""
+This module contains actions related to rendering performance of applications on mobile devices.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from framework.classes.RecordWriter import RecordWriter
+from framework.classes.ShellSession import ShellSession
+from action.ActionFactory import ActionFactory
+import framework.utils.transport as transport
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+from tabulate import tabulate
+import logging
+import time
+import sys
+import os
+
+log = logging.getLogger("action")
+
+
+class GfxInfoAction(object):
+    """
+    Action to collect frame statistics of application.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "gfxinfo"
+        help = "Collect frame statistics of Android application (Android 6.0+), compute jank and frame durations"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("package",
+                            help="Package name of application, e.g. com.android.calculator2")
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to collect frames from, by default all connected Android devices",
+                            type=types.connected_android_device,
+                            nargs="+",
+                            default=None).completer = completion.android_devices
+        parser.add_argument("-i", "--interval",
+                            help="Optional, Time between dumps, seconds, by default 1 (device keeps last 120 frames)",
+                            type=float,
+                            default=1.0)
+        parser.add_argument("-t", "--duration",
+                            help="Optional, How long to collect, seconds, by default till Ctrl+C is pressed",
+                            type=float,
+                            default=None)
+        parser.add_argument("-b", "--bucket",
+                            help="Optional, Length of time window to export results for, seconds, by default 60",
+                            type=float,
+                            default=60.0)
+        parser.add_argument("--jank-threshold",
+                            help="Optional, Frames longer than this are janky, milliseconds, by default 16.67",
+                            type=float,
+                            default=16.67)
+        parser.add_argument("-f", "--format",
+                            help="Optional, Format of exported results, by default csv",
+                            dest="output_format",
+                            choices=("csv", "ndjson"),
+                            default="csv")
+
+    def __call__(self, package, devices, interval, duration, bucket, jank_threshold, output_format):
+        """
+        Collects frames of the given application from all given devices at once, exports jank and frame duration
+        percentiles for every device, window and time bucket, and prints totals.
+
+        :param package: string, package name of application, e.g. "com.android.calculator2".
+        :param devices: list, device identifiers, None for all connected Android devices.
+        :param interval: float, time between dumps, seconds.
+        :param duration: float, how long to collect, seconds, None to collect till Ctrl+C is pressed.
+        :param bucket: float, length of time window to export results for, seconds.
+        :param jank_threshold: float, frames longer than this are janky, milliseconds.
+        :param output_format: string, format of exported results: "csv" or "ndjson".
+        """
+        # NumPy takes a while to import, so it is imported only when frames are really collected
+        import framework.utils.framestats as framestats
+
+        devices = devices or android.list_devices()
+        if not devices:
+            log.error("No connected Android devices")
+            sys.exit(1)
+
+        chunks = dict((device, {}) for device in devices)
+        log.info("Collecting frames of '{0}' on {1} devices... To finish press Ctrl+C".format(package, len(devices)))
+        started = time.time()
+        parallel.run_until_stopped(lambda device, stop: GfxInfoAction._collect(framestats, device, package, interval,
+                                                                               stop, chunks[device]), devices, duration)
+
+        fields = ["device", "window", "start", "frames", "jank_percent"] + \
+                 ["p{0}_ms".format(percentile) for percentile in framestats.PERCENTILES]
+        path = os.path.join(os.getcwd(), "gfxinfo_{0}.{1}".format(int(started * 1000), output_format))
+        totals = []
+        with open(path, "w") as export_file:
+            writer = RecordWriter(output_format, fields, export_file)
+            for device in devices:
+                for window, window_chunks in sorted(chunks[device].items()):
+                    frames = framestats.merge(window_chunks)
+                    for record in framestats.summarize(frames, bucket, jank_threshold):
+                        record.update(device=device, window=window)
+                        writer.write(record)
+                    for record in framestats.summarize(frames, None, jank_threshold):
+                        record.update(device=device, window=window)
+                        totals.append([record[field] for field in fields if field != "start"])
+            writer.close()
+        if not totals:
+            log.warning("No frames collected, make sure application '{0}' is rendering".format(package))
+        log.info("\n{0}\nFind results per {1}s at {2}".format(
+            tabulate(totals, headers=[field for field in fields if field != "start"]), bucket, path))
+
+    @staticmethod
+    def _collect(framestats, device, package, interval, stop, chunks):
+        """
+        Dumps frames of application on device at fixed interval till stop is set.
+
+        :param framestats: module framework.utils.framestats.
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param package: string, package name of application.
+        :param interval: float, time between dumps, seconds.
+        :param stop: threading.Event, set to finish collecting.
+        :param chunks: dict, lists of frame arrays by window name to append new frames to.
+        """
+        session = ShellSession(device, transport.command(device, "shell"))
+        last_frames = {}
+        try:
+            # frames rendered before collection are not of interest
+            session.run("dumpsys gfxinfo {0} reset".format(package))
+            while not stop.is_set():
+                dumped = time.time()
+                _, output = session.run("dumpsys gfxinfo {0} framestats".format(package))
+                for window, frames in framestats.parse(output, package):
+                    # consecutive dumps overlap, keep only frames which were not seen yet
+                    frames = frames[frames[:, framestats.INTENDED_VSYNC] > last_frames.get(window, 0)]
+                    if len(frames):
+                        last_frames[window] = frames[:, framestats.INTENDED_VSYNC].max()
+                        chunks.setdefault(window, []).append(frames)
+                stop.wait(max(0, interval - (time.time() - dumped)))
+        finally:
+            session.close()
@@ -0,0 +1,111 @@
+"""
+This module contains actions related to installing applications onto mobile devices.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from action.ActionFactory import ActionFactory
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+import framework.utils.ios as ios
+import logging
+import time
+import sys
+import os
+
+log = logging.getLogger("action")
+
+
+class InstallAction(object):
+    """
+    Action to install application onto one or more devices.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "install"
+        help = "Install application onto connected devices"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("app",
+                            help="Optional, Path to .apk or .ipa file, by default the very latest one from ~/Downloads "
+                                 "for every platform",
+                            type=types.existent_file,
+                            nargs="?",
+                            default=None)
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to install onto, by default all connected devices",
+                            type=types.connected_device,
+                            nargs="+",
+                            default=None).completer = completion.all_devices
+        parser.add_argument("-j", "--jobs",
+                            help="Optional, How many devices to install onto at the same time, by default 4",
+                            type=int,
+                            default=4)
+
+    def __call__(self, app, devices, jobs):
+        """
+        Installs the application onto all given devices concurrently. Application is chosen once per platform.
+
+        :param app: string, path to .apk or .ipa file, None for the very latest ones from ~/Downloads.
+        :param devices: list, device identifiers (e.g. "TA9890AMTG"), None for all connected devices.
+        :param jobs: int, how many devices to install onto concurrently.
+        """
+        android_devices = android.list_devices()
+        ios_devices = ios.list_devices()
+        if app and os.path.splitext(app)[1].lower() not in (".apk", ".ipa"):
+            log.error("Unknown application type given: '{0}', expected .apk or .ipa".format(app))
+            sys.exit(1)
+        if app:
+            android_devices = android_devices if app.lower().endswith(".apk") else []
+            ios_devices = ios_devices if app.lower().endswith(".ipa") else []
+        if devices:
+            for device in set(devices) - set(android_devices + ios_devices):
+                log.error("Can't install '{0}' onto device '{1}'".format(app, device))
+                sys.exit(1)
+            android_devices = [device for device in android_devices if device in devices]
+            ios_devices = [device for device in ios_devices if device in devices]
+        if not android_devices and not ios_devices:
+            log.error("No connected devices to install onto")
+            sys.exit(1)
+
+        apps = {}
+        if android_devices:
+            apps["android"] = app or android.find_newest_app()
+        if ios_devices:
+            apps["ios"] = app or ios.find_newest_app()
+        targets = [(device, "android") for device in android_devices] + [(device, "ios") for device in ios_devices]
+
+        started = time.time()
+        for device, elapsed in parallel.imap_unordered(lambda target: InstallAction._install(target[0], target[1],
+                                                                                             apps[target[1]]),
+                                                       targets, jobs):
+            log.info("Installed onto device '{0}' in {1:.2f}s".format(device, elapsed))
+        log.info("Installed onto {0} devices in {1:.2f}s".format(len(targets), time.time() - started))
+
+    @staticmethod
+    def _install(device, platform, app):
+        """
+        Installs the application onto device.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param platform: string, "android" or "ios".
+        :param app: string, path to application.
+        :returns tuple: device identifier and time it took to install, seconds.
+        """
+        started = time.time()
+        if platform == "android":
+            android.install_app(device, app)
+        else:
+            ios.install_app(device, app)
+        return device, time.time() - started
@@ -3,12 +3,19 @@ This module contains a list of actions related to logging.
 """
 
 import logging
+import time
 import sys
+import os
 
+from framework.classes.RecordWriter import RecordWriter
+from framework.classes.CrashDetector import CrashDetector
+from tabulate import tabulate
 import framework.utils.android as android
 import framework.utils.argparsing.completion as completion
 import framework.utils.argparsing.defaults as defaults
 import framework.utils.argparsing.types as types
+import framework.utils.timeline as timeline
+import framework.utils.catalog as catalog
 import framework.utils.console as console
 import framework.utils.ios as ios
 from action.ActionFactory import ActionFactory
@@ -44,6 +51,13 @@ class LoggingAction(object):
         parser = subparsers.add_parser("start", help="Start logging process")
         LoggingAction._init_start_parser(parser)
 
+        parser = subparsers.add_parser("stats", help="Show statistics of Android log captured by 'logging start'")
+        LoggingAction._init_stats_parser(parser)
+
+        parser = subparsers.add_parser("merge", help="Merge logs captured by 'logging start' from several devices into "
+                                                     "one, ordered by host time")
+        LoggingAction._init_merge_parser(parser)
+
     def __call__(self, **kwargs):
         subaction = kwargs[LoggingAction.Meta.action]
         del kwargs[LoggingAction.Meta.action]
@@ -53,8 +67,35 @@ class LoggingAction(object):
             if device is None:
                 devices = android.list_devices() + ios.list_devices()
                 device = console.prompt_for_options("Choose device: ", devices)
-            log_file = android.get_log(device) if device in android.list_devices() else ios.get_log(device)
+            filters = [kwargs["processes"], kwargs["subsystems"], kwargs["grep"], kwargs["gzip"]]
+            platform = "android" if device in android.list_devices() else "ios"
+            # clock offset is measured before and after capture, so 'logging merge' can compensate drift
+            offsets = [timeline.measure_offset(device, platform)]
+            detector = None
+            if kwargs["detect"]:
+                detector = CrashDetector(device, platform, os.path.join(os.getcwd(),
+                                                                        "incidents_{0}".format(int(time.time()))))
+            on_line = detector.feed if detector else None
+            if platform == "android":
+                if any(filters):
+                    log.warning("Filtering and compression are supported for iOS logs only, ignoring them")
+                log_file = android.get_log(device, on_line)
+            else:
+                log_file = ios.get_log(device, *filters, on_line=on_line)
+            if detector:
+                detector.close()
+                log.info("Detected {0} incidents{1}".format(detector.incidents, ", find evidence at " +
+                                                             detector.target_dir if detector.incidents else ""))
+            offsets = [offset for offset in offsets + [timeline.measure_offset(device, platform)] if offset]
+            if offsets:
+                timeline.save_offsets(log_file, device, platform, offsets)
+            catalog.add([catalog.artifact(log_file, "logging", device, platform,
+                                          **catalog.describe(device, platform))])
             log.info("\nFind log at " + log_file)
+        elif subaction == "stats":
+            LoggingAction._show_stats(**kwargs)
+        elif subaction == "merge":
+            LoggingAction._merge(**kwargs)
         else:
             log.error("Unknown subcommand given: '{0}'".format(subaction))
             sys.exit(1)
@@ -68,9 +109,150 @@ class LoggingAction(object):
         parser.add_argument("-o", "--out-file",
                             help="Specify output file, defaults to current directory")
 
+    @staticmethod
+    def _init_stats_parser(parser):
+        parser.add_argument("-l", "--log-file",
+                            help="Log file captured by 'logging start' from Android device",
+                            required=True,
+                            type=types.existent_file)
+        parser.add_argument("--top",
+                            help="Optional, How many noisiest tags to show, by default 10",
+                            type=int,
+                            default=10)
+        parser.add_argument("--burst",
+                            help="Optional, Errors per second to report as error burst, by default 10",
+                            type=int,
+                            default=10)
+        parser.add_argument("-o", "--out-file",
+                            help="Optional, File to export counts per second, level and tag to",
+                            default=None)
+        parser.add_argument("-f", "--format",
+                            help="Optional, Format of exported counts, by default csv",
+                            dest="output_format",
+                            choices=RecordWriter.formats,
+                            default="csv")
+
+    @staticmethod
+    def _init_merge_parser(parser):
+        parser.add_argument("log_files",
+                            help="Log files captured by 'logging start', from Android or iOS devices",
+                            metavar="LOG_FILE",
+                            type=types.existent_file,
+                            nargs="+")
+        parser.add_argument("-o", "--out-file",
+                            help="Optional, File to write merged log to, by default 'merged_<timestamp>.txt' in "
+                                 "current directory",
+                            default=None)
+
+    @staticmethod
+    def _merge(log_files, out_file):
+        """
+        Merges logs of several devices into one ordered by host time, every line is prefixed with host time and
+        device. Device clocks are corrected by offsets measured during capture.
+
+        :param log_files: list, paths to logs captured by "logging start".
+        :param out_file: string, path to file to write merged log to, None for default one.
+        """
+        sources = []
+        for log_file in log_files:
+            clock = timeline.load_offsets(log_file)
+            if clock is None:
+                log.warning("No clock offsets saved for '{0}', its device time is taken as is".format(log_file))
+                clock = {"device": os.path.basename(log_file), "offsets": []}
+            else:
+                offsets = [offset["offset"] for offset in clock["offsets"]]
+                log.info("Device '{0}': clock is {1:+.3f}s off host, drifted {2:+.3f}s during capture".format(
+                    clock["device"], offsets[0], offsets[-1] - offsets[0]))
+            sources.append((log_file, clock["device"], clock["offsets"]))
+        out_file = out_file or os.path.join(os.getcwd(), "merged_{0}.txt".format(int(time.time() * 1000)))
+        width = max(len(device) for _, device, _ in sources)
+        lines = 0
+        with open(out_file, "w") as merged:
+            for host_time, device, line in timeline.merge(sources):
+                merged.write("{0} {1:<{2}} {3}\n".format(timeline.format_time(host_time), device, width, line))
+                lines += 1
+        log.info("\nMerged {0} lines of {1} logs, find them at {2}".format(lines, len(sources), out_file))
+
+    @staticmethod
+    def _show_stats(log_file, top, burst, out_file, output_format):
+        """
+        Shows the noisiest tags and error bursts of log, optionally exports counts per second, level and tag.
+
+        :param log_file: string, path to log captured by "logcat -v time".
+        :param top: int, how many noisiest tags to show.
+        :param burst: int, errors per second to report as error burst.
+        :param out_file: string, path to file to export counts to, None to not export them.
+        :param output_format: string, format of exported counts: "ndjson", "csv" or "table".
+        """
+        # NumPy takes a while to import, so it is imported only when log is really analyzed
+        import framework.utils.logcat as logcat
+        import numpy
+
+        table, tags, entries = logcat.count(log_file)
+        if not entries:
+            log.error("No log entries found in '{0}', is it captured by 'logcat -v time'?".format(log_file))
+            sys.exit(1)
+        seconds = table["second"]
+        log.info("{0} entries from {1} to {2}".format(entries, logcat.format_time(seconds.min()),
+                                                      logcat.format_time(seconds.max())))
+
+        is_error = numpy.in1d(table["level"], [logcat.LEVELS.index(level) for level in logcat.ERROR_LEVELS])
+        tag_counts = numpy.bincount(table["tag"], weights=table["count"], minlength=len(tags))
+        tag_errors = numpy.bincount(table["tag"][is_error], weights=table["count"][is_error], minlength=len(tags))
+        noisiest = numpy.argsort(-tag_counts, kind="mergesort")[:top]
+        log.info("\n" + tabulate([[tags[tag], int(tag_counts[tag]), round(100.0 * tag_counts[tag] / entries, 2),
+                                   int(tag_errors[tag])] for tag in noisiest],
+                                 headers=["tag", "entries", "share, %", "errors"]))
+
+        error_seconds, inverse = numpy.unique(seconds[is_error], return_inverse=True)
+        error_counts = numpy.bincount(inverse, weights=table["count"][is_error]).astype(numpy.int64)
+        bursting = error_counts >= burst
+        error_seconds, error_counts = error_seconds[bursting], error_counts[bursting]
+        # consecutive seconds with many errors make a single burst
+        groups = numpy.split(numpy.arange(len(error_seconds)), numpy.flatnonzero(numpy.diff(error_seconds) > 1) + 1)
+        bursts = [[logcat.format_time(error_seconds[group[0]]), logcat.format_time(error_seconds[group[-1]]),
+                   int(error_counts[group].sum()), int(error_counts[group].max())] for group in groups if len(group)]
+        if bursts:
+            log.info("\n" + tabulate(bursts, headers=["from", "to", "errors", "peak per second"]))
+        else:
+            log.info("\nNo error bursts of {0} errors per second or more".format(burst))
+
+        if out_file:
+            with open(out_file, "w") as stream:
+                writer = RecordWriter(output_format, ["time", "level", "tag", "count"], stream)
+                for second, level, tag, number in zip(seconds.tolist(), table["level"].tolist(),
+                                                      table["tag"].tolist(), table["count"].tolist()):
+                    writer.write({"time": logcat.format_time(second), "level": logcat.LEVELS[level],
+                                  "tag": tags[tag], "count": number})
+                writer.close()
+            log.info("\nFind counts per second at " + out_file)
+
     @staticmethod
     def _init_start_parser(parser):
         parser.add_argument("-d", "--device",
                             help="Device to get log from",
                             type=types.connected_device,
                             default=defaults.connected_device()).completer = completion.all_devices
+        parser.add_argument("--process",
+                            help="iOS only, Keep lines of the given processes only, e.g. SpringBoard",
+                            dest="processes",
+                            nargs="+",
+                            default=None)
+        parser.add_argument("--subsystem",
+                            help="iOS only, Keep lines of the given subsystems (shown in brackets after process) only",
+                            dest="subsystems",
+                            nargs="+",
+                            default=None)
+        parser.add_argument("--grep",
+                            help="iOS only, Keep lines matching the given regular expression only",
+                            type=types.regex,
+                            default=None)
+        parser.add_argument("--gzip",
+                            help="iOS only, Compress log while writing it",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("--detect",
+                            help="Optional, Watch log for crashes, ANRs and fatal signals, save screenshot, device info "
+                                 "and log around every one of them",
+                            action="store_true",
+                            default=False)
@@ -0,0 +1,206 @@
+"""
+This module contains actions related to monitoring health of mobile devices.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from framework.classes.HealthSampler import HealthSampler
+from framework.classes.CommandBudget import CommandBudget
+from framework.classes.TimeSeries import TimeSeries
+from action.ActionFactory import ActionFactory
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+import framework.utils.ios as ios
+import logging
+import time
+import sys
+import os
+
+log = logging.getLogger("action")
+
+# change of value since the previous sample which makes polling of device fast again
+CHANGE_THRESHOLDS = {"battery_level": 1, "temperature": 1.0, "storage_free_mb": 100}
+
+# values compared as is, any change makes polling fast again
+STATE_COLUMNS = ("online", "charging", "connectivity")
+
+# time covered by one file of the series, seconds
+SERIES_PERIOD = 3600
+
+
+class MonitorAction(object):
+    """
+    Action to monitor health of devices.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "monitor"
+        help = "Monitor battery, temperature, storage and connectivity of devices"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to monitor, by default all connected devices",
+                            type=types.connected_device,
+                            nargs="+",
+                            default=None).completer = completion.all_devices
+        parser.add_argument("--min-interval",
+                            help="Optional, Time between samples of device which changes or is in alarm, seconds, "
+                                 "by default 5",
+                            type=float,
+                            default=5.0)
+        parser.add_argument("--max-interval",
+                            help="Optional, Time between samples of device which is stable, seconds, by default 60",
+                            type=float,
+                            default=60.0)
+        parser.add_argument("--budget",
+                            help="Optional, Maximum number of commands per second run on host for all devices, "
+                                 "by default 10",
+                            type=float,
+                            default=10.0)
+        parser.add_argument("--battery-low",
+                            help="Optional, Battery level to alarm at, percent, by default 20",
+                            type=int,
+                            default=20)
+        parser.add_argument("--temperature-high",
+                            help="Optional, Battery temperature to alarm at, degrees Celsius, by default 45",
+                            type=float,
+                            default=45.0)
+        parser.add_argument("--storage-low",
+                            help="Optional, Free storage to alarm at, MB, by default 500",
+                            type=int,
+                            default=500)
+        parser.add_argument("--keep-hours",
+                            help="Optional, How many hours of samples to keep on disk, by default 24",
+                            type=int,
+                            default=24)
+        parser.add_argument("-t", "--duration",
+                            help="Optional, How long to monitor, seconds, by default till Ctrl+C is pressed",
+                            type=float,
+                            default=None)
+
+    def __call__(self, devices, min_interval, max_interval, budget, battery_low, temperature_high, storage_low,
+                 keep_hours, duration):
+        """
+        Monitors the given devices. Every device is sampled by own thread: polling of device slows down twice with
+        every sample which shows no change till it reaches the maximum interval, and it's fast again once any value
+        changes or is in alarm. Commands of all devices share the budget, so a large shelf slows down polling instead of
+        overloading the host. Samples are written to a rolling series of hourly NDJSON files.
+
+        :param devices: list, device identifiers (e.g. "TA9890AMTG"), None for all connected devices.
+        :param min_interval: float, time between samples of changing device, seconds.
+        :param max_interval: float, time between samples of stable device, seconds.
+        :param budget: float, maximum number of host commands per second.
+        :param battery_low: int, battery level to alarm at, percent.
+        :param temperature_high: float, battery temperature to alarm at, degrees Celsius.
+        :param storage_low: int, free storage to alarm at, MB.
+        :param keep_hours: int, how many hours of samples to keep.
+        :param duration: float, how long to monitor, seconds, None to monitor till Ctrl+C is pressed.
+        """
+        android_devices = android.list_devices()
+        ios_devices = ios.list_devices()
+        if devices:
+            for device in set(devices) - set(android_devices + ios_devices):
+                log.error("Unknown device given: '{0}'".format(device))
+                sys.exit(1)
+        targets = [(device, "android") for device in android_devices if not devices or device in devices]
+        targets += [(device, "ios") for device in ios_devices if not devices or device in devices]
+        if not targets:
+            log.error("No connected devices to monitor")
+            sys.exit(1)
+        if min_interval <= 0 or max_interval < min_interval or budget <= 0:
+            log.error("Intervals and budget must be positive, and the maximum interval not less than the minimum one")
+            sys.exit(1)
+
+        series = TimeSeries(os.path.join(os.getcwd(), "monitor_{0}".format(int(time.time() * 1000))),
+                            HealthSampler.columns + ("interval",), SERIES_PERIOD, keep_hours)
+        command_budget = CommandBudget(budget)
+        alarms = {"battery_level": lambda value: value <= battery_low,
+                  "temperature": lambda value: value >= temperature_high,
+                  "storage_free_mb": lambda value: value <= storage_low}
+        log.info("Monitoring {0} devices, writing samples to '{1}'... To finish press Ctrl+C".format(
+            len(targets), series.directory))
+        started = time.time()
+        try:
+            parallel.run_until_stopped(
+                lambda target, stop: MonitorAction._monitor(target[0], target[1], min_interval, max_interval,
+                                                            command_budget, alarms, series, stop), targets, duration)
+        finally:
+            series.close()
+        elapsed = time.time() - started
+        log.info("Took {0} samples of {1} devices in {2:.0f}s with {3} host commands ({4:.2f}/s)".format(
+            series.records, len(targets), elapsed, command_budget.commands,
+            command_budget.commands / elapsed if elapsed else 0))
+
+    @staticmethod
+    def _monitor(device, platform, min_interval, max_interval, budget, alarms, series, stop):
+        """
+        Samples device with adaptive interval till stop is set.
+
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param platform: string, "android" or "ios".
+        :param min_interval: float, time between samples of changing device, seconds.
+        :param max_interval: float, time between samples of stable device, seconds.
+        :param budget: CommandBudget, budget of host commands shared by all devices.
+        :param alarms: dict, functions(value) which return True if value is in alarm, by column name.
+        :param series: TimeSeries, series to write samples to.
+        :param stop: threading.Event, set to finish monitoring.
+        """
+        sampler = HealthSampler(device, platform)
+        interval = min_interval
+        previous = None
+        alarmed = set()
+        try:
+            while budget.acquire(sampler.cost, stop):
+                values = sampler.sample()
+                active = set(column for column, in_alarm in alarms.items()
+                             if values[column] is not None and in_alarm(values[column]))
+                if previous is not None and previous["online"] != values["online"]:
+                    log.warning("Device '{0}' is {1}".format(device, "back online" if values["online"] else "offline"))
+                for column in sorted(active - alarmed):
+                    log.warning("Device '{0}': {1} is {2}".format(device, column, values[column]))
+                for column in sorted(alarmed - active):
+                    log.info("Device '{0}': {1} is back to normal ({2})".format(device, column, values[column]))
+                if active or MonitorAction._has_changed(previous, values):
+                    interval = min_interval
+                else:
+                    interval = min(interval * 2, max_interval)
+                values["interval"] = interval
+                series.write(values)
+                log.debug("Device '{0}': {1}, next sample in {2:.1f}s".format(
+                    device, ", ".join("{0}={1}".format(column, values[column]) for column in HealthSampler.columns[3:]),
+                    interval))
+                previous = values
+                alarmed = active
+                if stop.wait(interval):
+                    break
+        finally:
+            sampler.close()
+
+    @staticmethod
+    def _has_changed(previous, values):
+        """
+        :param previous: dict, previous sample, None if there is none.
+        :param values: dict, the current sample.
+        :returns boolean: True if any value changed more than its threshold since the previous sample.
+        """
+        if previous is None:
+            return True
+        if any(previous[column] != values[column] for column in STATE_COLUMNS):
+            return True
+        for column, threshold in CHANGE_THRESHOLDS.items():
+            if (previous[column] is None) != (values[column] is None):
+                return True
+            if values[column] is not None and abs(values[column] - previous[column]) >= threshold:
+                return True
+        return False
@@ -0,0 +1,146 @@
+"""
+This module contains actions related to measuring performance of applications on mobile devices.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from framework.classes.PerfSampler import PerfSampler
+from action.ActionFactory import ActionFactory
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+from collections import OrderedDict
+from tabulate import tabulate
+import logging
+import json
+import time
+import sys
+import os
+
+log = logging.getLogger("action")
+
+SUMMARY_COLUMNS = ("pss_kb", "cpu_percent", "mem_available_kb")
+
+
+class PerfAction(object):
+    """
+    Action to sample memory and CPU usage of application.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "perf"
+        help = "Sample memory and CPU usage of Android application"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("package",
+                            help="Package name of application, e.g. com.android.calculator2")
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to sample, by default all connected Android devices",
+                            type=types.connected_android_device,
+                            nargs="+",
+                            default=None).completer = completion.android_devices
+        parser.add_argument("-i", "--interval",
+                            help="Optional, Time between samples, seconds, by default 1",
+                            type=float,
+                            default=1.0)
+        parser.add_argument("-t", "--duration",
+                            help="Optional, How long to sample, seconds, by default till Ctrl+C is pressed",
+                            type=float,
+                            default=None)
+
+    def __call__(self, package, devices, interval, duration):
+        """
+        Samples the given application on all given devices at once and writes samples of every device to own file
+        with columns of values and their summary.
+
+        :param package: string, package name of application, e.g. "com.android.calculator2".
+        :param devices: list, device identifiers, None for all connected Android devices.
+        :param interval: float, time between samples, seconds.
+        :param duration: float, how long to sample, seconds, None to sample till Ctrl+C is pressed.
+        """
+        devices = devices or android.list_devices()
+        if not devices:
+            log.error("No connected Android devices")
+            sys.exit(1)
+
+        timestamp = str(int(time.time() * 1000))
+        samples = dict((device, OrderedDict((column, []) for column in PerfSampler.columns)) for device in devices)
+        log.info("Sampling '{0}' on {1} devices... To finish press Ctrl+C".format(package, len(devices)))
+        parallel.run_until_stopped(lambda device, stop: PerfAction._sample(device, package, interval, stop,
+                                                                           samples[device]), devices, duration)
+
+        for device in devices:
+            summary = PerfAction._summarize(samples[device])
+            path = os.path.join(os.getcwd(), "perf_{0}_{1}.json".format(device, timestamp))
+            with open(path, "w") as perf_file:
+                json.dump(OrderedDict((("device", device), ("package", package), ("interval", interval),
+                                       ("columns", samples[device]), ("summary", summary))),
+                          perf_file, separators=(",", ":"))
+            rows = [[stat] + [summary[column][stat] for column in SUMMARY_COLUMNS]
+                    for stat in ("min", "p50", "p95", "max")]
+            log.info("\nDevice {0}: {1} samples, find them at {2}\n{3}".format(
+                device, len(samples[device]["time"]), path,
+                tabulate(rows, headers=[""] + list(SUMMARY_COLUMNS))))
+
+    @staticmethod
+    def _sample(device, package, interval, stop, columns):
+        """
+        Samples application on device at fixed interval till stop is set.
+
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param package: string, package name of application.
+        :param interval: float, time between samples, seconds.
+        :param stop: threading.Event, set to finish sampling.
+        :param columns: dict, lists of values by column name to append samples to.
+        """
+        sampler = PerfSampler(device, package)
+        next_sample = time.time()
+        try:
+            while not stop.is_set():
+                values = sampler.sample()
+                if values["pid"] is None and not columns["time"]:
+                    log.warning("Application '{0}' is not running on device '{1}'".format(package, device))
+                for column, value in values.items():
+                    columns[column].append(value)
+                # keep fixed rate regardless of how long sampling takes, skip samples which are already late
+                next_sample += interval
+                while next_sample < time.time():
+                    next_sample += interval
+                stop.wait(next_sample - time.time())
+        finally:
+            sampler.close()
+
+    @staticmethod
+    def _summarize(columns):
+        """
+        :param columns: dict, lists of values by column name.
+        :returns dict: min, median, 95th percentile and max by column name, None if column has no values.
+        """
+        summary = OrderedDict()
+        for column in SUMMARY_COLUMNS:
+            values = sorted(value for value in columns[column] if value is not None)
+            summary[column] = OrderedDict((stat, _percentile(values, percent) if values else None)
+                                          for stat, percent in (("min", 0), ("p50", 50), ("p95", 95), ("max", 100)))
+        return summary
+
+
+def _percentile(values, percent):
+    """
+    Returns percentile of sorted values by nearest rank: the smallest value which at least the given percent of values
+    don't exceed, as framestats.summarize does.
+
+    :param values: list, sorted values.
+    :param percent: int, percentile, 0-100.
+    :returns: value.
+    """
+    return values[max((percent * len(values) + 99) // 100 - 1, 0)]
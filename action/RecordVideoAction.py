@@ -7,6 +7,7 @@ import framework.utils.argparsing.defaults as defaults
 import framework.utils.argparsing.types as types
 from action.ActionFactory import ActionFactory
 import framework.utils.android as android
+import framework.utils.catalog as catalog
 import framework.utils.console as console
 import logging
 import os
@@ -72,4 +73,6 @@ class RecordVideoAction(object):
         result_file_path = os.path.join(current_dir, file_name)
         if compress:
             console.compress_video(result_file_path)
+        catalog.add([catalog.artifact(result_file_path, "video", device, "android",
+                                      **catalog.describe(device, "android"))])
         log.info("Find result at " + result_file_path)
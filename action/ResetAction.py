@@ -0,0 +1,124 @@
+"""
+This module contains actions related to resetting state of applications on mobile devices.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from action.ActionFactory import ActionFactory
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+import framework.utils.ios as ios
+import logging
+import time
+import sys
+
+log = logging.getLogger("action")
+
+
+class ResetAction(object):
+    """
+    Action to reset applications on one or more devices.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "reset"
+        help = "Clear data of applications or uninstall them on connected devices"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("packages",
+                            help="Package names (bundle identifiers on iOS), e.g. com.android.calculator2",
+                            nargs="+")
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to reset applications on, by default all connected devices",
+                            type=types.connected_device,
+                            nargs="+",
+                            default=None).completer = completion.all_devices
+        parser.add_argument("-u", "--uninstall",
+                            help="Optional, Uninstall applications instead of clearing their data",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("-p", "--permissions",
+                            help="Optional, Revoke runtime permissions granted to applications (Android 6.0+)",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("-j", "--jobs",
+                            help="Optional, How many devices to reset at the same time, by default 8",
+                            type=int,
+                            default=8)
+
+    def __call__(self, packages, devices, uninstall, permissions, jobs):
+        """
+        Resets the given applications on all given devices concurrently. All applications of an Android device are
+        reset by one script in one shell session, iOS applications can only be uninstalled, one by one. Applications
+        which are not installed on device are skipped. Exits with code 1 if any application failed to reset.
+
+        :param packages: list, package names, e.g. ["com.android.calculator2"].
+        :param devices: list, device identifiers (e.g. "TA9890AMTG"), None for all connected devices.
+        :param uninstall: boolean, True to uninstall applications instead of clearing their data.
+        :param permissions: boolean, True to revoke runtime permissions of Android applications.
+        :param jobs: int, how many devices to reset concurrently.
+        """
+        android_devices = android.list_devices()
+        ios_devices = ios.list_devices()
+        if devices:
+            for device in set(devices) - set(android_devices + ios_devices):
+                log.error("Unknown device given: '{0}'".format(device))
+                sys.exit(1)
+            android_devices = [device for device in android_devices if device in devices]
+            ios_devices = [device for device in ios_devices if device in devices]
+        if ios_devices and not uninstall:
+            log.warning("Data of iOS applications can't be cleared, only uninstalled, skipping iOS devices")
+            ios_devices = []
+        targets = [(device, "android") for device in android_devices] + [(device, "ios") for device in ios_devices]
+        if not targets:
+            log.error("No connected devices to reset applications on")
+            sys.exit(1)
+
+        started = time.time()
+        failures = 0
+        for device, results, elapsed in parallel.imap_unordered(
+                lambda target: ResetAction._reset(target[0], target[1], packages, uninstall, permissions), targets,
+                jobs):
+            outcomes = {}
+            for package in packages:
+                outcome = results[package].split(":")[0].split(" ")[0]
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                log.log(logging.WARNING if outcome == "failed" else logging.DEBUG,
+                        "Device '{0}': {1} {2}".format(device, package, results[package]))
+            failures += outcomes.get("failed", 0)
+            log.info("Device '{0}': {1} in {2:.2f}s".format(device, ", ".join(
+                "{0} {1}".format(number, outcome) for outcome, number in sorted(outcomes.items())), elapsed))
+        log.info("Reset applications on {0} devices in {1:.2f}s".format(len(targets), time.time() - started))
+        if failures:
+            log.error("Failed to reset {0} applications".format(failures))
+            sys.exit(1)
+
+    @staticmethod
+    def _reset(device, platform, packages, uninstall, permissions):
+        """
+        Resets applications on device.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param platform: string, "android" or "ios".
+        :param packages: list, package names.
+        :param uninstall: boolean, True to uninstall applications instead of clearing their data.
+        :param permissions: boolean, True to revoke runtime permissions of Android applications.
+        :returns tuple: device identifier, results by package name (see android.reset_apps) and time it took, seconds.
+        """
+        started = time.time()
+        if platform == "android":
+            results = android.reset_apps(device, packages, uninstall, permissions)
+        else:
+            results = ios.uninstall_apps(device, packages)
+        return device, results, time.time() - started
@@ -0,0 +1,68 @@
+"""
+This module contains actions related to MTH server which keeps MTH warm for fast subsequent mth calls.
+"""
+
+from action.ActionFactory import ActionFactory
+import framework.utils.client as client
+import logging
+import sys
+
+log = logging.getLogger("action")
+
+
+class ServeAction(object):
+    """
+    Action to run MTH server.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "serve"
+        help = "Run MTH server, while it is running mth commands are executed by it and start much faster"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("--stop",
+                            help="Optional, Stop running MTH server",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("--status",
+                            help="Optional, Show status of running MTH server",
+                            action="store_true",
+                            default=False)
+
+    def __call__(self, stop, status):
+        """
+        Runs MTH server in foreground, or controls the running one.
+
+        :param stop: boolean, True to stop running server.
+        :param status: boolean, True to show status of running server.
+        """
+        running = client.is_server_running()
+        if (stop or status) and not running:
+            log.error("MTH server is not running")
+            sys.exit(1)
+        if stop:
+            client.request({"control": "shutdown"})
+            log.info("MTH server stopped")
+        elif status:
+            server_status = client.request({"control": "status"})["status"]
+            log.info("MTH server (pid {0}) is up for {1}s, executed {2} commands".format(
+                server_status["pid"], server_status["uptime"], server_status["served"]))
+        elif running:
+            log.error("MTH server is already running at '{0}'".format(client.socket_path()))
+            sys.exit(1)
+        else:
+            # server imports the whole command line, so it is imported only when it is really started
+            from framework.classes.Server import Server
+            log.info("MTH server is listening at '{0}'... To finish press Ctrl+C".format(client.socket_path()))
+            Server(client.socket_path()).serve()
@@ -0,0 +1,205 @@
+"""
+This module contains actions related to pushing test data onto mobile devices.
+"""
+
+import framework.utils.argparsing.completion as completion
+import framework.utils.argparsing.types as types
+from action.ActionFactory import ActionFactory
+import framework.utils.parallel as parallel
+import framework.utils.android as android
+import threading
+import hashlib
+import logging
+import time
+import sys
+import os
+
+log = logging.getLogger("action")
+
+# devices keep modification time with whole seconds, some file systems (e.g. FAT on old SD cards) with two seconds
+MTIME_TOLERANCE = 2
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_hash_lock = threading.Lock()
+
+
+class SyncAction(object):
+    """
+    Action to push local directory onto devices.
+    """
+
+    __metaclass__ = ActionFactory
+
+    class Meta(object):
+        """
+        Meta class to describe action.
+        """
+        action = "sync"
+        help = "Push local directory onto Android devices, only files which changed"
+
+    @staticmethod
+    def init_parser(parser):
+        """
+        Initializes argument parser with own arguments.
+
+        :param parser: argparse.ArgumentParser, parser instance to initialize it with custom arguments.
+        """
+        parser.add_argument("source",
+                            help="Local directory to push, e.g. fixtures",
+                            type=types.existent_file)
+        parser.add_argument("target",
+                            help="Directory on device to push to, e.g. /sdcard/fixtures")
+        parser.add_argument("-d", "--devices",
+                            help="Optional, Devices to push onto, by default all connected Android devices",
+                            type=types.connected_android_device,
+                            nargs="+",
+                            default=None).completer = completion.android_devices
+        parser.add_argument("--hash",
+                            dest="use_hash",
+                            help="Optional, Compare MD5 of files which have the same size but different modification "
+                                 "time, e.g. after fresh checkout, by default such files are pushed",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("--delete",
+                            help="Optional, Remove files from device which are not in local directory",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("-n", "--dry-run",
+                            help="Optional, Only show what would be pushed and removed",
+                            action="store_true",
+                            default=False)
+        parser.add_argument("-j", "--jobs",
+                            help="Optional, How many devices to push onto at the same time, by default 4",
+                            type=int,
+                            default=4)
+        parser.add_argument("--per-device",
+                            help="Optional, How many files to push onto one device at the same time, by default 3",
+                            type=int,
+                            default=3)
+
+    def __call__(self, source, target, devices, use_hash, delete, dry_run, jobs, per_device):
+        """
+        Pushes files of local directory which are missing or changed on devices. Files are compared with a listing of
+        device directory made by one command: by size, then by modification time, and by MD5 if it's asked. Local
+        files are listed and hashed once for all devices. Several files are pushed onto every device at the same time,
+        so the next transfer starts while the previous one is finishing, and several devices are synced at once.
+
+        :param source: string, local directory.
+        :param target: string, directory on device.
+        :param devices: list, device identifiers, None for all connected Android devices.
+        :param use_hash: boolean, True to compare MD5 of files with the same size and different modification time.
+        :param delete: boolean, True to remove files which are not in local directory from devices.
+        :param dry_run: boolean, True to only show what would be done.
+        :param jobs: int, how many devices to sync concurrently.
+        :param per_device: int, how many files to push onto one device concurrently.
+        """
+        if not os.path.isdir(source):
+            log.error("Directory expected, but '{0}' given".format(source))
+            sys.exit(1)
+        devices = devices or android.list_devices()
+        if not devices:
+            log.error("No connected Android devices")
+            sys.exit(1)
+        target = target.rstrip("/") or "/"
+
+        local_files = SyncAction._list_local_files(source)
+        local_hashes = {}
+        log.info("Syncing {0} files ({1:.1f}MB) of '{2}' onto {3} devices...".format(
+            len(local_files), sum(size for size, _ in local_files.values()) / 1048576.0, source, len(devices)))
+        started = time.time()
+        for device, result in parallel.imap_unordered(
+                lambda device: (device, SyncAction._sync(device, source, target, local_files, local_hashes, use_hash,
+                                                         delete, dry_run, per_device)), devices, jobs):
+            pushed, size, skipped, removed, elapsed = result
+            log.info("Device '{0}': {1} {2} files ({3:.1f}MB) in {4:.2f}s{5}, {6} unchanged{7}".format(
+                device, "would push" if dry_run else "pushed", pushed, size / 1048576.0, elapsed,
+                " ({0:.1f}MB/s)".format(size / 1048576.0 / elapsed) if elapsed and size and not dry_run else "",
+                skipped, ", {0} {1}".format("would remove" if dry_run else "removed", removed) if delete else ""))
+        log.info("Synced {0} devices in {1:.2f}s".format(len(devices), time.time() - started))
+
+    @staticmethod
+    def _sync(device, source, target, local_files, local_hashes, use_hash, delete, dry_run, per_device):
+        """
+        Syncs one device.
+
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param source: string, local directory.
+        :param target: string, directory on device.
+        :param local_files: dict, tuples of size and modification time by relative path of local files.
+        :param local_hashes: dict, MD5 of local files by relative path, shared by devices, filled as files are hashed.
+        :param use_hash: boolean, True to compare MD5 of files with the same size and different modification time.
+        :param delete: boolean, True to remove files which are not in local directory.
+        :param dry_run: boolean, True to only show what would be done.
+        :param per_device: int, how many files to push concurrently.
+        :returns tuple: number of pushed files, their total size, number of unchanged files, number of removed files
+        and time it took, seconds.
+        """
+        started = time.time()
+        device_files = android.list_files(device, target)
+        changed = []
+        touched = []
+        for path, (size, mtime) in local_files.items():
+            device_file = device_files.get(path)
+            if device_file is None or device_file[0] != size:
+                changed.append(path)
+            elif abs(device_file[1] - int(mtime)) > MTIME_TOLERANCE:
+                touched.append(path)
+        if use_hash and touched:
+            device_hashes = android.hash_files(device, target, touched)
+            changed += [path for path in touched
+                        if device_hashes.get(path) != SyncAction._hash_local(source, path, local_hashes)]
+        else:
+            changed += touched
+        extra = sorted(path for path in device_files if path not in local_files) if delete else []
+        if dry_run:
+            for path in sorted(changed):
+                log.info("Device '{0}': would push '{1}'".format(device, path))
+            for path in extra:
+                log.info("Device '{0}': would remove '{1}'".format(device, path))
+        else:
+            # the largest files first, so small ones fill the gaps at the end and no transfer is left alone
+            changed.sort(key=lambda path: -local_files[path][0])
+            for _ in parallel.imap_unordered(
+                    lambda path: android.upload_file(device, os.path.join(source, path),
+                                                     "{0}/{1}".format(target.rstrip("/"), path)),
+                    changed, per_device):
+                pass
+            if extra:
+                android.remove_files(device, target, extra)
+        return (len(changed), sum(local_files[path][0] for path in changed), len(local_files) - len(changed),
+                len(extra), time.time() - started)
+
+    @staticmethod
+    def _list_local_files(source):
+        """
+        :param source: string, local directory.
+        :returns dict: tuples of size and modification time by path relative to directory, with "/" as separator.
+        """
+        files = {}
+        for directory, _, names in os.walk(source):
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    files[os.path.relpath(path, source).replace(os.sep, "/")] = (stat.st_size, stat.st_mtime)
+        return files
+
+    @staticmethod
+    def _hash_local(source, path, local_hashes):
+        """
+        Returns MD5 of local file, every file is hashed once for all devices.
+
+        :param source: string, local directory.
+        :param path: string, path relative to directory.
+        :param local_hashes: dict, MD5 of local files by relative path, it is updated.
+        :returns string: MD5 as hex string.
+        """
+        with _hash_lock:
+            if path not in local_hashes:
+                md5 = hashlib.md5()
+                with open(os.path.join(source, path), "rb") as local_file:
+                    for chunk in iter(lambda: local_file.read(HASH_CHUNK_SIZE), ""):
+                        md5.update(chunk)
+                local_hashes[path] = md5.hexdigest()
+            return local_hashes[path]
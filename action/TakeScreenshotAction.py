@@ -5,11 +5,17 @@ This module contains actions related to taking screenshots from mobile devices.
 import framework.utils.argparsing.completion as completion
 import framework.utils.argparsing.defaults as defaults
 import framework.utils.argparsing.types as types
+from framework.classes.ScreenshotArchive import ScreenshotArchive
+from framework.classes.RecordWriter import RecordWriter
 from action.ActionFactory import ActionFactory
+import framework.utils.properties as properties
 import framework.utils.android as android
+import framework.utils.catalog as catalog
 import framework.utils.console as console
 import framework.utils.ios as ios
+import tempfile
 import logging
+import shutil
 import time
 import sys
 import os
@@ -53,45 +59,245 @@ class TakeScreenshotAction(object):
                             default=None,
                             nargs='+').completer = completion.supported_locales
 
-    def __call__(self, device, howmany=1, **locales):
+        parser.add_argument("--all-devices",
+                            help="Take screenshots from all connected devices at once",
+                            action="store_true",
+                            default=False)
+
+        parser.add_argument("-j", "--jobs",
+                            help="How many iOS devices to capture at the same time, by default 8",
+                            type=int,
+                            default=8)
+
+        parser.add_argument("--diff",
+                            help="Compare two screenshot sets instead of taking screenshots, e.g. of the previous and "
+                                 "the current build, exits with code 1 if they differ",
+                            metavar=("BASE_DIR", "NEW_DIR"),
+                            type=types.existent_file,
+                            nargs=2,
+                            default=None)
+
+        parser.add_argument("--tolerance",
+                            help="Maximum difference of color channel (0-255) for pixels to be the same, by default 0",
+                            type=int,
+                            default=0)
+
+        parser.add_argument("-f", "--format",
+                            help="Format of diff report, by default table",
+                            dest="output_format",
+                            choices=RecordWriter.formats,
+                            default="table")
+
+        parser.add_argument("--archive",
+                            help="Put screenshots into a single archive as they are taken instead of a directory",
+                            choices=ScreenshotArchive.formats,
+                            default=None)
+
+        parser.add_argument("--archive-compress",
+                            help="Compress screenshots in archive, by default they are stored as is (PNG is compressed)",
+                            action="store_true",
+                            default=False)
+
+        parser.add_argument("--extract",
+                            help="Extract screenshots matching the given names (shell-style patterns) from archive "
+                                 "instead of taking screenshots",
+                            metavar=("ARCHIVE", "NAME"),
+                            nargs="+",
+                            default=None)
+
+    def __call__(self, device, howmany, locales, all_devices, jobs, diff, tolerance, output_format, archive,
+                 archive_compress, extract):
         """
-        Takes one or more screenshots from specified device.
+        Takes one or more screenshots from specified device, or from all connected devices.
 
         :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param howmany: int, how many screenshots to take from every device.
+        :param locales: list, locales to take Android screenshots for, by default the current one.
+        :param all_devices: boolean, True to take screenshots from all connected devices.
+        :param jobs: int, how many iOS devices to capture concurrently.
+        :param diff: list, directories with base and new screenshots to compare instead of taking screenshots.
+        :param tolerance: int, maximum difference of color channel for pixels to be the same.
+        :param output_format: string, format of diff report: "ndjson", "csv" or "table".
+        :param archive: string, "zip" or "tar" to put screenshots into archive, None to save them as files.
+        :param archive_compress: boolean, True to compress screenshots in archive.
+        :param extract: list, path to archive and names of screenshots to extract instead of taking screenshots.
         """
-        locales = locales.values()[0]
-        if device is None:
-            devices = android.list_devices() + ios.list_devices()
-            device = console.prompt_for_options("Choose device", devices)
+        if diff:
+            TakeScreenshotAction._diff(diff[0], diff[1], tolerance, output_format)
+            return
+        if extract:
+            TakeScreenshotAction._extract(extract[0], extract[1:] or ["*"])
+            return
+
+        android_devices = android.list_devices()
+        ios_devices = ios.list_devices()
+        if all_devices:
+            devices = android_devices + ios_devices
+        elif device is None:
+            devices = [console.prompt_for_options("Choose device", android_devices + ios_devices)]
+        else:
+            devices = [device]
+        for unknown in set(devices) - set(android_devices + ios_devices):
+            log.error("Unknown device given: '{0}'".format(unknown))
+            sys.exit(1)
 
         target_dir = os.getcwd()
-        many_screenshots = howmany > 1 or (locales and len(locales) > 1)
-        if many_screenshots:
+        many_screenshots = howmany > 1 or (locales and len(locales) > 1) or len(devices) > 1
+        screenshot_archive = None
+        if archive:
+            archive_path = os.path.join(target_dir, "{0}.{1}".format(
+                int(time.time() * 1000), archive if not archive_compress or archive == "zip" else "tar.gz"))
+            screenshot_archive = ScreenshotArchive(archive_path, archive, archive_compress)
+            # screenshots are taken into temporary directory and moved into archive one by one
+            target_dir = tempfile.mkdtemp(prefix="mth")
+        elif many_screenshots:
             target_dir = os.path.join(target_dir, str(int(time.time() * 1000)))
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
-
-        for i in range(0, howmany):
-            if device in android.list_devices():
-                model = android.get_device_model(device).lower().replace(" ", "")
-                manufacturer = android.get_manufacturer(device).lower().replace(" ", "")
-                timestamp = str(int(time.time() * 1000))
-                screenshot_name = "{0}_{1}_{2}.png".format(model, manufacturer, timestamp)
-                if locales:
-                    locale_before = android.get_locale(device)
-                    for locale in locales:
-                        android.set_locale(device, locale)
-                        android.take_screenshot(device, target_dir, locale + "_" + screenshot_name)
-                    android.set_locale(device, locale_before)
-                else:
-                    android.take_screenshot(device, target_dir, screenshot_name)
-            elif device in ios.list_devices():
-                model = ios.get_device_model(device).lower().replace(" ", "")
-                timestamp = str(int(time.time() * 1000))
-                screenshot_name = "{0}_{1}.png".format(model, timestamp)
-                ios.take_screenshot(device, target_dir, screenshot_name)
+        device_dirs = dict((serial, os.path.join(target_dir, serial) if len(devices) > 1 else target_dir)
+                           for serial in devices)
+        for directory in set(device_dirs.values()):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        on_screenshot = None
+        if screenshot_archive:
+            on_screenshot = lambda path: screenshot_archive.add(path, os.path.relpath(path, target_dir))
+        started = time.time()
+        try:
+            ios_targets = [(serial, device_dirs[serial]) for serial in devices if serial in ios_devices]
+            paths = ios.take_screenshots(ios_targets, howmany, jobs, on_screenshot) if ios_targets else []
+            for serial in devices:
+                if serial in android_devices:
+                    paths += TakeScreenshotAction._take_android_screenshots(serial, device_dirs[serial], howmany,
+                                                                            locales, on_screenshot)
+        finally:
+            if screenshot_archive:
+                screenshot_archive.close()
+                shutil.rmtree(target_dir, ignore_errors=True)
+        elapsed = time.time() - started
+        TakeScreenshotAction._catalog(devices, android_devices, device_dirs, paths, locales, screenshot_archive)
+        if len(paths) > 1:
+            log.info("Took {0} screenshots in {1:.2f}s ({2:.2f} shots/s)".format(
+                len(paths), elapsed, len(paths) / elapsed if elapsed else 0))
+        if screenshot_archive:
+            log.info("Find result at " + screenshot_archive.path)
+        else:
+            log.info("Find result at " + (target_dir if many_screenshots else paths[0]))
+
+    @staticmethod
+    def _diff(base_dir, new_dir, tolerance, output_format):
+        """
+        Compares screenshots of two sets, saves diff masks and prints report.
+
+        :param base_dir: string, directory with base screenshots.
+        :param new_dir: string, directory with new screenshots.
+        :param tolerance: int, maximum difference of color channel for pixels to be the same.
+        :param output_format: string, format of report: "ndjson", "csv" or "table".
+        """
+        # NumPy and Pillow take a while to import, so they are imported only when screenshots are really compared
+        import framework.utils.imagediff as imagediff
+
+        pairs = imagediff.pair(base_dir, new_dir)
+        if not pairs:
+            log.error("No screenshots found in '{0}' and '{1}'".format(base_dir, new_dir))
+            sys.exit(1)
+        output_dir = os.path.join(os.getcwd(), "diff_{0}".format(int(time.time() * 1000)))
+        started = time.time()
+        writer = RecordWriter(output_format, ["name", "status", "ratio", "mask"])
+        statuses = {}
+        try:
+            for result in imagediff.compare_all(pairs, output_dir, tolerance):
+                statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+                if output_format != "table" or result["status"] != "same":
+                    writer.write(dict(result, ratio=float("{0:.6g}".format(result["ratio"]))))
+        finally:
+            writer.close()
+        log.info("Compared {0} screenshots in {1:.2f}s: {2}".format(
+            len(pairs), time.time() - started, ", ".join("{0} {1}".format(number, status)
+                                                        for status, number in sorted(statuses.items()))))
+        if len(pairs) != statuses.get("same", 0):
+            log.info("Find diff masks at " + output_dir)
+            sys.exit(1)
+
+    @staticmethod
+    def _extract(archive_path, patterns):
+        """
+        Extracts screenshots from archive into the current directory.
+
+        :param archive_path: string, path to archive made by --archive.
+        :param patterns: list, names of screenshots or shell-style patterns.
+        """
+        if not os.path.exists(archive_path):
+            log.error("Archive '{0}' does not exist".format(archive_path))
+            sys.exit(1)
+        try:
+            paths = ScreenshotArchive.extract(archive_path, patterns, os.getcwd())
+        except ValueError as e:
+            log.error("Refusing to extract '{0}': {1}".format(archive_path, e))
+            sys.exit(1)
+        if not paths:
+            log.error("No screenshots matching {0} in '{1}'".format(", ".join(patterns), archive_path))
+            sys.exit(1)
+        for path in paths:
+            log.info("Extracted " + path)
+
+    @staticmethod
+    def _catalog(devices, android_devices, device_dirs, paths, locales, screenshot_archive):
+        """
+        Records taken screenshots in catalog of artifacts, or the archive for every device if they are archived.
+
+        :param devices: list, device identifiers screenshots are taken from.
+        :param android_devices: list, identifiers of connected Android devices.
+        :param device_dirs: dict, directories screenshots of device are saved to by device identifier.
+        :param paths: list, paths of taken screenshots.
+        :param locales: list, locales screenshots are taken for, their names start with the locale.
+        :param screenshot_archive: ScreenshotArchive, archive screenshots are put into, None if they are files.
+        """
+        artifacts = []
+        for device in devices:
+            platform = "android" if device in android_devices else "ios"
+            description = catalog.describe(device, platform)
+            if screenshot_archive:
+                artifacts.append(catalog.artifact(screenshot_archive.path, "screenshot", device, platform,
+                                                  description["model"], None, "archive"))
+                continue
+            for path in paths:
+                if os.path.dirname(path) == device_dirs[device]:
+                    locale = os.path.basename(path).split("_")[0] if locales else description["locale"]
+                    artifacts.append(catalog.artifact(path, "screenshot", device, platform, description["model"],
+                                                      locale))
+        catalog.add(artifacts)
+
+    @staticmethod
+    def _take_android_screenshots(device, target_dir, howmany, locales, on_screenshot=None):
+        """
+        Takes screenshots from Android device, for every locale if they are given.
+
+        :param device: string, device identifier (e.g. "TA9890AMTG").
+        :param target_dir: string, directory where to save screenshots.
+        :param howmany: int, how many screenshots to take.
+        :param locales: list, locales to take screenshots for, None for the current one.
+        :param on_screenshot: function(path) to call as soon as screenshot is taken.
+        :returns list: paths of taken screenshots.
+        """
+        device_properties = properties.get(device, "model", "manufacturer", *(["locale"] if locales else []))
+        model = device_properties["model"].lower().replace(" ", "")
+        manufacturer = device_properties["manufacturer"].lower().replace(" ", "")
+        names = []
+        for _ in range(0, howmany):
+            timestamp = str(int(time.time() * 1000))
+            screenshot_name = "{0}_{1}_{2}.png".format(model, manufacturer, timestamp)
+            if locales:
+                for locale in locales:
+                    android.set_locale(device, locale)
+                    android.take_screenshot(device, target_dir, locale + "_" + screenshot_name)
+                    names.append(locale + "_" + screenshot_name)
+                    if on_screenshot:
+                        on_screenshot(os.path.join(target_dir, names[-1]))
+                if device_properties["locale"]:
+                    android.set_locale(device, device_properties["locale"])
             else:
-                log.error("Unknown device given: '{0}'", format(device))
-                sys.exit(1)
-        # noinspection PyUnboundLocalVariable
-        log.info("Find result at " + (target_dir if many_screenshots else os.path.join(target_dir, screenshot_name)))
+                android.take_screenshot(device, target_dir, screenshot_name)
+                names.append(screenshot_name)
+                if on_screenshot:
+                    on_screenshot(os.path.join(target_dir, names[-1]))
+        return [os.path.join(target_dir, name) for name in names]
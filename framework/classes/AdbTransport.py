@@ -0,0 +1,110 @@
+"""
+This module contains AdbTransport - classes that describe how adb reaches a device: through the local adb server, as a
+network device connected by "adb connect", or through another adb server (e.g. a device hub on another machine).
+"""
+
+import re
+
+# whole lines adb client prints when connection to device or server is gone, other output of failed command (e.g.
+# "Stream closed" of the command itself) must not match: the command would be run again
+DROPPED_REGEX = re.compile(r"^(?:adb: )?(?:error: )?(?:device offline|device '[^']*' not found|device not found|"
+                           r"no devices/emulators found|protocol fault \(.*|cannot connect to daemon\b.*)\s*$|"
+                           r"^(?:adb: )?error: (?:closed|failed to connect to .*)\s*$", re.MULTILINE)
+
+
+class AdbTransport(object):
+    """
+    Device attached to the local adb server, e.g. by USB. Such connection can't be restored by MTH, so commands are not
+    retried when it drops.
+    """
+
+    remote = False
+    reconnects = False
+
+    def __init__(self, device):
+        """
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        """
+        self.device = device
+        self.serial = device
+        self.host = "localhost"
+
+    def server_arguments(self):
+        """
+        :returns list: adb arguments to choose adb server, empty for the local one.
+        """
+        return []
+
+    def command(self, *arguments):
+        """
+        :param arguments: strings, adb arguments, e.g. "shell", "getprop".
+        :returns list: full adb command for the device, e.g. ["adb", "-s", "TA9890AMTG", "shell", "getprop"].
+        """
+        return ["adb"] + self.server_arguments() + ["-s", self.serial] + list(arguments)
+
+    def is_dropped(self, output):
+        """
+        :param output: string, output of failed command, messages of adb client are looked for as whole lines.
+        :returns boolean: True if command failed because connection to device dropped.
+        """
+        return bool(DROPPED_REGEX.search(output))
+
+    def reconnect_commands(self):
+        """
+        :returns list: commands to restore connection to device, they are run in order and their failures are ignored.
+        """
+        return []
+
+    def __repr__(self):
+        return "{0}({1!r})".format(type(self).__name__, self.device)
+
+
+class TcpAdbTransport(AdbTransport):
+    """
+    Network device connected to the local adb server by "adb connect <host>:<port>". When it drops, it is disconnected
+    and connected again.
+    """
+
+    remote = True
+    reconnects = True
+
+    def __init__(self, device):
+        """
+        :param device: string, address of device, e.g. "192.168.1.20:5555".
+        """
+        super(TcpAdbTransport, self).__init__(device)
+        self.host = device.rsplit(":", 1)[0]
+
+    def reconnect_commands(self):
+        return [["adb"] + self.server_arguments() + ["disconnect", self.serial],
+                ["adb"] + self.server_arguments() + ["connect", self.serial]]
+
+
+class ServerAdbTransport(AdbTransport):
+    """
+    Device attached to another adb server, identified as "<serial>@<host>:<port>", e.g. "emulator-5554@hub1:5037".
+    Every adb client call opens a new connection to the server, so there is nothing to restore on drop but the command
+    is retried once. Network devices of that server are connected again as for TcpAdbTransport.
+    """
+
+    remote = True
+    reconnects = True
+
+    def __init__(self, device):
+        """
+        :param device: string, device identifier, e.g. "emulator-5554@hub1:5037".
+        """
+        super(ServerAdbTransport, self).__init__(device)
+        self.serial, address = device.rsplit("@", 1)
+        self.host, port = address.rsplit(":", 1)
+        self.port = int(port)
+
+    def server_arguments(self):
+        return ["-H", self.host, "-P", str(self.port)]
+
+    def reconnect_commands(self):
+        if not re.match(r"^[\w.-]+:\d+$", self.serial):
+            return []
+        return [["adb"] + self.server_arguments() + ["disconnect", self.serial],
+                ["adb"] + self.server_arguments() + ["connect", self.serial]]
+
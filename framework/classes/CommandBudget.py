@@ -0,0 +1,52 @@
+"""
+This module contains CommandBudget - class that keeps the rate of commands several threads run on host under a limit.
+"""
+
+import threading
+import time
+
+
+class CommandBudget(object):
+    """
+    Token bucket shared by threads. Every command takes a token, tokens come back at the given rate and no more than
+    burst of them are saved up, so short bursts are allowed but the average rate never exceeds the budget.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: float, maximum average number of commands per second.
+        :param burst: float, maximum number of commands run at once after a quiet period, by default rate (but at
+        least 2).
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 2))
+        self.commands = 0
+        self.waited = 0.0
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1, stop=None):
+        """
+        Waits till the given number of commands fits into budget and takes it.
+
+        :param cost: int, number of commands to run.
+        :param stop: threading.Event, set to give up waiting.
+        :returns boolean: True if commands may be run, False if stop was set while waiting.
+        """
+        cost = min(cost, self.burst)
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    self.commands += cost
+                    return True
+                wait = (cost - self._tokens) / self.rate
+                self.waited += wait
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
@@ -0,0 +1,162 @@
+"""
+This module contains CrashDetector - class that watches device log as it is captured and collects evidence of crashes.
+"""
+
+import framework.utils.properties as properties
+import framework.utils.android as android
+import framework.utils.ios as ios
+from collections import deque
+import threading
+import logging
+import json
+import time
+import os
+import re
+
+log = logging.getLogger("mth.utils")
+
+# every alternative is a named group, so one search per line finds both the fact and the kind of failure
+ANDROID_CRASH_REGEX = re.compile(r"(?P<crash>FATAL EXCEPTION|am_crash\b|Force finishing activity)|"
+                                 r"(?P<anr>ANR in |am_anr\b|Application Not Responding)|"
+                                 r"(?P<signal>Fatal signal \d+|\*\*\* \*\*\* \*\*\* \*\*\* \*\*\*)")
+IOS_CRASH_REGEX = re.compile(r"(?P<crash>Terminating app due to uncaught exception|Exception Type:|ReportCrash)|"
+                             r"(?P<anr>failed to scene-(?:create|update) in time|watchdog transgression)|"
+                             r"(?P<signal>exited (?:abnormally )?(?:with|due to) signal|EXC_BAD_ACCESS|EXC_CRASH)")
+
+
+class CrashDetector(object):
+    """
+    Scans log lines for crashes, ANRs and fatal signals. On a match the screenshot is taken right away from a separate
+    thread, so the screen still shows the failure, then device info is saved and, once enough lines followed, the log
+    window around the match. Matches within cooldown after an incident (e.g. the rest of a stack trace) belong to it.
+    """
+
+    def __init__(self, device, platform, target_dir, before=200, after=50, cooldown=5.0, after_timeout=3.0):
+        """
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param platform: string, "android" or "ios".
+        :param target_dir: string, directory to save evidence of incidents to, a subdirectory per incident.
+        :param before: int, number of log lines before match to save.
+        :param after: int, number of log lines after match to save.
+        :param cooldown: float, time after incident when new matches belong to it, seconds.
+        :param after_timeout: float, maximum time to wait for lines after match, seconds.
+        """
+        self.device = device
+        self.platform = platform
+        self.target_dir = target_dir
+        self.after = after
+        self.cooldown = cooldown
+        self.after_timeout = after_timeout
+        self.incidents = 0
+        self._regex = ANDROID_CRASH_REGEX if platform == "android" else IOS_CRASH_REGEX
+        self._lines = deque(maxlen=before)
+        self._incident = None
+        self._last_match = 0
+        self._threads = []
+        # resolved in advance, so nothing but the screenshot itself runs when failure is found
+        self._sdk_version = int(android.get_sdk_version(device) or 0) if platform == "android" else None
+
+    def feed(self, line):
+        """
+        Checks the given log line, called for every line as soon as it's captured.
+
+        :param line: string, log line.
+        """
+        incident = self._incident
+        if incident is not None:
+            incident["after"].append(line)
+            if len(incident["after"]) >= self.after:
+                incident["complete"].set()
+                self._incident = None
+        match = self._regex.search(line)
+        if match:
+            now = time.time()
+            if now - self._last_match > self.cooldown:
+                self._start_incident(match.lastgroup, line)
+            self._last_match = now
+        self._lines.append(line)
+
+    def close(self):
+        """
+        Waits till evidence of all incidents is saved.
+        """
+        if self._incident is not None:
+            self._incident["complete"].set()
+            self._incident = None
+        for thread in self._threads:
+            thread.join()
+
+    def _start_incident(self, kind, line):
+        """
+        Starts collecting evidence of incident.
+
+        :param kind: string, "crash", "anr" or "signal".
+        :param line: string, log line which matched.
+        """
+        self.incidents += 1
+        directory = os.path.join(self.target_dir, "{0:03d}_{1}_{2}".format(self.incidents, kind,
+                                                                          int(time.time() * 1000)))
+        os.makedirs(directory)
+        log.warning("Detected {0} on device '{1}': {2}".format(kind, self.device, line.strip()))
+        if self._incident is not None:
+            self._incident["complete"].set()
+        incident = {"kind": kind, "line": line, "directory": directory, "before": list(self._lines), "after": [line],
+                    "complete": threading.Event(), "detected": time.time()}
+        self._incident = incident
+        thread = threading.Thread(target=self._collect, args=(incident,), name="incident-{0}".format(self.incidents))
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _collect(self, incident):
+        """
+        Saves evidence of incident: screenshot, device info and log window.
+
+        :param incident: dict, incident to collect evidence of.
+        """
+        directory = incident["directory"]
+        self._try("screenshot", self._take_screenshot, os.path.join(directory, "screenshot.png"))
+        screenshot_latency = time.time() - incident["detected"]
+        self._try("device info", self._save_info, os.path.join(directory, "device.json"), incident)
+        incident["complete"].wait(self.after_timeout)
+        with open(os.path.join(directory, "log.txt"), "w") as window:
+            window.writelines(incident["before"] + list(incident["after"]))
+        log.info("Saved evidence of {0} to '{1}', screenshot taken {2:.2f}s after detection".format(
+            incident["kind"], directory, screenshot_latency))
+
+    def _take_screenshot(self, path):
+        """
+        :param path: string, path to save screenshot to.
+        """
+        if self.platform == "android":
+            android.capture_screen(self.device, path, self._sdk_version)
+        else:
+            ios.take_screenshot(self.device, os.path.dirname(path), os.path.basename(path))
+
+    def _save_info(self, path, incident):
+        """
+        :param path: string, path to save device info to.
+        :param incident: dict, incident.
+        """
+        if self.platform == "android":
+            info = properties.get(self.device, "manufacturer", "model", "os_version", "sdk_version", "locale",
+                                  "resolution", "ip_address", "boot_id")
+        else:
+            info = ios.get_info(self.device, refresh=True)
+        record = {"device": self.device, "platform": self.platform, "kind": incident["kind"],
+                  "line": incident["line"].strip(), "detected": incident["detected"], "info": info}
+        with open(path, "w") as info_file:
+            json.dump(record, info_file, indent=2, default=str)
+
+    def _try(self, what, function, *args):
+        """
+        Calls function, failure to collect one piece of evidence doesn't stop collecting the others.
+
+        :param what: string, name of evidence, e.g. "screenshot".
+        :param function: function to call.
+        :param args: arguments of function.
+        """
+        try:
+            function(*args)
+        except (SystemExit, Exception) as e:
+            log.warning("Failed to save {0} of incident on device '{1}': {2}".format(what, self.device, e))
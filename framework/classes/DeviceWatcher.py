@@ -0,0 +1,195 @@
+"""
+This module contains DeviceWatcher - class that tracks attached devices by events instead of polling.
+"""
+
+import framework.utils.transport as transport
+import framework.utils.console as console
+import threading
+import plistlib
+import logging
+import socket
+import struct
+import os
+
+log = logging.getLogger("mth.utils")
+
+
+class DeviceWatcher(object):
+    """
+    Tracks Android devices via "host:track-devices" stream of adb server and iOS devices via "Listen" messages of
+    usbmuxd. Whenever the set of devices of a platform changes, on_change(platform, devices) is called with the full list.
+    When an event source is lost, on_change(platform, None) is called and the watcher reconnects after a delay. If there
+    is no usbmuxd socket, iOS devices are polled with idevice_id instead.
+    """
+
+    def __init__(self, on_change, adb_address=("127.0.0.1", 5037), usbmuxd_path="/var/run/usbmuxd",
+                 retry_interval=2.0, platforms=("android", "ios")):
+        """
+        :param on_change: function(platform, devices) to call when devices change.
+        :param adb_address: tuple, host and port of adb server.
+        :param usbmuxd_path: string, path to usbmuxd unix socket.
+        :param retry_interval: float, delay before reconnection and iOS polling interval, seconds.
+        :param platforms: tuple, platforms to track.
+        """
+        self.on_change = on_change
+        self.adb_address = adb_address
+        self.usbmuxd_path = usbmuxd_path
+        self.retry_interval = retry_interval
+        self.platforms = platforms
+        self._stopped = threading.Event()
+        self._sockets = {}
+        self._threads = []
+
+    def start(self):
+        """
+        Starts tracking in background threads.
+        """
+        self._stopped.clear()
+        for platform, target in (("android", self._track_android), ("ios", self._track_ios)):
+            if platform not in self.platforms:
+                continue
+            thread = threading.Thread(target=self._run, args=(platform, target), name="watcher-" + platform)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stops tracking.
+        """
+        self._stopped.set()
+        for connection in self._sockets.values():
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        for thread in self._threads:
+            thread.join(self.retry_interval)
+        self._threads = []
+
+    def _run(self, platform, target):
+        """
+        Runs tracking of platform till the watcher is stopped, reconnects when event source is lost.
+
+        :param platform: string, "android" or "ios".
+        :param target: function to track devices of platform, returns when source is lost.
+        """
+        while not self._stopped.is_set():
+            try:
+                target()
+            except (socket.error, IOError, OSError, ValueError) as e:
+                log.debug("Lost {0} device events: {1}".format(platform, e))
+            finally:
+                self._close(platform)
+            if self._stopped.is_set():
+                break
+            self.on_change(platform, None)
+            self._stopped.wait(self.retry_interval)
+
+    def _track_android(self):
+        """
+        Reads device list updates from adb server, each update is the full "adb devices" list.
+        """
+        connection = self._connect(socket.AF_INET, self.adb_address, "android")
+        if connection is None:
+            # adb server is started by any adb command, failure is found out by the next connection attempt
+            console.run(["adb", "start-server"])
+            connection = self._connect(socket.AF_INET, self.adb_address, "android")
+        if connection is None:
+            raise IOError("adb server does not accept connections")
+        request = "host:track-devices"
+        connection.sendall("{0:04x}{1}".format(len(request), request))
+        status = transport.read_exactly(connection, 4)
+        if status != "OKAY":
+            raise IOError("adb server refused to track devices: " + status)
+        while not self._stopped.is_set():
+            length = int(transport.read_exactly(connection, 4), 16)
+            payload = transport.read_exactly(connection, length) if length else ""
+            devices = [line.split("\t")[0] for line in payload.split("\n") if line.strip()]
+            self.on_change("android", devices)
+
+    def _track_ios(self):
+        """
+        Reads attach/detach messages from usbmuxd, or polls idevice_id if usbmuxd socket is not available.
+        """
+        if not os.path.exists(self.usbmuxd_path):
+            while not self._stopped.is_set():
+                returncode, stdout, stderr = console.run(["idevice_id", "-l"])
+                if returncode != 0:
+                    raise IOError("idevice_id failed: {0}{1}".format(stderr, stdout))
+                self.on_change("ios", filter(None, stdout.split("\n")))
+                self._stopped.wait(self.retry_interval)
+            return
+        connection = self._connect(socket.AF_UNIX, self.usbmuxd_path, "ios")
+        if connection is None:
+            raise IOError("usbmuxd does not accept connections")
+        _send_plist(connection, {"MessageType": "Listen", "ClientVersionString": "mth", "ProgName": "mth"})
+        reply = _read_plist(connection)
+        if reply.get("Number", 0) != 0:
+            raise IOError("usbmuxd refused to listen: {0}".format(reply))
+        devices = {}
+        self.on_change("ios", [])
+        while not self._stopped.is_set():
+            message = _read_plist(connection)
+            message_type = message.get("MessageType")
+            if message_type == "Attached":
+                properties = message.get("Properties", {})
+                if properties.get("ConnectionType", "USB") == "USB":
+                    devices[message["DeviceID"]] = properties["SerialNumber"]
+            elif message_type == "Detached":
+                devices.pop(message.get("DeviceID"), None)
+            else:
+                continue
+            self.on_change("ios", sorted(devices.values()))
+
+    def _connect(self, family, address, platform):
+        """
+        Connects to event source.
+
+        :param family: socket family, e.g. socket.AF_UNIX.
+        :param address: socket address.
+        :param platform: string, "android" or "ios".
+        :returns socket.socket: connection, or None if source does not accept connections.
+        """
+        self._close(platform)
+        connection = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            connection.connect(address)
+        except socket.error:
+            connection.close()
+            return None
+        self._sockets[platform] = connection
+        return connection
+
+    def _close(self, platform):
+        """
+        Closes connection to event source of platform, if any.
+
+        :param platform: string, "android" or "ios".
+        """
+        connection = self._sockets.pop(platform, None)
+        if connection is not None:
+            connection.close()
+
+
+def _send_plist(connection, message):
+    """
+    Sends plist message to usbmuxd.
+
+    :param connection: socket.socket, connection to usbmuxd.
+    :param message: dict, message to send.
+    """
+    payload = plistlib.writePlistToString(message)
+    # length, protocol version (1 - plist), message type (8 - plist), tag
+    connection.sendall(struct.pack("<IIII", 16 + len(payload), 1, 8, 1) + payload)
+
+
+def _read_plist(connection):
+    """
+    Reads plist message from usbmuxd.
+
+    :param connection: socket.socket, connection to usbmuxd.
+    :returns dict: message read.
+    """
+    length, _, _, _ = struct.unpack("<IIII", transport.read_exactly(connection, 16))
+    return plistlib.readPlistFromString(transport.read_exactly(connection, length - 16))
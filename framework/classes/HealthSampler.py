@@ -0,0 +1,138 @@
+"""
+This module contains HealthSampler - class that samples battery, temperature, storage and connectivity of device.
+"""
+
+from framework.classes.ShellSession import ShellSession
+import framework.utils.transport as transport
+import framework.utils.console as console
+import plistlib
+import time
+import re
+
+# one round trip per sample: battery state, free space of /data and network interfaces which are up; output is
+# filtered on host, devices older than 6.0 have neither grep nor tail
+ANDROID_COMMAND = ("dumpsys battery; "
+                   "df /data 2>/dev/null | while read -r line; do echo \"df:$line\"; done; "
+                   "for net in /sys/class/net/*; do "
+                   "[ \"$(cat $net/operstate 2>/dev/null)\" = up ] && echo \"net:${net##*/}\"; done; true")
+
+# toybox df prints 1K blocks, toolbox df of old devices prints sizes with units, e.g. "9.4G"
+SIZE_REGEX = re.compile(r"^([\d.]+)([KMGT]?)$")
+SIZE_UNITS = {"": 1, "K": 1, "M": 1024, "G": 1024 ** 2, "T": 1024 ** 3}
+
+
+class HealthSampler(object):
+    """
+    Samples battery level, battery temperature, charging, free storage and network interfaces which are up. Android
+    values are read by a single command in own persistent shell, iOS values by two host commands (diagnostics of
+    battery and disk usage domain of lockdown), iOS doesn't expose network interfaces.
+    """
+
+    columns = ("time", "serial", "platform", "online", "battery_level", "temperature", "charging", "storage_free_mb",
+               "connectivity")
+
+    def __init__(self, device, platform):
+        """
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param platform: string, "android" or "ios".
+        """
+        self.device = device
+        self.platform = platform
+        # host commands per sample, they are counted against the command budget of monitor
+        self.cost = 1 if platform == "android" else 2
+        self._session = ShellSession(device, transport.command(device, "shell")) if platform == "android" else None
+
+    def sample(self):
+        """
+        Takes one sample.
+
+        :returns dict: values by column name, values which can't be read (e.g. device is detached) are None.
+        """
+        values = dict((column, None) for column in HealthSampler.columns)
+        values.update({"time": round(time.time(), 3), "serial": self.device, "platform": self.platform})
+        if self.platform == "android":
+            values.update(self._sample_android())
+        else:
+            values.update(self._sample_ios())
+        values["online"] = values["battery_level"] is not None
+        return values
+
+    def close(self):
+        """
+        Closes shell session to device.
+        """
+        if self._session:
+            self._session.close()
+
+    def _sample_android(self):
+        """
+        :returns dict: values read from Android device.
+        """
+        _, output = self._session.run(ANDROID_COMMAND)
+        fields = {}
+        interfaces = []
+        for line in output.split("\n"):
+            # other lines of dumpsys battery are read too, only known names are used; the last "df" line is of /data
+            name, _, value = line.partition(":")
+            if name == "net":
+                interfaces.append(value.strip())
+            else:
+                fields[name.strip()] = value.strip()
+        if not fields.get("level", "").isdigit():
+            return {}
+        scale = int(fields["scale"]) if fields.get("scale", "").isdigit() and int(fields["scale"]) else 100
+        values = {"battery_level": int(round(100.0 * int(fields["level"]) / scale)),
+                  "charging": any(fields.get(source) == "true" for source in ("AC powered", "USB powered",
+                                                                              "Wireless powered")),
+                  "connectivity": ",".join(sorted(net for net in interfaces if net != "lo"))}
+        if re.match(r"^-?\d+$", fields.get("temperature", "")):
+            # tenths of degree Celsius
+            values["temperature"] = int(fields["temperature"]) / 10.0
+        df = fields.get("df", "").split()
+        if len(df) > 3:
+            values["storage_free_mb"] = _parse_size(df[3])
+        return values
+
+    def _sample_ios(self):
+        """
+        :returns dict: values read from iOS device.
+        """
+        values = {}
+        returncode, stdout, _ = console.run(["idevicediagnostics", "-u", self.device, "ioregentry",
+                                             "AppleSmartBattery"])
+        battery = _parse_plist(stdout) if returncode == 0 else {}
+        battery = battery.get("IORegistry", battery)
+        if battery.get("CurrentCapacity") is not None and battery.get("MaxCapacity"):
+            values["battery_level"] = int(round(100.0 * battery["CurrentCapacity"] / battery["MaxCapacity"]))
+            values["charging"] = bool(battery.get("IsCharging") or battery.get("ExternalConnected"))
+        if battery.get("Temperature") is not None:
+            # hundredths of degree Celsius
+            values["temperature"] = battery["Temperature"] / 100.0
+        returncode, stdout, _ = console.run(["ideviceinfo", "-u", self.device, "-q", "com.apple.disk_usage", "-x"])
+        disk = _parse_plist(stdout) if returncode == 0 else {}
+        if disk.get("TotalDataAvailable") is not None:
+            values["storage_free_mb"] = disk["TotalDataAvailable"] // (1024 * 1024)
+        return values
+
+
+def _parse_size(size):
+    """
+    :param size: string, size printed by df, e.g. "47484864" (kB) or "9.4G".
+    :returns int: size, MB, None if it can't be parsed.
+    """
+    match = SIZE_REGEX.match(size)
+    if not match:
+        return None
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)] / 1024)
+
+
+def _parse_plist(output):
+    """
+    :param output: string, XML property list.
+    :returns dict: values of property list, empty if it can't be parsed.
+    """
+    try:
+        values = plistlib.readPlistFromString(output)
+    except Exception:
+        return {}
+    return values if isinstance(values, dict) else {}
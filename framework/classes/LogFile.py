@@ -0,0 +1,63 @@
+"""
+This module contains LogFile - class that writes streamed log lines to disk in batches, optionally gzipped.
+"""
+
+import gzip
+import time
+
+
+class LogFile(object):
+    """
+    Collects lines in a bounded buffer and writes them in one call when the buffer is full or when a line comes after
+    it has not been written for a while, so high-rate logs don't cost a write per line. There is no timer: when the log
+    goes quiet, the buffered lines are written with the next line or on close. Nothing is fsync'ed, the operating
+    system decides when data hits the disk.
+    """
+
+    def __init__(self, path, compress=False, buffer_size=64 * 1024, flush_interval=1.0):
+        """
+        :param path: string, path to log file, ".gz" is appended if compressed and not given.
+        :param compress: boolean, True to gzip the log while writing it.
+        :param buffer_size: int, maximum number of bytes to keep in memory before writing them.
+        :param flush_interval: float, time since the last write after which a new line writes the buffer, seconds.
+        """
+        if compress and not path.endswith(".gz"):
+            path += ".gz"
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.lines = 0
+        self._file = gzip.open(path, "wb") if compress else open(path, "wb")
+        self._buffer = []
+        self._buffered = 0
+        self._flushed = time.time()
+
+    def write(self, line):
+        """
+        Adds the given line to the log.
+
+        :param line: string, line including its ending.
+        """
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.lines += 1
+        if self._buffered >= self.buffer_size or time.time() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered lines to the file.
+        """
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._file.flush()
+            self._buffer = []
+            self._buffered = 0
+        self._flushed = time.time()
+
+    def close(self):
+        """
+        Writes buffered lines and closes the file.
+        """
+        self.flush()
+        self._file.close()
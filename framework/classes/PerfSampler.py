@@ -0,0 +1,104 @@
+"""
+This module contains PerfSampler - class that samples memory and CPU usage of Android application.
+"""
+
+from framework.classes.ShellSession import ShellSession
+import framework.utils.transport as transport
+import time
+import re
+
+# one round trip per sample: pid of app, its CPU ticks, total CPU ticks, free system memory and app PSS; only shell
+# built-ins are used to filter output, devices older than 6.0 have neither grep, head nor pidof
+SAMPLE_COMMAND = ("pid=$(pidof {0} 2>/dev/null); "
+                  "[ -z \"$pid\" ] && pid=$(ps 2>/dev/null | while read -r user pid rest; do "
+                  "case \"$rest\" in *' {0}') echo $pid; break;; esac; done); pid=${{pid%% *}}; "
+                  "echo \"pid:$pid\"; "
+                  "[ -n \"$pid\" ] && echo \"stat:$(cat /proc/$pid/stat 2>/dev/null)\"; "
+                  "read -r cpu < /proc/stat; echo \"cpu:$cpu\"; "
+                  "while read -r line; do case \"$line\" in MemFree:*|MemAvailable:*) echo \"$line\";; esac; "
+                  "done < /proc/meminfo; "
+                  "[ -n \"$pid\" ] && dumpsys meminfo $pid | while read -r line; do case \"$line\" in TOTAL*) "
+                  "echo \"$line\";; esac; done")
+
+# old devices print "TOTAL  <pss> ...", new ones also "TOTAL PSS:  <pss>  TOTAL RSS: ..."
+TOTAL_PSS_REGEX = re.compile(r"^\s*TOTAL(?: PSS:)?\s+(\d+)", re.MULTILINE)
+
+
+class PerfSampler(object):
+    """
+    Samples application PSS (dumpsys meminfo), application CPU usage (/proc/<pid>/stat) and available system memory
+    (/proc/meminfo). All values of a sample are read by a single command in own persistent shell, so sampling starts
+    no processes on host and only one shell on device.
+    """
+
+    columns = ("time", "pid", "pss_kb", "cpu_percent", "mem_available_kb")
+
+    def __init__(self, device, package):
+        """
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param package: string, package name of application, e.g. "com.android.calculator2".
+        """
+        self.device = device
+        self.package = package
+        self._session = ShellSession(device, transport.command(device, "shell"))
+        self._command = SAMPLE_COMMAND.format(package)
+        self._started = None
+        self._ticks = None
+
+    def sample(self):
+        """
+        Takes one sample. CPU usage is measured since the previous sample, so it is None for the first one and when
+        application restarts.
+
+        :returns dict: values by column name, values which can't be read (e.g. application is not running) are None.
+        """
+        now = time.time()
+        if self._started is None:
+            self._started = now
+        _, output = self._session.run(self._command)
+        values = dict((column, None) for column in PerfSampler.columns)
+        values["time"] = round(now - self._started, 3)
+        fields = {}
+        for line in output.split("\n"):
+            name, _, value = line.partition(":")
+            fields[name.strip()] = value.strip()
+
+        values["pid"] = int(fields["pid"]) if fields.get("pid", "").isdigit() else None
+        memory = fields.get("MemAvailable") or fields.get("MemFree")
+        if memory:
+            values["mem_available_kb"] = int(memory.split()[0])
+        pss = TOTAL_PSS_REGEX.search(output)
+        if pss and values["pid"]:
+            values["pss_kb"] = int(pss.group(1))
+
+        ticks = self._read_ticks(values["pid"], fields.get("stat"), fields.get("cpu"))
+        if ticks and self._ticks and ticks[0] == self._ticks[0] and ticks[2] > self._ticks[2]:
+            values["cpu_percent"] = round(100.0 * (ticks[1] - self._ticks[1]) / (ticks[2] - self._ticks[2]), 2)
+        self._ticks = ticks
+        return values
+
+    def close(self):
+        """
+        Closes shell session to device.
+        """
+        self._session.close()
+
+    @staticmethod
+    def _read_ticks(pid, stat, cpu):
+        """
+        Reads CPU time of application and of the whole device.
+
+        :param pid: int, application process id.
+        :param stat: string, content of /proc/<pid>/stat.
+        :param cpu: string, first line of /proc/stat.
+        :returns tuple: pid, application ticks and device ticks, or None if they can't be read.
+        """
+        if not pid or not stat or not cpu or ")" not in stat:
+            return None
+        # process name may contain spaces, so fields are counted after it; utime and stime are fields 14 and 15
+        process_fields = stat.rsplit(")", 1)[1].split()
+        cpu_fields = cpu.split()[1:9]
+        try:
+            return pid, int(process_fields[11]) + int(process_fields[12]), sum(int(field) for field in cpu_fields)
+        except (IndexError, ValueError):
+            return None
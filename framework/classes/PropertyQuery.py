@@ -0,0 +1,75 @@
+"""
+This module contains PropertyQuery - class that gets device properties with as few device commands as possible.
+"""
+
+from collections import namedtuple, OrderedDict
+import threading
+
+# command to run on device and function to get property value from command output (returns None if output has no
+# value, so the next source is tried)
+Source = namedtuple("Source", ("command", "parse"))
+
+
+class PropertyQuery(object):
+    """
+    Plans requests of device properties. Every property declares its sources in priority order. Properties requested
+    together are resolved in rounds: every round runs the best not yet tried source of every unresolved property, all
+    of them in a single device round trip, and sources shared by several properties run once. The next sources of a
+    property are tried only if the previous ones gave no value, and both command outputs and values are kept for the
+    lifetime of the query.
+    """
+
+    def __init__(self, sources, run):
+        """
+        :param sources: dict, lists of Source in priority order by property name.
+        :param run: function(commands) to run list of commands in one round trip, returns list of their outputs.
+        """
+        self.sources = sources
+        self.run = run
+        self.rounds = 0
+        self._values = {}
+        self._outputs = {}
+        self._lock = threading.Lock()
+
+    def get(self, *names):
+        """
+        :param names: strings, names of properties, e.g. "model", "resolution".
+        :returns OrderedDict: values by property name, None if no source gave value.
+        """
+        with self._lock:
+            tried = dict((name, 0) for name in names)
+            while True:
+                plan = OrderedDict()
+                for name in names:
+                    if name in self._values:
+                        continue
+                    source = self._next_source(name, tried)
+                    if source is None:
+                        self._values.setdefault(name, None)
+                    else:
+                        plan.setdefault(source.command, source)
+                if not plan:
+                    break
+                self.rounds += 1
+                self._outputs.update(zip(plan, self.run(list(plan))))
+            return OrderedDict((name, self._values[name]) for name in names)
+
+    def _next_source(self, name, tried):
+        """
+        Tries sources of property with known output till one gives value, and returns the first one which must be run.
+
+        :param name: string, property name.
+        :param tried: dict, number of tried sources by property name, it is updated.
+        :returns Source: source to run, None if the value is found or there are no more sources.
+        """
+        sources = self.sources[name]
+        while tried[name] < len(sources):
+            source = sources[tried[name]]
+            if source.command not in self._outputs:
+                return source
+            tried[name] += 1
+            value = source.parse(self._outputs[source.command])
+            if value is not None:
+                self._values[name] = value
+                return None
+        return None
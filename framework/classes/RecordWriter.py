@@ -0,0 +1,71 @@
+"""
+This module contains RecordWriter - class that writes records (e.g. info about devices) in machine-readable formats.
+"""
+
+from collections import OrderedDict
+from tabulate import tabulate
+import json
+import csv
+import sys
+
+
+class RecordWriter(object):
+    """
+    Writes records one by one as they come. NDJSON and CSV records are flushed immediately so that consumers can
+    process them while the producer is still working, table is printed on close since it needs all rows to align.
+    """
+
+    formats = ("ndjson", "csv", "table")
+
+    def __init__(self, output_format, fields, stream=None):
+        """
+        :param output_format: string, one of "ndjson", "csv" or "table".
+        :param fields: list, names of fields to write, in order.
+        :param stream: file object to write records to, by default stdout.
+        """
+        self.output_format = output_format
+        self.fields = list(fields)
+        self.stream = stream or sys.stdout
+        self._rows = []
+        self._csv_writer = None
+        if output_format == "csv":
+            self._csv_writer = csv.writer(self.stream)
+            self._csv_writer.writerow(self.fields)
+            self.stream.flush()
+
+    def write(self, record):
+        """
+        Writes the given record.
+
+        :param record: dict, record to write, fields which are not in the record are written as empty.
+        """
+        if self.output_format == "ndjson":
+            line = json.dumps(OrderedDict((field, record.get(field)) for field in self.fields))
+            self.stream.write(line + "\n")
+            self.stream.flush()
+        elif self.output_format == "csv":
+            self._csv_writer.writerow([_encode(record.get(field)) for field in self.fields])
+            self.stream.flush()
+        else:
+            self._rows.append([_encode(record.get(field)) for field in self.fields])
+
+    def close(self):
+        """
+        Writes whatever was buffered, i.e. table.
+        """
+        if self.output_format == "table":
+            self.stream.write(tabulate(self._rows, headers=self.fields) + "\n")
+            self.stream.flush()
+            self._rows = []
+
+
+def _encode(value):
+    """
+    Converts value to a byte string suitable for csv and tabulate.
+
+    :param value: value to convert, e.g. u"Nexus 5".
+    :returns string: encoded value, empty string for None.
+    """
+    if value is None:
+        return ""
+    return value.encode("utf-8") if isinstance(value, unicode) else str(value)
@@ -0,0 +1,173 @@
+"""
+This module contains ScreenshotArchive - class that collects screenshots into a single zip or tar archive.
+"""
+
+from collections import OrderedDict
+import threading
+import zipfile
+import tarfile
+import fnmatch
+import json
+import os
+
+
+class ScreenshotArchive(object):
+    """
+    Adds screenshots to archive as soon as they are taken, so a run produces one file instead of thousands. Screenshots
+    are stored uncompressed by default, as PNG is compressed already. An index with offsets of screenshots is written
+    next to the archive ("<archive>.index.json"), so single screenshots are read without scanning the archive.
+    """
+
+    formats = ("zip", "tar")
+
+    def __init__(self, path, archive_format="zip", compress=False):
+        """
+        :param path: string, path to archive.
+        :param archive_format: string, "zip" or "tar".
+        :param compress: boolean, True to compress screenshots (deflate for zip, gzip for tar).
+        """
+        self.path = path
+        self.archive_format = archive_format
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        if archive_format == "zip":
+            self._archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED,
+                                            allowZip64=True)
+        else:
+            self._archive = tarfile.open(path, "w:gz" if compress else "w")
+
+    def add(self, file_path, name):
+        """
+        Moves screenshot into archive. Safe to call from several threads.
+
+        :param file_path: string, path to screenshot, the file is removed once it is archived.
+        :param name: string, name of screenshot in archive, e.g. "TA9890AMTG/nexus5_lge_1458045362000.png".
+        """
+        size = os.path.getsize(file_path)
+        with self._lock:
+            if self.archive_format == "zip":
+                self._archive.write(file_path, name)
+                offset = self._archive.getinfo(name).header_offset
+            else:
+                info = self._archive.gettarinfo(file_path, name)
+                with open(file_path, "rb") as screenshot:
+                    self._archive.addfile(info, screenshot)
+                # data of member is padded to whole blocks and ends at the current offset
+                offset = self._archive.offset - (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            self._index[name] = {"offset": offset, "size": size}
+        os.remove(file_path)
+
+    def close(self):
+        """
+        Finishes archive and writes its index.
+        """
+        with self._lock:
+            self._archive.close()
+            with open(ScreenshotArchive.index_path(self.path), "w") as index_file:
+                json.dump(OrderedDict((("format", self.archive_format), ("compressed", self.compress),
+                                       ("screenshots", self._index))), index_file, indent=1)
+
+    @staticmethod
+    def index_path(path):
+        """
+        :param path: string, path to archive.
+        :returns string: path to index of archive.
+        """
+        return path + ".index.json"
+
+    @staticmethod
+    def names(path):
+        """
+        :param path: string, path to archive.
+        :returns list: names of screenshots in archive, in order they were taken.
+        """
+        index = ScreenshotArchive._load_index(path)
+        if index:
+            return list(index["screenshots"])
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                return archive.namelist()
+        with tarfile.open(path) as archive:
+            return archive.getnames()
+
+    @staticmethod
+    def extract(path, patterns, target_dir):
+        """
+        Extracts screenshots matching the given names from archive, without unpacking the whole archive. Archive is
+        opened once for all of them.
+
+        :param path: string, path to archive.
+        :param patterns: list, names of screenshots or shell-style patterns, e.g. ["*/fr-FR_*"].
+        :param target_dir: string, directory to extract screenshots to.
+        :returns list: paths to extracted screenshots.
+        :raises ValueError: if name of matching screenshot points outside of target directory (e.g. "../x.png"), nothing
+        is extracted then.
+        """
+        names = [name for name in ScreenshotArchive.names(path)
+                 if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+        target_dir = os.path.realpath(target_dir)
+        target_paths = {}
+        for name in names:
+            target_path = os.path.realpath(os.path.join(target_dir, name))
+            if not target_path.startswith(target_dir + os.sep):
+                raise ValueError("Screenshot '{0}' points outside of '{1}'".format(name, target_dir))
+            target_paths[name] = target_path
+        paths = []
+        for name, content in ScreenshotArchive.read_all(path, names):
+            directory = os.path.dirname(target_paths[name])
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(target_paths[name], "wb") as screenshot:
+                screenshot.write(content)
+            paths.append(target_paths[name])
+        return paths
+
+    @staticmethod
+    def read(path, name):
+        """
+        Reads single screenshot from archive, see read_all.
+
+        :param path: string, path to archive.
+        :param name: string, name of screenshot in archive.
+        :returns string: content of screenshot.
+        """
+        for _, content in ScreenshotArchive.read_all(path, [name]):
+            return content
+
+    @staticmethod
+    def read_all(path, names):
+        """
+        Reads screenshots from archive, which is opened once for all of them. Zip archives are read by their central
+        directory, uncompressed tar archives by offsets from the index, other ones are scanned.
+
+        :param path: string, path to archive.
+        :param names: list, names of screenshots in archive.
+        :returns generator: tuples of name and content of screenshot, in the given order.
+        """
+        index = ScreenshotArchive._load_index(path)
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for name in names:
+                    yield name, archive.read(name)
+        elif index and not index["compressed"] and all(name in index["screenshots"] for name in names):
+            with open(path, "rb") as archive:
+                for name in names:
+                    archive.seek(index["screenshots"][name]["offset"])
+                    yield name, archive.read(index["screenshots"][name]["size"])
+        else:
+            with tarfile.open(path) as archive:
+                for name in names:
+                    yield name, archive.extractfile(name).read()
+
+    @staticmethod
+    def _load_index(path):
+        """
+        :param path: string, path to archive.
+        :returns dict: index of archive, or None if there is no index.
+        """
+        index_path = ScreenshotArchive.index_path(path)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as index_file:
+            return json.load(index_file, object_pairs_hook=OrderedDict)
@@ -0,0 +1,259 @@
+"""
+This module contains Server - MTH server which executes commands sent by mth clients over unix socket.
+"""
+
+import framework.utils.discovery as discovery
+import framework.utils.sessions as sessions
+import framework.utils.console as console
+import framework.utils.cli as cli
+import SocketServer
+import threading
+import logging
+import socket
+import json
+import time
+import sys
+import os
+
+log = logging.getLogger("mth.server")
+
+
+class Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    Keeps actions imported, device table (tracked by attach/detach events) and shell sessions to devices warm between
+    commands. Actions rely on process state (current directory, stdin/stdout, sys.exit), so commands are accepted
+    concurrently but executed one by one.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        """
+        :param path: string, path to unix socket to listen on.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.UnixStreamServer.__init__(self, path, _RequestHandler)
+        self.path = path
+        self.started = time.time()
+        self.served = 0
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._executing = None
+
+    def serve(self):
+        """
+        Serves commands till shutdown is requested or Ctrl+C is pressed.
+        """
+        discovery.enable()
+        discovery.watch()
+        sessions.enable()
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+            discovery.unwatch()
+            sessions.close_all()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def status(self):
+        """
+        :returns dict: server status, e.g. uptime and number of executed commands.
+        """
+        return {"pid": os.getpid(), "uptime": int(time.time() - self.started), "served": self.served}
+
+    def execute(self, argv, cwd, requests, channel):
+        """
+        Executes the given command line as if it was given to mth in the given directory.
+
+        :param argv: list, command line arguments without program name.
+        :param cwd: string, directory to execute command in.
+        :param requests: file object to read client messages from (input lines and interrupts).
+        :param channel: _Channel, channel to send output and logs to client.
+        :returns int: exit code.
+        """
+        read_fd, write_fd = os.pipe()
+        stdin = os.fdopen(read_fd, "r")
+        with self._lock:
+            worker = threading.current_thread().ident
+            listener = threading.Thread(target=self._listen, args=(requests, write_fd, worker))
+            listener.daemon = True
+            root = logging.getLogger()
+            saved = sys.stdin, sys.stdout, sys.stderr, os.getcwd(), root.handlers, root.level
+            with self._state_lock:
+                self._executing = worker
+            console.reset_interrupt()
+            listener.start()
+            try:
+                sys.stdin = stdin
+                sys.stdout = _Stream(channel, "out")
+                sys.stderr = _Stream(channel, "err")
+                root.handlers = [_LogHandler(channel)]
+                os.chdir(cwd or saved[3])
+                args = cli.create_parser().parse_args(argv)
+                root.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+                cli.execute(args)
+                return 0
+            except SystemExit as e:
+                return _exit_code(e.code)
+            except KeyboardInterrupt:
+                return 130
+            except Exception:
+                log.exception("Execution failed for '{0}'".format(" ".join(argv)))
+                return 1
+            finally:
+                with self._state_lock:
+                    self._executing = None
+                sys.stdin, sys.stdout, sys.stderr, cwd, root.handlers, level = saved
+                root.setLevel(level)
+                os.chdir(cwd)
+                stdin.close()
+                self.served += 1
+
+    def _listen(self, requests, write_fd, worker):
+        """
+        Reads client messages during command execution: forwards input lines to command stdin and interrupts it when
+        client presses Ctrl+C or disconnects.
+
+        :param requests: file object to read client messages from.
+        :param write_fd: int, file descriptor of command stdin pipe.
+        :param worker: int, identifier of thread which executes command.
+        """
+        input_open = True
+        while True:
+            try:
+                line = requests.readline()
+            except (IOError, socket.error):
+                line = ""
+            message = json.loads(line) if line else {"interrupt": True}
+            if "in" in message and input_open:
+                if message["in"]:
+                    os.write(write_fd, message["in"].encode("utf-8"))
+                else:
+                    os.close(write_fd)
+                    input_open = False
+            if message.get("interrupt"):
+                self._interrupt(worker)
+            if not line:
+                break
+        if input_open:
+            os.close(write_fd)
+
+    def _interrupt(self, worker):
+        """
+        Interrupts the command as if Ctrl+C was pressed in mth process.
+
+        :param worker: int, identifier of thread which executes command.
+        """
+        with self._state_lock:
+            if self._executing == worker:
+                console.interrupt()
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Handles single client connection.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        message = json.loads(line)
+        channel = _Channel(self.wfile)
+        control = message.get("control")
+        if control == "status":
+            channel.send({"status": self.server.status()})
+        elif control == "shutdown":
+            channel.send({"exit": 0})
+            threading.Thread(target=self.server.shutdown).start()
+        else:
+            # JSON gives unicode, while actions build commands from byte strings
+            argv = [arg.encode("utf-8") for arg in message["argv"]]
+            cwd = message["cwd"].encode("utf-8") if message.get("cwd") else None
+            channel.send({"exit": self.server.execute(argv, cwd, self.rfile, channel)})
+
+
+class _Channel(object):
+    """
+    Sends messages to client, one JSON object per line.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            try:
+                self._stream.write(json.dumps(message) + "\n")
+                self._stream.flush()
+            except (IOError, socket.error):
+                # client has gone, command is interrupted by listener
+                pass
+
+
+class _Stream(object):
+    """
+    File-like object which sends everything written to it to client as stdout or stderr.
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, channel, name):
+        self._channel = channel
+        self._name = name
+
+    def write(self, text):
+        self._channel.send({self._name: _decode(text)})
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class _LogHandler(logging.Handler):
+    """
+    Logging handler which sends log records to client, client logs them with own logging configuration.
+    """
+
+    def __init__(self, channel):
+        logging.Handler.__init__(self)
+        self._channel = channel
+
+    def emit(self, record):
+        try:
+            self._channel.send({"log": [record.name, record.levelno, _decode(self.format(record))]})
+        except Exception:
+            self.handleError(record)
+
+
+def _decode(text):
+    """
+    :param text: string or unicode, text to send to client.
+    :returns unicode: text which can be serialized to JSON.
+    """
+    return text.decode("utf-8", "replace") if isinstance(text, str) else text
+
+
+def _exit_code(code):
+    """
+    Converts sys.exit argument to process exit code.
+
+    :param code: None, int or message.
+    :returns int: exit code.
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    sys.stderr.write("{0}\n".format(code))
+    return 1
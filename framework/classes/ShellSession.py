@@ -0,0 +1,114 @@
+"""
+This module contains ShellSession - class that keeps a single "adb shell" process open to run many commands in it.
+"""
+
+from framework.utils import console
+import subprocess
+import threading
+import uuid
+import re
+
+
+class ShellSession(object):
+    """
+    Persistent shell on Android device. Every command runs in the same "adb shell" process, so there is no adb client
+    start-up and no new connection to adbd per command. Commands are serialized, so a session can be shared by threads.
+    """
+
+    def __init__(self, device, command=None):
+        """
+        :param device: string, device identifier, e.g. "TA9890AMTG".
+        :param command: list, command to start shell, by default "adb -s <device> shell".
+        """
+        self.device = device
+        self.command = command or ["adb", "-s", device, "shell"]
+        self._process = None
+        self._lock = threading.Lock()
+        # marker is printed in two quoted halves, so echoed input (on devices with pty) never looks like the marker
+        marker = uuid.uuid4().hex
+        self._marker_command = '"{0}""{1}$__mth_status"'.format(marker[:16], marker[16:])
+        self._marker_regex = re.compile(marker + r"(\d+)\r?$")
+
+    def run(self, command):
+        """
+        Runs the given shell command on device and waits till it is finished.
+
+        :param command: string, shell command, e.g. "getprop ro.product.model".
+        :returns tuple: exit status and output (stdout and stderr together).
+        """
+        with self._lock:
+            if not self.is_alive():
+                self._start()
+            return self._exchange(command)
+
+    def is_alive(self):
+        """
+        :returns boolean: True if shell process is running, otherwise False.
+        """
+        return self._process is not None and self._process.poll() is None
+
+    def close(self):
+        """
+        Closes shell session.
+        """
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            try:
+                self._process.stdin.close()
+            except IOError:
+                pass
+            self._process.kill()
+        self._process.wait()
+        console._forget(self._process)
+        self._process = None
+
+    def _start(self):
+        """
+        Starts shell process, it's registered as running in console, so interrupt() and Ctrl+C kill it as well.
+        """
+        self._process = console._start(self.command, stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        # older devices allocate pty for shell, so disable echo and prompts and skip whatever was printed before
+        try:
+            self._process.stdin.write("stty -echo 2>/dev/null; PS1=''; PS2=''\n")
+        except IOError:
+            # shell exited right away (e.g. device is detached), the exchange below finds the session closed
+            pass
+        self._exchange("true")
+
+    def _exchange(self, command):
+        """
+        Writes command to shell and reads its output till the marker with exit status.
+
+        :param command: string, shell command.
+        :returns tuple: exit status and output.
+        """
+        try:
+            self._process.stdin.write("{{ {0}\n}} </dev/null 2>&1; __mth_status=$?; echo; echo {1}\n"
+                                      .format(command, self._marker_command))
+            self._process.stdin.flush()
+        except IOError:
+            self._close_killed()
+            return 1, "Shell session to device '{0}' is closed".format(self.device)
+        lines = []
+        while True:
+            line = self._process.stdout.readline()
+            if not line:
+                self._close_killed()
+                return 1, "".join(lines) + "Shell session to device '{0}' is closed".format(self.device)
+            match = self._marker_regex.search(line)
+            if match:
+                # drop the new line printed right before the marker
+                output = "".join(lines).replace("\r\n", "\n")
+                return int(match.group(1)), output[:-1] if output.endswith("\n") else output
+            lines.append(line)
+
+    def _close_killed(self):
+        """
+        Closes session whose shell exited, raises KeyboardInterrupt if it was killed by console.interrupt().
+        """
+        try:
+            console._check_interrupt(self._process)
+        finally:
+            self.close()
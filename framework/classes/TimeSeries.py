@@ -0,0 +1,85 @@
+"""
+This module contains TimeSeries - class that writes a rolling series of records to disk.
+"""
+
+from collections import OrderedDict
+import threading
+import json
+import time
+import os
+
+
+class TimeSeries(object):
+    """
+    Writes records as NDJSON, one file per period (e.g. hour), and removes the oldest files once there are more than
+    the given number of them, so the series of an endless run takes bounded disk space. Every record is flushed as it
+    comes, so the series can be followed while it is written. Safe to write from several threads.
+    """
+
+    def __init__(self, directory, columns, period=3600, keep=24):
+        """
+        :param directory: string, directory to write files of series to, created if it doesn't exist.
+        :param columns: list, names of record fields to write, in order, the first one is time (seconds since epoch).
+        :param period: int, time covered by one file, seconds.
+        :param keep: int, maximum number of files to keep.
+        """
+        self.directory = directory
+        self.columns = list(columns)
+        self.period = period
+        self.keep = keep
+        self.records = 0
+        self._files = []
+        self._file = None
+        self._file_start = None
+        self._closed = False
+        self._lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def write(self, record):
+        """
+        Writes the given record into the file of its period. Does nothing once series is closed, so a sampler that is
+        still finishing doesn't reopen a file.
+
+        :param record: dict, record with time in the first column.
+        """
+        start = int(record[self.columns[0]]) // self.period * self.period
+        line = json.dumps(OrderedDict((column, record.get(column)) for column in self.columns))
+        with self._lock:
+            if self._closed:
+                return
+            if start != self._file_start:
+                self._roll(start)
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.records += 1
+
+    def close(self):
+        """
+        Closes the current file of series, records written after that are dropped.
+        """
+        with self._lock:
+            self._closed = True
+            if self._file:
+                self._file.close()
+                self._file = None
+                self._file_start = None
+
+    def _roll(self, start):
+        """
+        Switches to file of the given period and removes files beyond the limit.
+
+        :param start: int, start of period, seconds since epoch.
+        """
+        if self._file:
+            self._file.close()
+        path = os.path.join(self.directory, "series_{0}.ndjson".format(time.strftime("%Y%m%d-%H%M%S",
+                                                                                     time.localtime(start))))
+        self._file = open(path, "a")
+        self._file_start = start
+        if path not in self._files:
+            self._files.append(path)
+        while len(self._files) > self.keep:
+            old_path = self._files.pop(0)
+            if os.path.exists(old_path):
+                os.remove(old_path)
@@ -2,16 +2,33 @@
 This module contains a list of utilities related to Android.
 """
 
+from framework.classes.ShellSession import ShellSession
+from framework.classes.LogFile import LogFile
+from contextlib import closing
+import framework.utils.discovery as discovery
+import framework.utils.transport as transport
+import framework.utils.properties as properties
+import framework.utils.constants as constants
 import framework.utils.console as console
+import threading
 import logging
 import string
+import pipes
 import glob
 import time
+import sys
 import os
-import re
 
 log = logging.getLogger("mth.utils")
 
+# how long to wait for WiFi or cellular data switched by "svc" and in Settings, seconds
+SVC_TIMEOUT = 3
+SETTINGS_TIMEOUT = 5
+STATE_POLL_INTERVAL = 0.5
+
+_install_flags_lock = threading.Lock()
+_install_flags = {}
+
 
 def take_screenshot(device, target_dir, screenshot_name):
     """
@@ -22,9 +39,8 @@ def take_screenshot(device, target_dir, screenshot_name):
     :param screenshot_name: string, screenshot name.
     """
     device_path = os.path.join("/sdcard/", screenshot_name)
-    command = "adb -s " + device + " shell screencap -p " + device_path
     local_file = os.path.join(target_dir, screenshot_name)
-    console.execute(command)
+    transport.execute(device, "shell screencap -p " + device_path)
     download_file(device, device_path, local_file)
     remove_file(device, device_path)
 
@@ -37,8 +53,7 @@ def download_file(device, device_file_path, target_file_path):
     :param device_file_path: string, path to file that should be downloaded.
     :param target_file_path: path where to save the downloaded file.
     """
-    command = "adb -s " + device + " pull " + device_file_path + " " + target_file_path
-    console.execute(command)
+    transport.execute(device, ["pull", device_file_path, target_file_path])
 
 
 def remove_file(device, device_file_path):
@@ -48,23 +63,89 @@ def remove_file(device, device_file_path):
     :param device: string, unique identifier of device (optional, by default connected device).
     :param device_file_path: string, path to file that should be removed.
     """
-    command = "adb -s " + device + " shell rm -f " + device_file_path
-    console.execute(command)
+    transport.execute(device, "shell rm -f " + device_file_path)
+
+
+def upload_file(device, file_path, device_file_path):
+    """
+    Uploads file to attached Android device, missing directories are created and modification time is kept.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param file_path: string, path to file that should be uploaded.
+    :param device_file_path: string, path where to save the file on device.
+    """
+    transport.execute(device, ["push", file_path, device_file_path])
+
+
+def list_files(device, device_dir):
+    """
+    Lists files under the given directory of device with one command. Devices without find and stat (older than
+    Android 6.0) list nothing.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param device_dir: string, directory on device, e.g. "/sdcard/fixtures".
+    :returns dict: tuples of size (bytes) and modification time (seconds since epoch) by path relative to directory.
+    """
+    device_dir = device_dir.rstrip("/") or "/"
+    command = "[ -d {0} ] && find {0} -type f -exec stat -c '%s %Y %n' {{}} + 2>/dev/null; true".format(
+        pipes.quote(device_dir))
+    files = {}
+    for line in transport.execute(device, ["shell", command]).split("\n"):
+        fields = line.rstrip("\r").split(" ", 2)
+        if len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit() and fields[2].startswith(device_dir):
+            files[fields[2][len(device_dir):].lstrip("/")] = (int(fields[0]), int(fields[1]))
+    return files
+
+
+def hash_files(device, device_dir, paths, batch_size=100):
+    """
+    Computes MD5 of files on device, a command per batch of files.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param device_dir: string, directory on device, e.g. "/sdcard/fixtures".
+    :param paths: list, paths of files relative to directory.
+    :param batch_size: int, maximum number of files to hash by one command.
+    :returns dict: MD5 as hex string by path, files which can't be hashed are missing.
+    """
+    hashes = {}
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        command = "cd {0} && md5sum {1} 2>/dev/null; true".format(
+            pipes.quote(device_dir), " ".join(pipes.quote(path) for path in batch))
+        for line in transport.execute(device, ["shell", command]).split("\n"):
+            fields = line.rstrip("\r").split(None, 1)
+            if len(fields) == 2 and fields[1] in batch:
+                hashes[fields[1]] = fields[0].lower()
+    return hashes
+
+
+def remove_files(device, device_dir, paths, batch_size=100):
+    """
+    Removes files from device, a command per batch of files.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param device_dir: string, directory on device, e.g. "/sdcard/fixtures".
+    :param paths: list, paths of files relative to directory.
+    :param batch_size: int, maximum number of files to remove by one command.
+    """
+    for start in range(0, len(paths), batch_size):
+        command = "cd {0} && rm -f {1}".format(
+            pipes.quote(device_dir), " ".join(pipes.quote(path) for path in paths[start:start + batch_size]))
+        transport.execute(device, ["shell", command])
 
 
 def list_devices():
     """
     Lists connected android devices.
     """
-    command = "adb devices"
-    stdout = console.execute(command)
-    lines = string.split(stdout, '\n')
-    del lines[0]
-    lines = filter(None, lines)
-    devices = []
-    for device in lines:
-        devices.append(string.split(device, "\t")[0])
-    return devices
+    return discovery.cached("android", _list_devices)
+
+
+def _list_devices():
+    """
+    Lists connected android devices asking adb, including network devices and devices of other adb servers.
+    """
+    return transport.list_devices()
 
 
 def record_video(device, duration=180, bitrate=8000000):
@@ -78,30 +159,67 @@ def record_video(device, duration=180, bitrate=8000000):
     """
     file_name = str(int(time.time() * 1000)) + ".mp4"
     device_path = os.path.join("/sdcard/", file_name)
-    command = "/usr/local/bin/adb -s " + device + " shell screenrecord --time-limit " + \
-              str(duration) + " --bit-rate " + str(bitrate) + " " + device_path
+    arguments = "shell screenrecord --time-limit " + str(duration) + " --bit-rate " + str(bitrate) + " " + device_path
     log.info("Recording in progress... To finish press Ctrl+C")
-    console.execute(command)
+    transport.execute(device, arguments)
     time.sleep(1)
     return device_path
 
 
-def get_log(device):
+def get_log(device, on_line=None):
     """
     Gets log file from device.
     :param device: device identifier (e.g. "TA9890AMTG").
+    :param on_line: function(line) to call for every line as soon as it's captured, by default logcat writes the file
+    directly.
     """
     file_name = str(int(time.time() * 1000)) + ".txt"
     target_dir = os.getcwd()
     log_path = os.path.join(target_dir, file_name)
-    clear_log_command = "adb -s " + device + " logcat -c"
-    get_log_command = "adb -s " + device + " logcat -v time"
-    console.execute(clear_log_command)
+    transport.execute(device, "logcat -c")
     log.info("Logging in progress to '" + log_path + "'... To finish press Ctrl+C")
-    console.execute(get_log_command, False, log_path)
+    if on_line is None:
+        transport.execute(device, "logcat -v time", False, log_path)
+        return log_path
+    log_file = LogFile(log_path)
+    try:
+        for line in transport.stream(device, "logcat -v time", check=False):
+            log_file.write(line)
+            on_line(line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_file.close()
     return log_path
 
 
+def dump_log(device, path):
+    """
+    Saves what is in log buffers of device now, without clearing them or waiting for new lines.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param path: string, path to save log to.
+    """
+    transport.execute(device, "logcat -d -v time", False, path)
+
+
+def capture_screen(device, path, sdk_version=None):
+    """
+    Takes screenshot straight to the host with one adb call on Android 5.0+, older devices save it to /sdcard first.
+    It's faster than take_screenshot, e.g. to catch what is on screen right now.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param path: string, path to save screenshot to.
+    :param sdk_version: int, SDK version of device if it's known.
+    """
+    if sdk_version is None:
+        sdk_version = int(get_sdk_version(device) or 0)
+    if sdk_version >= 21:
+        transport.execute(device, "exec-out screencap -p", False, path)
+    else:
+        take_screenshot(device, os.path.dirname(path), os.path.basename(path))
+
+
 def get_locale(device):
     """
     Returns current locale for device.
@@ -109,11 +227,7 @@ def get_locale(device):
     :param device: string, device identifier, e.g. "TA9890AMTG".
     :returns locale: string, locale set on the device, e.g. "en-US".
     """
-    language_command = "adb -s {0} shell getprop persist.sys.language".format(device)
-    country_command = "adb -s {0} shell getprop persist.sys.country".format(device)
-    language = console.execute(language_command).rstrip()
-    country = console.execute(country_command).rstrip()
-    return language + "-" + country
+    return properties.get(device, "locale")["locale"]
 
 
 def set_locale(device, locale):
@@ -126,29 +240,71 @@ def set_locale(device, locale):
     adbchangelanguage = "net.sanapeli.adbchangelanguage"
 
     language, country = string.split(locale, "-")
-    command = "adb -s " + device + " shell am start -n net.sanapeli.adbchangelanguage/.AdbChangeLanguage " + \
-              "-e language " + language + " -e country " + country
+    arguments = "shell am start -n net.sanapeli.adbchangelanguage/.AdbChangeLanguage " + \
+                "-e language " + language + " -e country " + country
     if not _is_app_installed(device, adbchangelanguage):
         _open_google_play_for_app(device, adbchangelanguage)
         console.prompt("Please install adbchangelanguage then press Enter: ")
     _grant_permissions_to_change_config(device, adbchangelanguage)
-    console.execute(command)
+    transport.execute(device, arguments)
     time.sleep(3)
 
 
-def install_app(device, app):
+def install_app(device, app=None):
     """
     Installs the application onto the given device. If no app is given, installs the very latest app from ~/Downloads.
 
     :param device: device identifier, e.g. "TA9890AMTG".
-    :param app: apk package name, e.g. "calc.apk".
+    :param app: string, path to .apk file, e.g. "calc.apk".
+    """
+    app = app or find_newest_app()
+    log.info("Installing '{0}' onto device '{1}'...".format(app, device))
+    transport.execute(device, ["install"] + _get_install_flags(device) + [app])
+
+
+def find_newest_app():
+    """
+    :returns string: path to the very latest .apk file in ~/Downloads.
+    """
+    apps = glob.glob(os.path.join(constants.downloads_dir(), "*.apk"))
+    if not apps:
+        log.error("No .apk files found in '{0}'".format(constants.downloads_dir()))
+        sys.exit(1)
+    return max(apps, key=os.path.getctime)
+
+
+def _get_install_flags(device):
+    """
+    Returns "adb install" flags supported by the given device. They depend on SDK version only, so they are resolved
+    once per device and kept till the device is detached.
+
+    :param device: device identifier, e.g. "TA9890AMTG".
+    :returns list: flags, e.g. ["-r", "-d"].
+    """
+    with _install_flags_lock:
+        flags = _install_flags.get(device)
+    if flags is None:
+        # downgrade is supported since Android 4.2
+        flags = ["-r"] + (["-d"] if int(get_sdk_version(device) or 0) >= 17 else [])
+        with _install_flags_lock:
+            _install_flags[device] = flags
+    return flags
+
+
+def _forget_install_flags(event, platform, device):
     """
-    downloads_path = os.path.expanduser('~') + "/Downloads/"
-    template = "*.apk"
-    newest_apk = max(glob.iglob(downloads_path + template), key=os.path.getctime)
-    command = 'adb -s {0} install -r {1}{2}'.format(device, "" if get_sdk_version(device) < "17" else "-d ", newest_apk)
-    log.info("Installing '{0}' onto device '{1}'...".format(newest_apk, device))
-    console.execute(command)
+    Drops install flags of detached device, it may be updated before it is attached again.
+
+    :param event: string, "attach" or "detach".
+    :param platform: string, "android" or "ios".
+    :param device: device identifier, e.g. "TA9890AMTG".
+    """
+    if event == "detach" and platform == "android":
+        with _install_flags_lock:
+            _install_flags.pop(device, None)
+
+
+discovery.subscribe(_forget_install_flags)
 
 
 def uninstall_app(device, package):
@@ -158,8 +314,60 @@ def uninstall_app(device, package):
     :param device: device identifier, e.g. "TA9890AMTG".
     :param package: package name (e.g. com.android.calculator2).
     """
-    command = "adb -s " + device + " uninstall " + package
-    console.execute(command)
+    transport.execute(device, "uninstall " + package)
+
+
+def reset_apps(device, packages, uninstall=False, permissions=False):
+    """
+    Clears data of applications (or uninstalls them) and optionally revokes their runtime permissions. All packages
+    are handled by one script in one shell session, so there is a single round trip to device and "pm" lists packages
+    once for all of them.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param packages: list, package names, e.g. ["com.android.calculator2"].
+    :param uninstall: boolean, True to uninstall applications instead of clearing their data.
+    :param permissions: boolean, True to revoke granted runtime permissions before clearing data.
+    :returns dict: results by package name: "cleared", "uninstalled" or "missing", or error message of pm, and
+    number of revoked permissions in brackets if they are revoked, e.g. "cleared (2 permissions revoked)".
+    """
+    marker = "__mth_reset"
+    # only shell built-ins are used besides pm and dumpsys, old devices have no grep or cut; installed packages are
+    # one per line between new lines, so "case" matches whole lines
+    lines = ["installed=\"", "$(pm list packages 2>/dev/null)", "\""]
+    for package in packages:
+        quoted = pipes.quote(package)
+        lines.append("case \"$installed\" in *{0}*)".format(pipes.quote("\npackage:" + package + "\n")))
+        if permissions and not uninstall:
+            lines.append("dumpsys package {0} | {{ revoked=0; while read -r line; do case \"$line\" in "
+                         "*': granted=true'*) pm revoke {0} \"${{line%%:*}}\" >/dev/null 2>&1 && "
+                         "revoked=$((revoked + 1));; esac; done; echo \"{1} {2} permissions $revoked\"; }}"
+                         .format(quoted, marker, package))
+        lines.append("echo \"{0} {1} {2} $(pm {2} {3} 2>&1)\";;".format(marker, package,
+                                                                     "uninstall" if uninstall else "clear", quoted))
+        lines.append("*) echo \"{0} {1} missing\";; esac".format(marker, package))
+    session = ShellSession(device, transport.command(device, "shell"))
+    try:
+        _, output = session.run("\n".join(lines))
+    finally:
+        session.close()
+    results = dict((package, "failed: no output") for package in packages)
+    revoked = {}
+    for line in output.split("\n"):
+        fields = line.strip().split(" ", 3)
+        if len(fields) < 3 or fields[0] != marker or fields[1] not in results:
+            continue
+        package, operation, message = fields[1], fields[2], fields[3] if len(fields) > 3 else ""
+        if operation == "missing":
+            results[package] = "missing"
+        elif operation == "permissions":
+            revoked[package] = message
+        elif message.startswith("Success"):
+            results[package] = "uninstalled" if uninstall else "cleared"
+        else:
+            results[package] = "failed: " + (message or "no output")
+    for package, number in revoked.items():
+        results[package] += " ({0} permissions revoked)".format(number)
+    return results
 
 
 def start_app(device, package):
@@ -169,8 +377,7 @@ def start_app(device, package):
     :param device: device identifier, e.g. "TA9890AMTG".
     :param package: package name (e.g. com.android.calculator2).
     """
-    command = "adb -s " + device + " shell am start -n " + package
-    console.execute(command)
+    transport.execute(device, "shell am start -n " + package)
 
 
 def get_cpu_frequency(device):
@@ -180,9 +387,7 @@ def get_cpu_frequency(device):
     :param device: Device to get its CPU frequency.
     :returns string: CPU frequency, e.g. "2.27".
     """
-    command = 'adb -s {0} shell cat "/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq"'.format(device)
-    stdout = console.execute(command)
-    return "{0:.2f}".format(round(float(stdout) / 1000000, 2))
+    return properties.get(device, "cpu_frequency")["cpu_frequency"]
 
 
 def get_ram_size(device):
@@ -192,11 +397,7 @@ def get_ram_size(device):
     :param device: Device to get its RAM size.
     :returns string: RAM size, e.g. "1.90".
     """
-    command = 'adb -s {0} shell cat /proc/meminfo'.format(device)
-    stdout = console.execute(command)
-    regex = "(?<=MemTotal:)\s+\d+(?= kB)"
-    ram_size = re.findall(regex, stdout)[0].lstrip()
-    return "{0:.2f}".format(round(float(ram_size) / 1000000, 2))
+    return properties.get(device, "ram_size")["ram_size"]
 
 
 def get_resolution(device):
@@ -206,14 +407,7 @@ def get_resolution(device):
     :param device: Device to get its resolution.
     :returns string: Device resolution, e.g. "1080x1920".
     """
-    command1 = "adb -s {0} shell wm size".format(device)
-    command2 = "adb -s {0} shell dumpsys window".format(device)
-    regex = "\d{3,}x\d{3,}"
-    stdout1 = console.execute(command1)
-    stdout2 = console.execute(command2)
-    matches1 = re.findall(regex, stdout1)
-    matches2 = re.findall(regex, stdout2)
-    return matches1[0].lstrip() if matches1 else matches2[0].lstrip() if matches2 else None
+    return properties.get(device, "resolution")["resolution"]
 
 
 def get_android_version(device):
@@ -223,8 +417,7 @@ def get_android_version(device):
     :param device: Device to get its Android OS version.
     :returns string: Device Android version, e.g. "4.4.2".
     """
-    command = "adb -s {0} shell getprop ro.build.version.release".format(device)
-    return console.execute(command)
+    return properties.get(device, "os_version")["os_version"]
 
 
 def get_device_model(device):
@@ -234,8 +427,7 @@ def get_device_model(device):
     :param device: Device to get its model.
     :returns string: Device model name, e.g. "Nexus 5".
     """
-    command = "adb -s {0} shell getprop ro.product.model".format(device)
-    return console.execute(command)
+    return properties.get(device, "model")["model"]
 
 
 def get_ip_address(device):
@@ -245,15 +437,7 @@ def get_ip_address(device):
     :param device: Device to get its IP address.
     :returns string: IP address, e.g. "10.218.25.173".
     """
-    command1 = "adb -s {0} shell ifconfig".format(device)
-    command2 = "adb -s {0} shell netcfg".format(device)
-    regex1 = "(?<=inet addr:)\d[^2]\d*\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}"
-    regex2 = "(?<=wlan0\s{4}UP)\s+[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}"
-    stdout1 = console.execute(command1)
-    stdout2 = console.execute(command2)
-    matches1 = re.findall(regex1, stdout1)
-    matches2 = re.findall(regex2, stdout2)
-    return matches1[0].lstrip() if matches1 else matches2[0].lstrip() if matches2 else None
+    return properties.get(device, "ip_address")["ip_address"]
 
 
 def get_sdk_version(device):
@@ -263,8 +447,7 @@ def get_sdk_version(device):
     :param device: Device to get its SDK version.
     :returns string: SDK version, e.g. "19".
     """
-    command = "adb -s {0} shell getprop ro.build.version.sdk".format(device)
-    return console.execute(command)
+    return properties.get(device, "sdk_version")["sdk_version"]
 
 
 def get_language(device):
@@ -274,8 +457,7 @@ def get_language(device):
     :param device: Device to get its language.
     :returns string: Device language, e.g. "en".
     """
-    command = "adb -s {0} shell getprop persist.sys.language".format(device)
-    return console.execute(command)
+    return properties.get(device, "language")["language"]
 
 
 def get_country(device):
@@ -285,8 +467,7 @@ def get_country(device):
     :param device: Device to get its country.
     :returns string: Device country, e.g. "US".
     """
-    command = "adb -s {0} shell getprop persist.sys.country".format(device)
-    return console.execute(command)
+    return properties.get(device, "country")["country"]
 
 
 def get_manufacturer(device):
@@ -296,8 +477,17 @@ def get_manufacturer(device):
     :param device: Device to get its manufacturer.
     :returns string: device manufacturer, e.g. "motorola".
     """
-    command = "adb -s {0} shell getprop ro.product.manufacturer".format(device)
-    return console.execute(command)
+    return properties.get(device, "manufacturer")["manufacturer"]
+
+
+def get_boot_id(device):
+    """
+    Returns identifier of the current boot for the given device, changes on every reboot.
+
+    :param device: Device to get its boot identifier.
+    :returns string: boot ID, or build fingerprint on devices which do not expose boot ID.
+    """
+    return properties.get(device, "boot_id")["boot_id"]
 
 
 def enter_text(device, text):
@@ -307,53 +497,107 @@ def enter_text(device, text):
     :param device: string, Device identifier.
     :param text: string, Text to enter.
     """
-    command = "adb -s {0} shell input text {1}".format(device, text)
-    console.execute(command)
+    transport.execute(device, "shell input text {0}".format(text))
 
 
 def switch_wifi(device, state):
     """
-    Switches WiFi ON/OFF.
+    Switches WiFi ON/OFF. Uses "svc wifi" if the device supports it, otherwise toggles WiFi in Settings.
 
     :param device: string, Device identifier.
     :param state: ON to enable, OFF to disable.
     :returns string: Wifi state as number (0 - disabled, 1 - enabled).
     """
     current_wifi_state = _get_wifi_state(device)
-    if (current_wifi_state == "0" and state == "OFF") or (current_wifi_state > "0" and state == "ON"):
+    if _is_state_reached(current_wifi_state, state):
         return log.warn("WiFi is already '{0}' on the device '{1}'".format(state, device))
-    _open_wifi_settings(device)
-    _send_key_event(device, "KEYCODE_DPAD_UP")
-    _send_key_event(device, "KEYCODE_DPAD_UP")
-    _send_key_event(device, "KEYCODE_DPAD_CENTER")
-    _send_key_event(device, "KEYCODE_BACK")
+    _run_svc(device, "wifi", state)
+    if not _wait_for_state(device, _get_wifi_state, state, SVC_TIMEOUT):
+        log.debug("'svc wifi' had no effect on the device '{0}', switching WiFi in Settings".format(device))
+        _open_wifi_settings(device)
+        _send_key_events(device, ["KEYCODE_DPAD_UP", "KEYCODE_DPAD_UP", "KEYCODE_DPAD_CENTER", "KEYCODE_BACK"])
+        if not _wait_for_state(device, _get_wifi_state, state, SETTINGS_TIMEOUT):
+            log.error("Failed to switch WiFi '{0}' on the device '{1}'".format(state, device))
+            sys.exit(1)
+    return _get_wifi_state(device)
 
 
 def switch_cellular_data(device, state):
     """
-    Switches cellular data ON/OFF.
+    Switches cellular data ON/OFF. Uses "svc data" if the device supports it, otherwise toggles it in Settings.
 
     :param device: string, Device identifier.
     :param state: ON to enable, OFF to disable.
+    :returns string: Cellular data state as number (0 - disabled, 1 - enabled).
     """
     current_cellular_state = _get_cellular_data_state(device)
-    if (current_cellular_state == "0" and state == "OFF") or (current_cellular_state > "0" and state == "ON"):
+    if _is_state_reached(current_cellular_state, state):
         return log.warn("Cellular Data is already '{0}' on the device '{1}'".format(state, device))
-    _open_data_usage_settings(device)
-    _send_key_event(device, "KEYCODE_DPAD_DOWN")
-    # needed for certain Android 5.0 devices
-    if state == "OFF":
-        _send_key_event(device, "KEYCODE_DPAD_DOWN")
-    _send_key_event(device, "KEYCODE_DPAD_CENTER")
-    #  needed for certain Android 5.0 devices
-    if state == "ON":
-        _send_key_event(device, "KEYCODE_DPAD_DOWN")
-        _send_key_event(device, "KEYCODE_DPAD_CENTER")
-    # needed for confirmation dialog.
-    if state == "OFF":
-        _send_key_event(device, "KEYCODE_TAB")
-    _send_key_event(device, "KEYCODE_ENTER")
-    _send_key_event(device, "KEYCODE_BACK")
+    _run_svc(device, "data", state)
+    if not _wait_for_state(device, _get_cellular_data_state, state, SVC_TIMEOUT):
+        log.debug("'svc data' had no effect on the device '{0}', switching Cellular Data in Settings".format(device))
+        _open_data_usage_settings(device)
+        keycodes = ["KEYCODE_DPAD_DOWN"]
+        # needed for certain Android 5.0 devices
+        if state == "OFF":
+            keycodes.append("KEYCODE_DPAD_DOWN")
+        keycodes.append("KEYCODE_DPAD_CENTER")
+        #  needed for certain Android 5.0 devices
+        if state == "ON":
+            keycodes += ["KEYCODE_DPAD_DOWN", "KEYCODE_DPAD_CENTER"]
+        # needed for confirmation dialog.
+        if state == "OFF":
+            keycodes.append("KEYCODE_TAB")
+        keycodes += ["KEYCODE_ENTER", "KEYCODE_BACK"]
+        _send_key_events(device, keycodes)
+        if not _wait_for_state(device, _get_cellular_data_state, state, SETTINGS_TIMEOUT):
+            log.error("Failed to switch Cellular Data '{0}' on the device '{1}'".format(state, device))
+            sys.exit(1)
+    return _get_cellular_data_state(device)
+
+
+def _run_svc(device, service, state):
+    """
+    Switches the given service with "svc" command, which needs no UI. Some devices do not allow this from adb shell,
+    so the result should be verified.
+
+    :param device: string, device identifier.
+    :param service: string, service to switch, e.g. "wifi" or "data".
+    :param state: ON to enable, OFF to disable.
+    """
+    transport.execute(device, ["shell", "svc {0} {1} >/dev/null 2>&1 || true"
+                               .format(service, "enable" if state == "ON" else "disable")])
+
+
+def _wait_for_state(device, get_state, state, timeout):
+    """
+    Polls device setting till it gets the expected state.
+
+    :param device: string, device identifier.
+    :param get_state: function to get the setting value from device, e.g. _get_wifi_state.
+    :param state: ON or OFF, expected state.
+    :param timeout: float, maximum time to wait, seconds.
+    :returns boolean: True if state was reached, otherwise False.
+    """
+    deadline = time.time() + timeout
+    while True:
+        if _is_state_reached(get_state(device), state):
+            return True
+        if time.time() >= deadline:
+            return False
+        console.sleep(STATE_POLL_INTERVAL)
+
+
+def _is_state_reached(value, state):
+    """
+    Checks if value of global setting (e.g. wifi_on) means the given state.
+
+    :param value: string, setting value, e.g. "0", "1" or "2" (WiFi is ON in airplane mode).
+    :param state: ON or OFF.
+    :returns boolean: True if value corresponds to state.
+    """
+    enabled = value.strip() not in ("0", "", "null")
+    return enabled if state == "ON" else not enabled
 
 
 def _get_cellular_data_state(device):
@@ -363,8 +607,7 @@ def _get_cellular_data_state(device):
     :param device: device identifier where to get Cellular Data state.
     :return string: Cellular Data state.
     """
-    command = "adb -s {0} shell settings get global mobile_data".format(device)
-    return console.execute(command)
+    return transport.execute(device, "shell settings get global mobile_data")
 
 
 def _open_data_usage_settings(device):
@@ -373,9 +616,7 @@ def _open_data_usage_settings(device):
 
     :param device: string, device identifier.
     """
-    command = 'adb -s {0} shell am start -n com.android.settings/.Settings\"\$\"DataUsageSummaryActivity'\
-        .format(device)
-    console.execute(command)
+    transport.execute(device, 'shell am start -W -n com.android.settings/.Settings\"\$\"DataUsageSummaryActivity')
 
 
 def _open_wifi_settings(device):
@@ -384,9 +625,8 @@ def _open_wifi_settings(device):
 
     :param device: string, device identifier where to open WiFi settings.
     """
-    command = "adb -s {0} shell am start -a android.intent.action.MAIN -n com.android.settings/.wifi.WifiSettings" \
-        .format(device)
-    console.execute(command)
+    transport.execute(device, "shell am start -W -a android.intent.action.MAIN "
+                              "-n com.android.settings/.wifi.WifiSettings")
 
 
 def _get_wifi_state(device):
@@ -396,8 +636,7 @@ def _get_wifi_state(device):
     :param device: device identifier where to get WiFi state.
     :return string: WiFi state.
     """
-    command = "adb -s {0} shell settings get global wifi_on".format(device)
-    return console.execute(command)
+    return transport.execute(device, "shell settings get global wifi_on")
 
 
 def _send_key_event(device, keycode):
@@ -407,8 +646,21 @@ def _send_key_event(device, keycode):
     :param device: string, Device identifier to send key event to, e.g. "TA9890AMTG".
     :param keycode: string Key code to send, e.g. "KEYCODE_ENDCALL" or "6".
     """
-    command = "adb -s {0} shell input keyevent {1}".format(device, keycode)
-    console.execute(command)
+    _send_key_events(device, [keycode])
+
+
+def _send_key_events(device, keycodes):
+    """
+    Sends given key events onto the device in one adb round trip. Android 6.0+ injects all of them by single "input"
+    call, older versions run "input" per key but still in the same shell.
+
+    :param device: string, Device identifier to send key events to, e.g. "TA9890AMTG".
+    :param keycodes: list of key codes to send in order, e.g. ["KEYCODE_DPAD_UP", "KEYCODE_DPAD_CENTER"].
+    """
+    one_by_one = "; ".join("input keyevent " + keycode for keycode in keycodes)
+    script = 'if [ "$(getprop ro.build.version.sdk)" -ge 23 ]; then input keyevent {0}; else {1}; fi' \
+        .format(" ".join(keycodes), one_by_one)
+    transport.execute(device, ["shell", script])
 
 
 def _grant_permissions_to_change_config(device, package):
@@ -418,8 +670,7 @@ def _grant_permissions_to_change_config(device, package):
     :param device: string, device identifier, e.g. "TA9890AMTG".
     :param package: string, application package, e.g. "com.android.calculator2".
     """
-    command = "adb -s " + device + " shell pm grant " + package + " android.permission.CHANGE_CONFIGURATION"
-    console.execute(command)
+    transport.execute(device, "shell pm grant " + package + " android.permission.CHANGE_CONFIGURATION")
 
 
 def _is_app_installed(device, package):
@@ -430,10 +681,9 @@ def _is_app_installed(device, package):
     :param package: string, application package, e.g. "com.android.calculator2".
     :returns boolean: True if installed, otherwise False.
     """
-    command = "adb -s {0} shell pm list packages".format(device)
-    regex = "(?<=package:){0}[\r\n$]".format(package)
-    stdout = console.execute(command)
-    return True if re.findall(regex, stdout) else False
+    # packages are filtered by substring on device and listed till the exact one is found
+    with closing(transport.stream(device, "shell pm list packages " + package)) as lines:
+        return any(line.strip() == "package:" + package for line in lines)
 
 
 def _open_google_play_for_app(device, package):
@@ -443,5 +693,4 @@ def _open_google_play_for_app(device, package):
     :param device: string, device identifier, e.g. "TA9890AMTG".
     :param package: string, application package, e.g. "com.android.calculator2".
     """
-    command = "adb -s " + device + " shell am start -a android.intent.action.VIEW -d market://details?id=" + package
-    console.execute(command)
+    transport.execute(device, "shell am start -a android.intent.action.VIEW -d market://details?id=" + package)
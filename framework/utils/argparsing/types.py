@@ -6,6 +6,7 @@ import framework.utils.constants as constants
 import framework.utils.android as android
 import framework.utils.ios as ios
 import argparse
+import re
 import os
 
 
@@ -52,6 +53,15 @@ def existent_file(file_path):
     return file_path
 
 
+def existent_file_or_stdin(file_path):
+    """
+    Validates if given file exists, "-" stands for stdin.
+
+    :param file_path Absolute path to file or "-"
+    """
+    return file_path if file_path == "-" else existent_file(file_path)
+
+
 def supported_platform(given_platform):
     """
     Validates if given platform is correct.
@@ -93,3 +103,17 @@ def valid_state(given_state):
     if given_state not in ["ON", "OFF"]:
         raise argparse.ArgumentTypeError("Invalid state given: " + given_state)
     return given_state
+
+
+def regex(given_pattern):
+    """
+    Validates if given regular expression can be compiled.
+
+    :param given_pattern: string, regular expression.
+    :returns pattern: string, validated regular expression.
+    """
+    try:
+        re.compile(given_pattern)
+    except re.error as e:
+        raise argparse.ArgumentTypeError("Invalid regular expression given: {0}".format(e))
+    return given_pattern
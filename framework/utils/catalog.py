@@ -0,0 +1,185 @@
+"""
+This module contains a list of utilities related to the catalog of artifacts (screenshots, videos, logs, bundles) MTH
+produces. Every produced file is recorded with its device, platform, model, locale, action, time and size into an
+indexed SQLite database in the MTH cache directory, so artifacts are looked up without walking directories. Files are
+the source of truth, the catalog only points to them.
+"""
+
+import framework.utils.constants as constants
+import framework.utils.properties as properties
+import framework.utils.ios as ios
+import threading
+import logging
+import sqlite3
+import os
+
+log = logging.getLogger("mth.utils")
+
+CATALOG_FILE = "artifacts.sqlite"
+
+COLUMNS = ("created", "kind", "action", "device", "platform", "model", "locale", "size", "path")
+
+# kind of artifact by file extension
+KINDS = {".png": "screenshot", ".jpg": "screenshot", ".mp4": "video", ".txt": "log", ".gz": "log", ".zip": "archive",
+         ".tar": "archive"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    kind TEXT,
+    action TEXT,
+    device TEXT,
+    platform TEXT,
+    model TEXT,
+    locale TEXT,
+    created INTEGER NOT NULL,
+    size INTEGER,
+    UNIQUE (path, device)
+);
+CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts (created);
+CREATE INDEX IF NOT EXISTS artifacts_device ON artifacts (device, created);
+CREATE INDEX IF NOT EXISTS artifacts_model ON artifacts (model, created);
+CREATE INDEX IF NOT EXISTS artifacts_locale ON artifacts (locale, created);
+CREATE INDEX IF NOT EXISTS artifacts_action ON artifacts (action, created);
+CREATE INDEX IF NOT EXISTS artifacts_platform ON artifacts (platform, created);
+CREATE INDEX IF NOT EXISTS artifacts_kind ON artifacts (kind, created);
+"""
+
+_lock = threading.Lock()
+
+
+def artifact(path, action, device, platform, model=None, locale=None, kind=None):
+    """
+    Describes produced file for the catalog.
+
+    :param path: string, path to file.
+    :param action: string, action which produced the file, e.g. "screenshot".
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param platform: string, "android" or "ios".
+    :param model: string, device model, e.g. "Nexus 5".
+    :param locale: string, device locale, e.g. "en-US".
+    :param kind: string, kind of artifact, by default it's guessed by file extension, e.g. "screenshot".
+    :returns dict: artifact by column name.
+    """
+    path = os.path.abspath(path)
+    return {"path": path, "action": action, "device": device, "platform": platform, "model": model, "locale": locale,
+            "kind": kind or KINDS.get(os.path.splitext(path)[1].lower(), "file"),
+            "created": int(os.path.getmtime(path) * 1000), "size": os.path.getsize(path)}
+
+
+def describe(device, platform):
+    """
+    Returns model and locale of device to describe its artifacts with.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param platform: string, "android" or "ios".
+    :returns dict: "model" and "locale", None if they are unknown (e.g. device is detached already).
+    """
+    try:
+        if platform == "android":
+            return dict(properties.get(device, "model", "locale"))
+        info = ios.get_info(device)
+        return {"model": ios.get_product_name(info.get("ProductType")) or info.get("ProductType"), "locale": None}
+    except (SystemExit, Exception) as e:
+        log.debug("Failed to describe device '{0}' for catalog: {1}".format(device, e))
+        return {"model": None, "locale": None}
+
+
+def add(artifacts):
+    """
+    Records artifacts in one transaction, artifact recorded before for the same path and device is replaced. Failure to
+    record doesn't fail the action which produced artifacts, they are on disk anyway.
+
+    :param artifacts: list, artifacts, see artifact().
+    """
+    if not artifacts:
+        return
+    try:
+        connection = _connect()
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO artifacts ({0}) VALUES ({1})".format(
+                    ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))),
+                    [[item.get(column) for column in COLUMNS] for item in artifacts])
+        finally:
+            connection.close()
+    except (sqlite3.Error, OSError) as e:
+        # e.g. cache directory can't be created
+        log.warning("Failed to record {0} artifacts in catalog: {1}".format(len(artifacts), e))
+
+
+def query(since=None, until=None, limit=None, **conditions):
+    """
+    Finds artifacts, the newest first.
+
+    :param since: int, the earliest time of artifact, milliseconds since epoch.
+    :param until: int, the latest time of artifact, milliseconds since epoch.
+    :param limit: int, maximum number of artifacts to return, by default all.
+    :param conditions: values of columns artifacts must have, e.g. device="TA9890AMTG", locale="ru-RU", None values
+    are ignored.
+    :returns list: artifacts as dicts by column name.
+    """
+    clauses = []
+    values = []
+    for column, value in sorted(conditions.items()):
+        if column not in COLUMNS:
+            raise ValueError("Unknown artifact column: " + column)
+        if value is not None:
+            clauses.append("{0} = ?".format(column))
+            values.append(value)
+    if since is not None:
+        clauses.append("created >= ?")
+        values.append(since)
+    if until is not None:
+        clauses.append("created <= ?")
+        values.append(until)
+    statement = "SELECT {0} FROM artifacts{1} ORDER BY created DESC{2}".format(
+        ", ".join(COLUMNS), " WHERE " + " AND ".join(clauses) if clauses else "",
+        " LIMIT {0:d}".format(limit) if limit else "")
+    connection = _connect()
+    try:
+        return [dict(zip(COLUMNS, row)) for row in connection.execute(statement, values)]
+    finally:
+        connection.close()
+
+
+def prune():
+    """
+    Removes artifacts whose files don't exist anymore.
+
+    :returns int: number of removed artifacts.
+    """
+    connection = _connect()
+    try:
+        missing = [(path,) for (path,) in connection.execute("SELECT DISTINCT path FROM artifacts")
+                   if not os.path.exists(path)]
+        with connection:
+            connection.executemany("DELETE FROM artifacts WHERE path = ?", missing)
+        return len(missing)
+    finally:
+        connection.close()
+
+
+def catalog_path():
+    """
+    :returns string: path to catalog database.
+    """
+    return os.path.join(constants.cache_dir(), CATALOG_FILE)
+
+
+def _connect():
+    """
+    Opens catalog database, creates it if it doesn't exist. Several MTH processes may write to it at the same time, so
+    it's in write-ahead log mode and writers wait for each other.
+
+    :returns sqlite3.Connection: connection to catalog.
+    """
+    path = catalog_path()
+    with _lock:
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        connection = sqlite3.connect(path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+    return connection
@@ -0,0 +1,42 @@
+"""
+This module contains a list of utilities related to MTH command line: building the parser and running parsed commands.
+"""
+
+from framework.classes.ActionExecutor import ActionExecutor
+from action.ActionRegistry import ActionRegistry
+import argparse
+
+
+def create_parser():
+    """
+    Creates parser for MTH command line with all registered actions.
+
+    :returns argparse.ArgumentParser: parser instance.
+    """
+    parser = argparse.ArgumentParser(prog="mth")
+    parser.add_argument("--verbose", "-v",
+                        help="Debug output",
+                        action="store_true",
+                        dest="verbose",
+                        default=False,
+                        required=False)
+    subparsers = parser.add_subparsers(title="Available actions",
+                                       dest="action",
+                                       help="List of available actions")
+    for action_key, action in ActionRegistry.registry.iteritems():
+        action_parser = subparsers.add_parser(action.Meta.action,
+                                              help=action.Meta.help)
+        action.init_parser(action_parser)
+    return parser
+
+
+def execute(args):
+    """
+    Executes action for the given parsed command line.
+
+    :param args: argparse.Namespace, parsed command line.
+    :returns: whatever action returns.
+    """
+    executor = ActionExecutor()
+    delattr(args, "verbose")
+    return executor(args)
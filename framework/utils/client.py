@@ -0,0 +1,148 @@
+"""
+This module contains a list of utilities related to MTH server client. It is imported before any action, so keep it
+free of heavy imports: the whole point of the client is to skip them.
+"""
+
+import framework.utils.constants as constants
+import threading
+import logging
+import socket
+import errno
+import json
+import sys
+import os
+
+# actions which are always executed in the calling process
+LOCAL_ACTIONS = ("serve",)
+
+
+def socket_path():
+    """
+    :returns string: path to unix socket of MTH server.
+    """
+    return os.environ.get("MTH_SOCKET") or os.path.join(constants.cache_dir(), "mth.sock")
+
+
+def connect_to_forward(argv):
+    """
+    Connects to running MTH server if the given command line should be executed by it. The connection is then given
+    to run(), so the server is connected once and there is no gap for it to go away in.
+
+    :param argv: list, command line arguments without program name.
+    :returns socket.socket: connection to server, None if the command should be executed locally (e.g. server isn't
+    running).
+    """
+    if "_ARGCOMPLETE" in os.environ or os.environ.get("MTH_NO_SERVER"):
+        return None
+    action = next((arg for arg in argv if not arg.startswith("-")), None)
+    if action is None or action in LOCAL_ACTIONS or "-h" in argv or "--help" in argv:
+        return None
+    try:
+        return _connect()
+    except socket.error:
+        return None
+
+
+def is_server_running():
+    """
+    :returns boolean: True if MTH server accepts connections, otherwise False.
+    """
+    try:
+        _connect().close()
+        return True
+    except socket.error:
+        return False
+
+
+def request(message):
+    """
+    Sends control message (e.g. {"control": "status"}) to MTH server.
+
+    :param message: dict, message to send.
+    :returns dict: server reply.
+    """
+    connection = _connect()
+    try:
+        connection.sendall(json.dumps(message) + "\n")
+        reply = connection.makefile("r").readline()
+        return json.loads(reply) if reply else {}
+    finally:
+        connection.close()
+
+
+def run(argv, connection):
+    """
+    Executes the given command line by MTH server, relays its output and logs, forwards own input to it.
+
+    :param argv: list, command line arguments without program name.
+    :param connection: socket.socket, connection to server, see connect_to_forward. It is closed when command ends.
+    :returns int: exit code of the command.
+    """
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            connection.sendall(json.dumps(message) + "\n")
+
+    send({"argv": argv, "cwd": os.getcwd()})
+    stdin_thread = threading.Thread(target=_forward_input, args=(send,))
+    stdin_thread.daemon = True
+    stdin_thread.start()
+
+    replies = connection.makefile("r")
+    try:
+        while True:
+            try:
+                reply = replies.readline()
+            except KeyboardInterrupt:
+                send({"interrupt": True})
+                continue
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not reply:
+                return 1
+            message = json.loads(reply)
+            if "out" in message:
+                sys.stdout.write(message["out"].encode("utf-8"))
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"].encode("utf-8"))
+                sys.stderr.flush()
+            elif "log" in message:
+                name, level, text = message["log"]
+                logging.getLogger(name).log(level, "%s", text)
+            elif "exit" in message:
+                return message["exit"]
+    finally:
+        connection.close()
+
+
+def _forward_input(send):
+    """
+    Forwards lines of own stdin to the server till EOF.
+
+    :param send: function to send message to server.
+    """
+    try:
+        while True:
+            line = sys.stdin.readline()
+            send({"in": line})
+            if not line:
+                return
+    except (IOError, socket.error):
+        return
+
+
+def _connect():
+    """
+    :returns socket.socket: connection to MTH server.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path())
+    except socket.error:
+        connection.close()
+        raise
+    return connection
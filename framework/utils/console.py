@@ -3,15 +3,34 @@ This module contains a list of utilities related to console.
 """
 
 from __future__ import print_function
+import framework.utils.sessions as sessions
 from select import select
+import collections
 import subprocess
+import threading
+import tempfile
 import logging
+import codecs
 import math
+import time
 import sys
 import os
 
 log = logging.getLogger("mth.utils")
 
+# lines with "Failure" kept by stream() to report failed command
+FAILURE_LINES = 20
+
+# how often wait() checks for interrupt() while waiting for event, seconds
+WAIT_STEP = 0.1
+
+_running = set()
+_running_lock = threading.Lock()
+# processes killed by interrupt(), their callers raise KeyboardInterrupt once
+_killed = set()
+# set by interrupt() to wake sleep() calls which are in progress, replaced with a new event then
+_interrupted = threading.Event()
+
 
 def execute(command, suppress_errors=False, out=subprocess.PIPE, io_mode="w+"):
     """
@@ -28,29 +47,240 @@ def execute(command, suppress_errors=False, out=subprocess.PIPE, io_mode="w+"):
     process = None
     try:
         if out is subprocess.PIPE:
-            process = subprocess.Popen(command, stdout=out, stderr=subprocess.PIPE)
-            stdout, stderr = process.communicate()
-            if (stderr and suppress_errors) or stderr.startswith("WARNING"):
-                log.debug(stderr)
-            # adb returns code 0 and empty stderr for failed commands
-            if process.returncode != 0 or "Failure" in stdout:
-                message = "{0}{1}".format(stderr, stdout)
-                log.error("Execution failed for '{0}' with the output:\n{1}".format(" ".join(command), message))
-                sys.exit(1)
-            return stdout.rstrip()
+            return check(command, run(command), suppress_errors)
         else:
             directory = os.path.dirname(out)
             if not os.path.exists(directory):
                 os.makedirs(directory)
 
             with open(out, io_mode) as out:
-                process = subprocess.Popen(command, stdout=out, stderr=subprocess.PIPE)
+                process = _start(command, stdout=out, stderr=subprocess.PIPE)
                 process.wait()
+                _check_interrupt(process)
 
     except KeyboardInterrupt:
+        # process may be already killed by interrupt()
+        if process and process.poll() is None:
+            process.kill()
+            process.wait()
+    finally:
         if process:
+            _forget(process)
+
+
+def run(command):
+    """
+    Executes given command and returns its result without checking it, e.g. to retry failed command. Shell commands to
+    Android devices are run in persistent sessions if they are enabled.
+
+    :param command: string or list, command to execute.
+    :returns tuple: exit status, stdout and stderr.
+    """
+    command = command.split() if isinstance(command, str) else command
+    routed = sessions.route(command)
+    if routed:
+        returncode, stdout = routed
+        return returncode, stdout, ""
+    process = _start(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = process.communicate()
+        _check_interrupt(process)
+        return process.returncode, stdout, stderr
+    except KeyboardInterrupt:
+        # process may be already killed by interrupt()
+        if process.poll() is None:
             process.kill()
             process.wait()
+        raise
+    finally:
+        _forget(process)
+
+
+def check(command, result, suppress_errors=False):
+    """
+    Checks result of executed command, exits if it failed.
+
+    :param command: list, executed command.
+    :param result: tuple, exit status, stdout and stderr, see run.
+    :param suppress_errors: boolean, set True to redirect stderr of succeeded command to debug log.
+    :returns string: stdout without trailing whitespaces.
+    """
+    returncode, stdout, stderr = result
+    if (stderr and suppress_errors) or stderr.startswith("WARNING"):
+        log.debug(stderr)
+    # adb returns code 0 and empty stderr for failed commands
+    if returncode != 0 or "Failure" in stdout:
+        message = "{0}{1}".format(stderr, stdout)
+        log.error("Execution failed for '{0}' with the output:\n{1}".format(" ".join(command), message))
+        sys.exit(1)
+    return stdout.rstrip()
+
+
+def stream(command, chunk_size=None, encoding=None, check=True, timeout=None):
+    """
+    Executes given command and yields its stdout as soon as it arrives, so long or endless output (e.g. device logs,
+    "pm list packages") is never kept in memory. Stderr is redirected to debug log. Failure is detected as by execute:
+    by exit status and by "Failure" anywhere in the output, it's checked once the output ends. The process is killed
+    when the generator is closed before the output ends (e.g. caller found what it needed), or when execution is
+    interrupted.
+
+    :param command: string or list, command to execute.
+    :param chunk_size: int, maximum size of chunk to yield raw output by, by default output is yielded line by line.
+    :param encoding: string, encoding to decode output with, e.g. "utf-8", by default output is not decoded.
+    :param check: boolean, True to exit if command failed, False for commands which are expected to be stopped (e.g.
+    idevicesyslog).
+    :param timeout: float, seconds after which the process is killed and the output ends even if no more output
+    arrives, e.g. to capture endless log for a while, by default the output isn't limited in time. Use it with
+    check=False, the killed process exits with non-zero status.
+    :returns generator: lines of stdout including line endings, or chunks of stdout.
+    """
+    command = command.split() if isinstance(command, str) else command
+    stderr = tempfile.TemporaryFile()
+    process = _start(command, stdout=subprocess.PIPE, stderr=stderr)
+    timer = None
+    if timeout:
+        def expire():
+            if process.poll() is None:
+                process.kill()
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+    decoder = codecs.getincrementaldecoder(encoding)("replace") if encoding else None
+    # the end of previous chunk, so "Failure" split between chunks is found too
+    tail = ""
+    failures = collections.deque(maxlen=FAILURE_LINES)
+    finished = False
+    try:
+        if chunk_size:
+            chunks = iter(lambda: os.read(process.stdout.fileno(), chunk_size), "")
+        else:
+            chunks = iter(process.stdout.readline, "")
+        for chunk in chunks:
+            if "Failure" in tail + chunk:
+                failures.append((tail + chunk).strip())
+            tail = chunk[-len("Failure") + 1:] if chunk_size else ""
+            if decoder:
+                # chunk may end in the middle of multi-byte character, it is decoded with the next one
+                chunk = decoder.decode(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+        if decoder:
+            # output ended in the middle of multi-byte character, it's yielded as replacement character
+            rest = decoder.decode("", True)
+            if rest:
+                yield rest
+        process.wait()
+        _check_interrupt(process)
+        finished = True
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        _forget(process)
+        stderr.seek(0)
+        errors = stderr.read()
+        stderr.close()
+        if finished and check and (process.returncode != 0 or failures):
+            message = "{0}{1}".format(errors, "\n".join(failures))
+            log.error("Execution failed for '{0}' with the output:\n{1}".format(" ".join(command), message))
+            sys.exit(1)
+        if errors:
+            log.debug(errors)
+
+
+def interrupt():
+    """
+    Interrupts execution as if Ctrl+C was pressed, e.g. when it's requested by client of MTH server: kills processes
+    which are being executed and wakes sleep() calls in progress, they raise KeyboardInterrupt. As with Ctrl+C, the
+    interrupt is delivered once: commands and sleeps started afterwards (e.g. cleanup after interrupt) run as usual.
+    """
+    global _interrupted
+    with _running_lock:
+        interrupted, _interrupted = _interrupted, threading.Event()
+        processes = list(_running)
+        _killed.update(processes)
+    interrupted.set()
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+
+
+def reset_interrupt():
+    """
+    Forgets processes killed by interrupt() whose callers haven't noticed it, e.g. before the next command of server.
+    """
+    with _running_lock:
+        _killed.clear()
+
+
+def sleep(seconds):
+    """
+    Sleeps for the given time, can be interrupted by Ctrl+C or by interrupt().
+
+    :param seconds: float, time to sleep, seconds.
+    """
+    if _interrupted.wait(seconds):
+        raise KeyboardInterrupt
+
+
+def wait(event, seconds=None):
+    """
+    Waits till the given event is set, can be interrupted by Ctrl+C or by interrupt() as sleep().
+
+    :param event: threading.Event, event to wait for.
+    :param seconds: float, maximum time to wait, seconds, by default till event is set.
+    :returns boolean: True if event is set, False if time is out.
+    """
+    interrupted = _interrupted
+    deadline = None if seconds is None else time.time() + seconds
+    while True:
+        step = WAIT_STEP if deadline is None else min(WAIT_STEP, deadline - time.time())
+        if step <= 0 or event.wait(step):
+            return event.is_set()
+        if interrupted.is_set():
+            raise KeyboardInterrupt
+
+
+def _check_interrupt(process):
+    """
+    Raises KeyboardInterrupt if the given process was killed by interrupt().
+
+    :param process: subprocess.Popen, finished process.
+    """
+    with _running_lock:
+        if process not in _killed:
+            return
+        _killed.discard(process)
+    raise KeyboardInterrupt
+
+
+def _start(command, **kwargs):
+    """
+    Starts process for the given command and remembers it as running.
+
+    :param command: list, command to execute.
+    :param kwargs: keyword arguments for subprocess.Popen.
+    :returns subprocess.Popen: started process.
+    """
+    process = subprocess.Popen(command, **kwargs)
+    with _running_lock:
+        _running.add(process)
+    return process
+
+
+def _forget(process):
+    """
+    Forgets the given process started with _start(), once it's finished.
+
+    :param process: subprocess.Popen, process to forget.
+    """
+    with _running_lock:
+        _running.discard(process)
+        _killed.discard(process)
 
 
 def prompt(input_prompt, timeout=None):
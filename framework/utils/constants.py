@@ -2,6 +2,7 @@
 This module contains a list of constants.
 """
 
+import sys
 import os
 
 
@@ -44,3 +45,23 @@ def downloads_dir():
     :returns string: default downloads directory path.
     """
     return os.path.expanduser('~') + "/Downloads/"
+
+
+def cache_dir():
+    """
+    :returns string: directory where MTH keeps its cache, e.g. "~/.cache/mth".
+    """
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser('~'), "Library", "Caches", "mth")
+    base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser('~'), ".cache")
+    return os.path.join(base_dir, "mth")
+
+
+def config_dir():
+    """
+    :returns string: directory where user keeps MTH configuration, e.g. "~/.config/mth".
+    """
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser('~'), "Library", "Application Support", "mth")
+    base_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser('~'), ".config")
+    return os.path.join(base_dir, "mth")
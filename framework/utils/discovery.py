@@ -0,0 +1,200 @@
+"""
+This module contains a list of utilities related to discovery of connected devices. By default every lookup asks adb
+and libimobiledevice, long-running processes (e.g. MTH server) can enable the live table to share lookups and watch
+attach/detach events to keep it current without polling.
+"""
+
+from framework.classes.DeviceWatcher import DeviceWatcher
+import framework.utils.transport as transport
+import threading
+import logging
+import time
+
+log = logging.getLogger("mth.utils")
+
+_lock = threading.Lock()
+# notified when watcher delivers device list of a platform
+_changed = threading.Condition(_lock)
+_table = {}
+_tracked = set()
+_subscribers = []
+_watcher = None
+_ttl = None
+
+
+def enable(ttl=1.0):
+    """
+    Enables live device table: device lists are kept in memory and refreshed not more often than once per ttl.
+
+    :param ttl: float, how long device list stays valid, seconds.
+    """
+    global _ttl
+    _ttl = ttl
+
+
+def disable():
+    """
+    Disables live device table, every lookup goes to device tools again.
+    """
+    global _ttl
+    unwatch()
+    _ttl = None
+    with _lock:
+        _table.clear()
+        _tracked.clear()
+
+
+def is_enabled():
+    """
+    :returns boolean: True if live device table is enabled, otherwise False.
+    """
+    return _ttl is not None
+
+
+def watch():
+    """
+    Starts watching attach/detach events, device lists of watched platforms never expire while events are coming.
+    Enables live device table if needed. Only the local adb server sends events, so Android devices are not watched if
+    other adb servers are configured.
+    """
+    global _watcher
+    if _ttl is None:
+        enable()
+    if _watcher is None:
+        platforms = ("ios",) if transport.has_servers() else ("android", "ios")
+        _watcher = DeviceWatcher(_on_change, platforms=platforms)
+        _watcher.start()
+
+
+def unwatch():
+    """
+    Stops watching attach/detach events, device lists expire by ttl again.
+    """
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+    with _lock:
+        _tracked.clear()
+
+
+def is_watching():
+    """
+    :returns boolean: True if attach/detach events are watched, otherwise False.
+    """
+    return _watcher is not None
+
+
+def is_tracked(platform):
+    """
+    :param platform: string, "android" or "ios".
+    :returns boolean: True if device list of the platform is kept current by watcher, otherwise False.
+    """
+    return platform in _tracked
+
+
+def wait_tracked(timeout=2.0):
+    """
+    Waits till watcher delivers the first device list of every watched platform, so the following lookups read the
+    table and events it publishes are relative to what the lookups returned.
+
+    :param timeout: float, maximum time to wait, seconds, e.g. adb server may be not running.
+    """
+    deadline = time.time() + timeout
+    with _changed:
+        while _watcher is not None and not set(_watcher.platforms) <= _tracked:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            _changed.wait(remaining)
+
+
+def subscribe(callback):
+    """
+    Subscribes to device events, callback is called as callback(event, platform, device) where event is "attach" or
+    "detach". Events are published when device list changes, either by watcher or by refreshing expired list.
+
+    :param callback: function to call on device event.
+    """
+    with _lock:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    """
+    Unsubscribes from device events.
+
+    :param callback: function passed to subscribe.
+    """
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def cached(platform, loader):
+    """
+    Returns devices of the given platform, from the live table if it is enabled and up to date.
+
+    :param platform: string, "android" or "ios".
+    :param loader: function without arguments which lists devices of the platform.
+    :returns list: list of devices.
+    """
+    if _ttl is None:
+        return loader()
+    with _lock:
+        entry = _table.get(platform)
+        if entry is not None and (platform in _tracked or time.time() - entry[0] <= _ttl):
+            return list(entry[1])
+    devices = loader()
+    _replace(platform, devices)
+    return list(devices)
+
+
+def update(platform, devices):
+    """
+    Replaces devices of the given platform in the live table, e.g. when they are tracked by some watcher.
+
+    :param platform: string, "android" or "ios".
+    :param devices: list of devices.
+    """
+    _replace(platform, devices)
+
+
+def _on_change(platform, devices):
+    """
+    Receives device lists from watcher.
+
+    :param platform: string, "android" or "ios".
+    :param devices: list of devices, or None if watcher lost events of the platform.
+    """
+    if devices is None:
+        with _lock:
+            _tracked.discard(platform)
+        return
+    _replace(platform, devices)
+    with _changed:
+        _tracked.add(platform)
+        _changed.notify_all()
+
+
+def _replace(platform, devices):
+    """
+    Replaces devices of the given platform in the live table and publishes events for the difference.
+
+    :param platform: string, "android" or "ios".
+    :param devices: list of devices.
+    """
+    with _lock:
+        entry = _table.get(platform)
+        _table[platform] = (time.time(), list(devices))
+        subscribers = list(_subscribers)
+    if entry is None or not subscribers:
+        return
+    events = [("detach", device) for device in entry[1] if device not in devices]
+    events += [("attach", device) for device in devices if device not in entry[1]]
+    for event, device in events:
+        for callback in subscribers:
+            try:
+                callback(event, platform, device)
+            except Exception:
+                log.exception("Device event handler failed")
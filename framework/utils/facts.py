@@ -0,0 +1,91 @@
+"""
+This module contains a list of utilities related to caching static device facts on disk.
+"""
+
+import framework.utils.constants as constants
+import logging
+import json
+import time
+import os
+import re
+
+log = logging.getLogger("mth.utils")
+
+
+def load(device, boot_key):
+    """
+    Returns facts cached for the given device during its current boot.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param boot_key: string, identifier of the current device boot (boot ID or build fingerprint).
+    :returns dict: cached facts, empty if nothing is cached or the device was rebooted since.
+    """
+    path = _entry_path(device)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as entry_file:
+            entry = json.load(entry_file)
+    except (IOError, ValueError):
+        log.debug("Ignoring unreadable cache entry '{0}'".format(path))
+        return {}
+    if entry.get("boot_key") != boot_key:
+        return {}
+    return entry.get("facts", {})
+
+
+def save(device, boot_key, facts):
+    """
+    Saves facts for the given device, replacing whatever was cached for it before.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param boot_key: string, identifier of the current device boot (boot ID or build fingerprint).
+    :param facts: dict, facts to save, e.g. {"model": "Nexus 5"}.
+    """
+    path = _entry_path(device)
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    entry = {"device": device, "boot_key": boot_key, "updated": time.time(), "facts": facts}
+    # write aside and rename so that concurrent runs never read a half-written entry
+    temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    with open(temp_path, "w") as entry_file:
+        json.dump(entry, entry_file, indent=2, sort_keys=True)
+    os.rename(temp_path, path)
+
+
+def prune(max_age_days):
+    """
+    Removes cache entries which were not updated for the given number of days.
+
+    :param max_age_days: int, maximum age of entry to keep, days.
+    :returns int: number of removed entries.
+    """
+    directory = _devices_dir()
+    if not os.path.exists(directory):
+        return 0
+    threshold = time.time() - max_age_days * 24 * 60 * 60
+    removed = 0
+    for file_name in os.listdir(directory):
+        path = os.path.join(directory, file_name)
+        if os.path.getmtime(path) < threshold:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _devices_dir():
+    """
+    :returns string: directory where device facts are cached.
+    """
+    return os.path.join(constants.cache_dir(), "devices")
+
+
+def _entry_path(device):
+    """
+    Returns cache entry path for the given device.
+
+    :param device: string, device identifier, e.g. "192.168.1.15:5555".
+    :returns string: path to cache entry file.
+    """
+    return os.path.join(_devices_dir(), re.sub(r"[^\w.-]", "_", device) + ".json")
@@ -0,0 +1,91 @@
+"""
+This module contains a list of utilities related to frame statistics of Android applications ("dumpsys gfxinfo
+<package> framestats"). Frames are kept in NumPy arrays, so hours of frames are processed without loops over frames.
+"""
+
+import numpy
+
+PROFILE_DATA = "---PROFILEDATA---"
+
+# columns kept for every frame, nanoseconds
+INTENDED_VSYNC = 0
+FRAME_COMPLETED = 1
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse(output, default_window):
+    """
+    Parses frames from "dumpsys gfxinfo <package> framestats" output. Frames with non-zero flags are not real frames
+    (e.g. first frame of window), so they are dropped.
+
+    :param output: string, dumpsys output.
+    :param default_window: string, window name for devices which don't print window names.
+    :returns list: tuples of window name and int64 array of frames with columns INTENDED_VSYNC and FRAME_COMPLETED.
+    """
+    windows = []
+    window = default_window
+    # profile data is printed between two markers, window name is printed before them
+    for index, section in enumerate(output.split(PROFILE_DATA)):
+        if index % 2 == 0:
+            for line in section.split("\n"):
+                if line.strip().startswith("Window:"):
+                    window = line.split(":", 1)[1].strip()
+            continue
+        lines = [line.strip().rstrip(",") for line in section.strip().split("\n") if line.strip()]
+        if len(lines) < 2:
+            continue
+        header = lines[0].split(",")
+        values = numpy.fromstring(",".join(lines[1:]), dtype=numpy.int64, sep=",")
+        frames = values[:len(values) // len(header) * len(header)].reshape(-1, len(header))
+        frames = frames[frames[:, header.index("Flags")] == 0]
+        windows.append((window, frames[:, [header.index("IntendedVsync"), header.index("FrameCompleted")]]))
+    return windows
+
+
+def summarize(frames, bucket=None, jank_threshold=16.67):
+    """
+    Computes jank percentage and frame duration percentiles for every time bucket.
+
+    :param frames: int64 array of frames with columns INTENDED_VSYNC and FRAME_COMPLETED.
+    :param bucket: float, length of time bucket, seconds, None for a single bucket with all frames.
+    :param jank_threshold: float, frames longer than this are janky, milliseconds.
+    :returns list: dict per bucket with its start (seconds since the first frame), number of frames, jank percentage
+    and percentiles of frame duration (e.g. "p95_ms"), milliseconds.
+    """
+    if not len(frames):
+        return []
+    durations = (frames[:, FRAME_COMPLETED] - frames[:, INTENDED_VSYNC]) / 1e6
+    offsets = frames[:, INTENDED_VSYNC] - frames[:, INTENDED_VSYNC].min()
+    buckets = offsets // int(bucket * 1e9) if bucket else numpy.zeros(len(frames), dtype=numpy.int64)
+    # sort by bucket and duration, so percentiles of every bucket are picked by index at once
+    order = numpy.lexsort((durations, buckets))
+    durations, buckets = durations[order], buckets[order]
+    keys, starts, counts = numpy.unique(buckets, return_index=True, return_counts=True)
+    janks = numpy.add.reduceat((durations > jank_threshold).astype(numpy.int64), starts) * 100.0 / counts
+    # nearest rank, as PerfAction: the smallest duration which at least the given percent of frames don't exceed, in
+    # integers, as float ceil(0.95 * 20) is 20 instead of 19
+    percentiles = dict((percentile, durations[starts + numpy.maximum((percentile * counts + 99) // 100 - 1, 0)])
+                       for percentile in PERCENTILES)
+    summary = []
+    for index in range(len(keys)):
+        record = {"start": int(keys[index] * bucket) if bucket else 0, "frames": int(counts[index]),
+                  "jank_percent": round(float(janks[index]), 2)}
+        for percentile in PERCENTILES:
+            record["p{0}_ms".format(percentile)] = round(float(percentiles[percentile][index]), 2)
+        summary.append(record)
+    return summary
+
+
+def merge(chunks):
+    """
+    Joins frames collected by several dumps, frames repeated by consecutive dumps are kept once.
+
+    :param chunks: list of int64 arrays of frames.
+    :returns numpy.ndarray: frames ordered by intended vsync.
+    """
+    if not chunks:
+        return numpy.empty((0, 2), dtype=numpy.int64)
+    frames = numpy.concatenate(chunks)
+    _, unique = numpy.unique(frames[:, INTENDED_VSYNC], return_index=True)
+    return frames[unique]
@@ -0,0 +1,106 @@
+"""
+This module contains a list of utilities related to comparing screenshots. Pixels are compared as NumPy arrays and
+pairs of screenshots are compared in a pool of processes, so large sets are checked fast.
+"""
+
+from multiprocessing import Pool
+from PIL import Image
+import numpy
+import os
+import re
+
+# screenshots are named "<locale>_<model>_<manufacturer>_<timestamp>.png", timestamp differs between runs
+TIMESTAMP_REGEX = re.compile(r"_\d{10,}(?=\.png$)")
+
+
+def pair(base_dir, new_dir):
+    """
+    Pairs screenshots of two sets by their paths without timestamps. If a set has several screenshots with the same
+    name (e.g. taken with --howmany), they are paired in the order they were taken.
+
+    :param base_dir: string, directory with base screenshots, e.g. of the previous build.
+    :param new_dir: string, directory with new screenshots.
+    :returns list: tuples of name, path to base screenshot and path to new one, path is None if it's missing.
+    """
+    base, new = _index(base_dir), _index(new_dir)
+    return [(name, base.get(name), new.get(name)) for name in sorted(set(base) | set(new))]
+
+
+def compare_all(pairs, output_dir, tolerance=0, jobs=None):
+    """
+    Compares pairs of screenshots in a pool of processes and saves diff masks of changed ones.
+
+    :param pairs: list, tuples of name, path to base screenshot and path to new one, see pair.
+    :param output_dir: string, directory to save diff masks to.
+    :param tolerance: int, maximum difference of color channel for pixel to be considered the same.
+    :param jobs: int, number of processes, by default number of CPUs.
+    :returns generator: dict per pair with name, status ("same", "changed", "resized", "added" or "removed"), ratio
+    of changed pixels and path to diff mask, in order of completion.
+    """
+    tasks = [(name, base, new, os.path.join(output_dir, os.path.splitext(name)[0] + "_diff.png"), tolerance)
+             for name, base, new in pairs]
+    pool = Pool(jobs)
+    try:
+        for result in pool.imap_unordered(compare, tasks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def compare(task):
+    """
+    Compares two screenshots pixel by pixel and saves diff mask if they differ: new screenshot dimmed, with changed
+    pixels in red.
+
+    :param task: tuple of name, path to base screenshot, path to new screenshot, path to save diff mask to and
+    tolerance.
+    :returns dict: result of comparison, see compare_all.
+    """
+    name, base_path, new_path, mask_path, tolerance = task
+    result = {"name": name, "base": base_path, "new": new_path, "ratio": 1.0, "mask": None}
+    if base_path is None or new_path is None:
+        result["status"] = "added" if base_path is None else "removed"
+        return result
+    base = numpy.asarray(Image.open(base_path).convert("RGB"), dtype=numpy.int16)
+    new = numpy.asarray(Image.open(new_path).convert("RGB"), dtype=numpy.int16)
+    if base.shape != new.shape:
+        result["status"] = "resized"
+        return result
+    changed = (numpy.abs(base - new) > tolerance).any(axis=2)
+    # status is decided by the count, the ratio of one pixel of a large screen is too small to compare with zero
+    result["ratio"] = float(changed.mean())
+    result["status"] = "changed" if changed.any() else "same"
+    if result["status"] == "changed":
+        mask = (new // 3).astype(numpy.uint8)
+        mask[changed] = (255, 0, 0)
+        directory = os.path.dirname(mask_path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # other worker has just created it
+                pass
+        Image.fromarray(mask).save(mask_path)
+        result["mask"] = mask_path
+    return result
+
+
+def _index(directory):
+    """
+    :param directory: string, directory with screenshots.
+    :returns dict: paths to screenshots by their names without timestamps.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths += [os.path.join(root, name) for name in files
+                  if name.lower().endswith(".png") and not name.endswith("_diff.png")]
+    index = {}
+    counts = {}
+    for path in sorted(paths):
+        name = TIMESTAMP_REGEX.sub("", os.path.relpath(path, directory))
+        counts[name] = counts.get(name, 0) + 1
+        if counts[name] > 1:
+            name = "{0}_{1}.png".format(os.path.splitext(name)[0], counts[name])
+        index[name] = path
+    return index
@@ -2,14 +2,34 @@
 This module contains a list of utilities related to iOS.
 """
 
+from framework.classes.LogFile import LogFile
+from contextlib import closing
+import framework.utils.discovery as discovery
+import framework.utils.constants as constants
+import framework.utils.parallel as parallel
 import framework.utils.console as console
+import threading
+import plistlib
 import logging
 import string
+import glob
+import json
 import time
+import sys
 import os
+import re
 
 log = logging.getLogger("mth.utils")
 
+PRODUCT_NAMES_FILE = "ios_products.json"
+
+# date, device name, process with optional subsystem in brackets and pid, e.g. "Mar 12 10:11:12 iPhone App(Lib)[58]"
+SYSLOG_HEADER = re.compile(r"^\w{3} +\d+ [\d:]+ \S+ ([^\s(\[]+)(?:\(([^)]*)\))?\[\d+\]")
+
+_info_lock = threading.Lock()
+_info = {}
+_product_names = None
+
 
 def take_screenshot(device, target_dir, screenshot_name):
     """
@@ -23,6 +43,32 @@ def take_screenshot(device, target_dir, screenshot_name):
     console.execute(command)
 
 
+def take_screenshots(targets, howmany=1, jobs=8, on_screenshot=None):
+    """
+    Takes screenshots from several iOS devices at once. Device model is resolved once per device, devices are captured
+    concurrently, but shots of the same device are taken one by one as idevicescreenshot can't share a device.
+
+    :param targets: list of tuples, device identifier and directory where to save its screenshots.
+    :param howmany: int, how many screenshots to take from every device.
+    :param jobs: int, how many devices to capture at the same time.
+    :param on_screenshot: function(path) to call as soon as screenshot is taken, called from worker threads.
+    :returns list: paths of taken screenshots.
+    """
+    def capture(target):
+        device, target_dir = target
+        model = (get_device_model(device) or get_info(device).get("ProductType", "ios")).lower().replace(" ", "")
+        paths = []
+        for _ in range(howmany):
+            screenshot_name = "{0}_{1}.png".format(model, int(time.time() * 1000))
+            take_screenshot(device, target_dir, screenshot_name)
+            paths.append(os.path.join(target_dir, screenshot_name))
+            if on_screenshot:
+                on_screenshot(paths[-1])
+        return paths
+
+    return [path for paths in parallel.imap_unordered(capture, targets, jobs) for path in paths]
+
+
 def get_ios_version(device):
     """
     Returns iOS version for specified device.
@@ -30,15 +76,22 @@ def get_ios_version(device):
     :param device: device identifier, e.g. 860850006baba72f031cf22a333ba36d65239b61.
     :returns string: iOS version for specified device.
     """
-    command = "ideviceinfo -u {0} -k ProductVersion".format(device)
-    stdout = console.execute(command)
-    return stdout
+    return get_info(device).get("ProductVersion")
 
 
 def list_devices():
     """
     Lists connected iOS devices.
 
+    :returns: List of devices.
+    """
+    return discovery.cached("ios", _list_devices)
+
+
+def _list_devices():
+    """
+    Lists connected iOS devices asking libimobiledevice.
+
     :returns: List of devices.
     """
     command = "idevice_id -l"
@@ -46,30 +99,136 @@ def list_devices():
     return filter(None, string.split(stdout, '\n'))
 
 
-def get_log(device):
+def get_log(device, processes=None, subsystems=None, pattern=None, compress=False, on_line=None):
     """
-    Gets log file from device.
+    Gets log file from device. Lines are filtered while they are streamed, only matching ones are written to disk.
 
     :param device: device identifier (e.g. "TA9890AMTG").
+    :param processes: list, names of processes to keep lines of, e.g. ["SpringBoard"], by default all.
+    :param subsystems: list, subsystems (shown in brackets after process) to keep lines of, e.g. ["UIKitCore"],
+    by default all.
+    :param pattern: string, regular expression lines must match, by default any line.
+    :param compress: boolean, True to gzip the log while writing it.
+    :param on_line: function(line) to call for every line as soon as it's captured, including filtered out ones.
+    :returns string: path to log file.
     """
     file_name = str(int(time.time() * 1000)) + ".txt"
     target_dir = os.getcwd()
-    log_path = os.path.join(target_dir, file_name)
-    get_log_command = "idevicesyslog -u {0}".format(device)
-    log.info("Logging in progress to '" + log_path + "'... To finish press Ctrl+C")
-    console.execute(get_log_command, False, log_path)
-    return log_path
+    log_file = LogFile(os.path.join(target_dir, file_name), compress)
+    matches = _syslog_filter(processes, subsystems, pattern)
+    dropped = 0
+    log.info("Logging in progress to '" + log_file.path + "'... To finish press Ctrl+C")
+    try:
+        for line in console.stream("idevicesyslog -u {0}".format(device), check=False):
+            if on_line:
+                on_line(line)
+            if matches(line):
+                log_file.write(line)
+            else:
+                dropped += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_file.close()
+    log.info("Captured {0} lines, {1} dropped by filter".format(log_file.lines, dropped))
+    return log_file.path
+
+
+def dump_log(device, path, duration):
+    """
+    Saves syslog of device for the given time. Syslog can't be read back, so it's captured from now on. The capture
+    is stopped when the time is over even if device logs nothing.
+
+    :param device: device identifier (e.g. "TA9890AMTG").
+    :param path: string, path to save log to.
+    :param duration: float, how long to capture syslog, seconds.
+    """
+    log_file = LogFile(path)
+    try:
+        for line in console.stream("idevicesyslog -u {0}".format(device), check=False, timeout=duration):
+            log_file.write(line)
+    finally:
+        log_file.close()
+
+
+def _syslog_filter(processes=None, subsystems=None, pattern=None):
+    """
+    Creates filter for idevicesyslog lines, e.g. "Mar 12 10:11:12 iPhone SpringBoard(UIKitCore)[58] <Notice>: text".
+    Lines without header continue the previous message and share its decision.
+
+    :param processes: list, names of processes to keep lines of, by default all.
+    :param subsystems: list, subsystems to keep lines of, by default all.
+    :param pattern: string, regular expression lines must match, by default any line.
+    :returns function: function(line) which returns True if line should be kept.
+    """
+    processes = set(processes or [])
+    subsystems = set(subsystems or [])
+    expression = re.compile(pattern) if pattern else None
+    if not processes and not subsystems and not expression:
+        return lambda line: True
+    state = {"keep": False}
+
+    def matches(line):
+        header = SYSLOG_HEADER.match(line)
+        if header is None:
+            return state["keep"]
+        process, subsystem = header.groups()
+        state["keep"] = ((not processes or process in processes) and (not subsystems or subsystem in subsystems) and
+                         (expression is None or expression.search(line) is not None))
+        return state["keep"]
+
+    return matches
+
+
+def get_info(device, refresh=False):
+    """
+    Returns all values ideviceinfo knows about the device. They are queried once (one lockdown handshake) and kept till
+    the end of run or till the device is detached.
+
+    :param device: device identifier, e.g. 860850006baba72f031cf22a333ba36d65239b61.
+    :param refresh: boolean, True to query values again, otherwise False.
+    :returns dict: values by key, e.g. {"ProductVersion": "9.3.1", "ProductType": "iPhone8,1"}.
+    """
+    with _info_lock:
+        info = None if refresh else _info.get(device)
+    if info is None:
+        info = plistlib.readPlistFromString(console.execute("ideviceinfo -u {0} -x".format(device)))
+        with _info_lock:
+            _info[device] = info
+    return info
+
+
+def _forget_info(event, platform, device):
+    """
+    Drops values of detached device, it may be updated or replaced before it is attached again.
+
+    :param event: string, "attach" or "detach".
+    :param platform: string, "android" or "ios".
+    :param device: device identifier, e.g. 860850006baba72f031cf22a333ba36d65239b61.
+    """
+    if event == "detach" and platform == "ios":
+        with _info_lock:
+            _info.pop(device, None)
+
+
+discovery.subscribe(_forget_info)
 
 
 def get_time(device):
     """
-    Returns current device time.
+    Returns current device time. Unlike other getters it asks idevicedate every time, as the clock goes on.
 
     :param device: device identifier (e.g. "TA9890AMTG").
+    :returns string: device time as printed by idevicedate.
+    :raises IOError: if idevicedate failed or is not installed, so the caller decides whether it's fatal.
     """
-    command = "idevicedate -u " + device
-    stdout = console.execute(command)
-    return stdout
+    try:
+        returncode, stdout, stderr = console.run(["idevicedate", "-u", device])
+    except OSError as e:
+        raise IOError("Failed to run idevicedate: {0}".format(e))
+    if returncode != 0:
+        raise IOError("Failed to read clock of device '{0}': {1}{2}".format(device, stderr, stdout))
+    return stdout.strip()
 
 
 def get_xcode_version():
@@ -79,18 +238,30 @@ def get_xcode_version():
     return console.execute("xcodebuild -version").split()[1]
 
 
-def install_app(device, path):
+def install_app(device, path=None):
     """
     Installs the application onto the given device. If not app is given, installs the very latest app from ~/Downloads.
 
     :param device: device identifier, e.g. "860850006baba72f031cf22a333ba36d65239b61".
     :param path: absolute path to .ipa file.
     """
+    path = path or find_newest_app()
     command = "ideviceinstaller -u {0} -g {1}".format(device, path)
     log.info("Installing '{0}' onto device '{1}'...".format(path, device))
     console.execute(command)
 
 
+def find_newest_app():
+    """
+    :returns string: path to the very latest .ipa file in ~/Downloads.
+    """
+    apps = glob.glob(os.path.join(constants.downloads_dir(), "*.ipa"))
+    if not apps:
+        log.error("No .ipa files found in '{0}'".format(constants.downloads_dir()))
+        sys.exit(1)
+    return max(apps, key=os.path.getctime)
+
+
 def uninstall_app(device, package):
     """
     Uninstalls given application by its package name.
@@ -102,14 +273,28 @@ def uninstall_app(device, package):
     console.execute(command)
 
 
+def uninstall_apps(device, packages):
+    """
+    Uninstalls several applications one by one, failure to uninstall one of them doesn't stop the others.
+
+    :param device: device identifier, e.g. "a4f9c477beb3096b8fbb86b58c23026d3da7756e".
+    :param packages: list, bundle identifiers, e.g. ["com.apple.calculator"].
+    :returns dict: results by bundle identifier: "uninstalled" or error message.
+    """
+    results = {}
+    for package in packages:
+        returncode, stdout, stderr = console.run(["ideviceinstaller", "-u", device, "-U", package])
+        failed = returncode != 0 or "ERROR" in stdout
+        results[package] = "failed: " + (stderr or stdout).strip() if failed else "uninstalled"
+    return results
+
+
 def get_device_model(device):
     """
     :param device: string, Device identifier.
     :returns string: Device model, e.g. "Motorola X2".
     """
-    command = "ideviceinfo -u {0} -k ProductType".format(device)
-    device_type = console.execute(command)
-    return get_product_name(device_type)
+    return get_product_name(get_info(device).get("ProductType"))
 
 
 def get_device_udid(device):
@@ -119,22 +304,20 @@ def get_device_udid(device):
     :param device: device identifier.
     :returns string: UDID.
     """
-    command = "ideviceinfo -u {0} -k UniqueDeviceID".format(device)
-    return console.execute(command)
+    return get_info(device).get("UniqueDeviceID")
 
 
 def is_app_installed(device, package):
     """
-    Verifies if the given application is installed on the device.
-    Returns all installed packages as a list.
+    Verifies if the given application is installed on the device. Installed apps are listed till the app is found.
 
     :param device: string, device identifier, e.g. "TA9890AMTG".
     :param package: string, package name, e.g. "com.android.calculator2".
     :returns boolean: True if app is installed, otherwise False.
     """
     command = "ideviceinstaller -u {0} -l".format(device)
-    stdout = console.execute(command)
-    return package in stdout
+    with closing(console.stream(command)) as lines:
+        return any(package in line for line in lines)
 
 
 def get_product_name(device_type):
@@ -144,51 +327,27 @@ def get_product_name(device_type):
     :param device_type: device type from ideviceinfo output, e.g. "iPhone4,1".
     :returns product_name: string, e.g. "iPhone 4s".
     """
-    types2names = {
-        "iPhone1,1": "iPhone",
-        "iPhone1,2": "iPhone 3G",
-        "iPhone2,1": "iPhone 3GS",
-        "iPhone3,1": "iPhone 4 (GSM)",
-        "iPhone3,3": "iPhone 4 (CDMA)",
-        "iPhone4,1": "iPhone 4S",
-        "iPhone5,1": "iPhone 5",
-        "iPhone5,2": "iPhone 5",
-        "iPhone5,3": "iPhone 5c",
-        "iPhone5,4": "iPhone 5c",
-        "iPhone6,1": "iPhone 5s",
-        "iPhone6,2": "iPhone 5s",
-        "iPhone7,1": "iPhone 6 Plus",
-        "iPhone7,2": "iPhone 6",
-        "iPhone8,1": "iPhone 6s",
-        "iPad1,1": "iPad",
-        "iPad2,1": "iPad 2 (Wi-Fi)",
-        "iPad2,2": "iPad 2 (GSM)",
-        "iPad2,3": "iPad 2 (CDMA)",
-        "iPad2,4": "iPad 2 (Wi-Fi)",
-        "iPad2,5": "iPad Mini (Wi-Fi)",
-        "iPad2,6": "iPad Mini",
-        "iPad2,7": "iPad Mini",
-        "iPad3,1": "iPad 3 (Wi-Fi)",
-        "iPad3,2": "iPad 3 (Wi-Fi+LTE Verizon)",
-        "iPad3,3": "iPad 3 (Wi-Fi+LTE AT&T)",
-        "iPad3,4": "iPad 4 (Wi-Fi)",
-        "iPad3,5": "iPad 4",
-        "iPad3,6": "iPad 4",
-        "iPad4,1": "iPad Air (Wi-Fi)",
-        "iPad4,2": "iPad Air (Wi-Fi+LTE)",
-        "iPad4,3": "iPad Air (Rev)",
-        "iPad4,4": "iPad Mini 2 (Wi-Fi)",
-        "iPad4,5": "iPad Mini 2 (Wi-Fi+LTE)",
-        "iPad4,6": "iPad Mini 2 (Rev)",
-        "iPad4,7": "iPad Mini 3 (Wi-Fi)",
-        "iPad4,8": "iPad Mini 3",
-        "iPad4,9": "iPad Mini 3",
-        "iPad5,3": "iPad Air 2 (Wi-Fi)",
-        "iPad5,4": "iPad Air 2 (Wi-Fi+LTE)",
-        "iPod1,1": "iPod Touch",
-        "iPod2,1": "iPod Touch 2",
-        "iPod3,1": "iPod Touch 3",
-        "iPod4,1": "iPod Touch 4",
-        "iPod5,1": "iPod Touch 5"
-    }
-    return types2names.get(device_type)
+    return get_product_names().get(device_type)
+
+
+def get_product_names():
+    """
+    Returns product names of iOS devices by their types. Names are shipped with MTH and can be added or overridden by
+    the same JSON file in the user configuration directory, e.g. "~/.config/mth/ios_products.json".
+
+    :returns dict: product names by device types, e.g. {"iPhone4,1": "iPhone 4S"}.
+    """
+    global _product_names
+    if _product_names is None:
+        product_names = {}
+        for path in (os.path.join(os.path.dirname(os.path.abspath(__file__)), PRODUCT_NAMES_FILE),
+                     os.path.join(constants.config_dir(), PRODUCT_NAMES_FILE)):
+            if not os.path.exists(path):
+                continue
+            with open(path) as names_file:
+                try:
+                    product_names.update(json.load(names_file))
+                except ValueError as e:
+                    log.warning("Ignoring invalid product names file '{0}': {1}".format(path, e))
+        _product_names = product_names
+    return _product_names
@@ -0,0 +1,204 @@
+"""
+This module contains a list of utilities related to Android logs captured by "logcat -v time", e.g.
+"01-15 10:11:12.345 D/ActivityManager(  123): Start proc". Logs are read in chunks and every chunk is parsed into
+columns (NumPy arrays) with vectorized operations, so large files are processed fast and with bounded memory.
+"""
+
+import numpy
+
+LEVELS = "VDIWEFA"
+ERROR_LEVELS = "EFA"
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# "MM-DD HH:MM:SS.mmm L/" prefix of every line
+PREFIX_LENGTH = 21
+
+# days before the first day of month (index is month), logcat doesn't print year, so it is not a leap one
+_DAYS_BEFORE = numpy.array([0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334], dtype=numpy.int64)
+
+
+def read_columns(log_path, chunk_size=CHUNK_SIZE):
+    """
+    Reads log in chunks and yields columns of every chunk. Lines which are not log entries (e.g. "--------- beginning
+    of main") are skipped.
+
+    :param log_path: string, path to log captured by "logcat -v time".
+    :param chunk_size: int, how many bytes to read at once.
+    :returns generator: tuples of columns and list of tag names. Columns are a dict of arrays of the same length:
+    "time" (seconds since the beginning of year), "level" (index in LEVELS), "tag" (index in tag names), "pid",
+    "offset" and "length" of message in file. The list of tag names is shared by all chunks and grows with them.
+    """
+    tags = []
+    tag_ids = {}
+    offset = 0
+    rest = ""
+    with open(log_path, "rb") as log_file:
+        while True:
+            data = log_file.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind("\n") + 1
+            if not end:
+                rest = data
+                continue
+            rest = data[end:]
+            yield _parse(data[:end], offset, tags, tag_ids), tags
+            offset += end
+        if rest:
+            yield _parse(rest + "\n", offset, tags, tag_ids), tags
+
+
+def count(log_path, chunk_size=CHUNK_SIZE):
+    """
+    Counts log entries per second, level and tag.
+
+    :param log_path: string, path to log captured by "logcat -v time".
+    :param chunk_size: int, how many bytes to read at once.
+    :returns tuple: dict of arrays "second", "level", "tag" and "count" ordered by second, list of tag names, and
+    number of parsed entries.
+    """
+    keys = numpy.empty(0, dtype=numpy.int64)
+    counts = numpy.empty(0, dtype=numpy.int64)
+    tags = []
+    entries = 0
+    for columns, tags in read_columns(log_path, chunk_size):
+        entries += len(columns["time"])
+        # second takes 25 bits, level 3 bits, tag the rest
+        chunk_keys = (columns["time"].astype(numpy.int64) << 35) | (columns["level"].astype(numpy.int64) << 32) | \
+            columns["tag"].astype(numpy.int64)
+        keys, inverse = numpy.unique(numpy.concatenate((keys, chunk_keys)), return_inverse=True)
+        counts = numpy.bincount(inverse, weights=numpy.concatenate((counts, numpy.ones(len(chunk_keys))))) \
+            .astype(numpy.int64)
+    table = {"second": keys >> 35, "level": (keys >> 32) & 7, "tag": keys & 0xFFFFFFFF, "count": counts}
+    return table, tags, entries
+
+
+def format_time(second):
+    """
+    :param second: int, seconds since the beginning of year.
+    :returns string: time as logcat prints it, e.g. "01-15 10:11:12".
+    """
+    day, second = divmod(int(second), 86400)
+    month = int(numpy.searchsorted(_DAYS_BEFORE[1:], day, side="right"))
+    return "{0:02d}-{1:02d} {2:02d}:{3:02d}:{4:02d}".format(month, day - _DAYS_BEFORE[month] + 1, second // 3600,
+                                                            second // 60 % 60, second % 60)
+
+
+def _parse(data, offset, tags, tag_ids):
+    """
+    Parses complete lines into columns.
+
+    :param data: string, lines of log, the last one ends with new line.
+    :param offset: int, offset of data in file.
+    :param tags: list, tag names, new ones are appended.
+    :param tag_ids: dict, indexes of tag names in tags.
+    :returns dict: columns, see read_columns.
+    """
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(buf == ord("\n"))
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    long_enough = ends - starts > PREFIX_LENGTH
+    starts, ends = starts[long_enough], ends[long_enough]
+    shaped = ((buf[starts + 2] == ord("-")) & (buf[starts + 5] == ord(" ")) & (buf[starts + 8] == ord(":")) &
+              (buf[starts + 11] == ord(":")) & (buf[starts + 14] == ord(".")) & (buf[starts + 20] == ord("/")))
+    starts, ends = starts[shaped], ends[shaped]
+
+    # tag ends at the first "(" after the prefix, message starts after the first "): " after tag
+    sentinel = [len(buf)]
+    opens = numpy.concatenate((numpy.flatnonzero(buf == ord("(")), sentinel))
+    opens = opens[numpy.searchsorted(opens, starts + PREFIX_LENGTH)]
+    closes = numpy.concatenate((numpy.flatnonzero((buf[:-2] == ord(")")) & (buf[1:-1] == ord(":")) &
+                                                  (buf[2:] == ord(" "))), sentinel))
+    closes = closes[numpy.searchsorted(closes, opens)]
+    level_ids = numpy.full(256, -1, dtype=numpy.int64)
+    level_ids[[ord(level) for level in LEVELS]] = numpy.arange(len(LEVELS))
+    levels = level_ids[buf[starts + 19]]
+    month = _digits(buf, starts, 0, 2)
+    valid = (opens < ends) & (closes < ends) & (levels >= 0) & (month >= 1) & (month <= 12)
+    starts, ends, opens, closes = starts[valid], ends[valid], opens[valid], closes[valid]
+    levels, month = levels[valid], month[valid]
+
+    seconds = ((_DAYS_BEFORE[month] + _digits(buf, starts, 3, 2) - 1) * 86400 + _digits(buf, starts, 6, 2) * 3600 +
+               _digits(buf, starts, 9, 2) * 60 + _digits(buf, starts, 12, 2))
+
+    tag_starts = starts + PREFIX_LENGTH
+    tag_ends = opens.copy()
+    while True:
+        spaces = (tag_ends > tag_starts) & (buf[tag_ends - 1] == ord(" "))
+        if not spaces.any():
+            break
+        tag_ends[spaces] -= 1
+    # tags are told apart by hash, the name is read once per distinct tag
+    hashes = _hash(buf, tag_starts, tag_ends)
+    unique_hashes, first, inverse = numpy.unique(hashes, return_index=True, return_inverse=True)
+    name_ids = numpy.empty(len(unique_hashes), dtype=numpy.int32)
+    for index, line in enumerate(first.tolist()):
+        name = data[tag_starts[line]:tag_ends[line]]
+        if name not in tag_ids:
+            tag_ids[name] = len(tags)
+            tags.append(name)
+        name_ids[index] = tag_ids[name]
+
+    return {
+        "time": seconds + _digits(buf, starts, 15, 3) / 1000.0,
+        "level": levels,
+        "tag": name_ids[inverse],
+        "pid": _number(buf, opens + 1, closes),
+        "offset": offset + closes + 3,
+        "length": ends - closes - 3,
+    }
+
+
+def _digits(buf, starts, position, length):
+    """
+    Reads fixed-width decimal number at the same position of every line.
+
+    :param buf: numpy.ndarray, bytes of lines.
+    :param starts: numpy.ndarray, offsets of lines.
+    :param position: int, offset of number in line.
+    :param length: int, number of digits.
+    :returns numpy.ndarray: numbers.
+    """
+    number = numpy.zeros(len(starts), dtype=numpy.int64)
+    for index in range(position, position + length):
+        number = number * 10 + buf[starts + index] - ord("0")
+    return number
+
+
+def _number(buf, starts, ends):
+    """
+    Reads decimal number padded with spaces from every span, e.g. "  123".
+
+    :param buf: numpy.ndarray, bytes of lines.
+    :param starts: numpy.ndarray, offsets of spans.
+    :param ends: numpy.ndarray, offsets right after spans.
+    :returns numpy.ndarray: numbers.
+    """
+    number = numpy.zeros(len(starts), dtype=numpy.int64)
+    lengths = ends - starts
+    for index in range(int(lengths.max()) if len(lengths) else 0):
+        active = numpy.flatnonzero(lengths > index)
+        digit = buf[starts[active] + index].astype(numpy.int64) - ord("0")
+        is_digit = (digit >= 0) & (digit <= 9)
+        number[active[is_digit]] = number[active[is_digit]] * 10 + digit[is_digit]
+    return number
+
+
+def _hash(buf, starts, ends):
+    """
+    Hashes every span of bytes.
+
+    :param buf: numpy.ndarray, bytes of lines.
+    :param starts: numpy.ndarray, offsets of spans.
+    :param ends: numpy.ndarray, offsets right after spans.
+    :returns numpy.ndarray: 64-bit hashes.
+    """
+    hashes = numpy.full(len(starts), 1469598103934665603, dtype=numpy.uint64)
+    lengths = ends - starts
+    prime = numpy.uint64(1099511628211)
+    with numpy.errstate(over="ignore"):
+        for index in range(int(lengths.max()) if len(lengths) else 0):
+            active = numpy.flatnonzero(lengths > index)
+            hashes[active] = (hashes[active] ^ buf[starts[active] + index].astype(numpy.uint64)) * prime
+    return hashes
@@ -0,0 +1,97 @@
+"""
+This module contains a list of utilities related to running functions concurrently, e.g. for several devices at once.
+"""
+
+from multiprocessing.pool import ThreadPool
+import framework.utils.console as console
+import threading
+import logging
+import time
+import sys
+
+log = logging.getLogger("mth.utils")
+
+# how long threads are waited for once they are asked to stop, seconds
+JOIN_TIMEOUT = 5.0
+
+
+class _Exit(object):
+    """
+    Result of function which called sys.exit (as console.execute does on failed commands).
+    """
+
+    def __init__(self, code):
+        self.code = code
+
+
+def imap_unordered(function, items, jobs):
+    """
+    Applies function to every item using a bounded pool of threads and yields results as soon as they are ready.
+    Exit requested by function from a worker thread is re-raised in the calling thread instead of hanging the pool.
+
+    :param function: function to call with single item.
+    :param items: list of items, e.g. devices.
+    :param jobs: int, maximum number of items processed at the same time.
+    :returns generator: results in order of completion.
+    """
+    items = list(items)
+    if not items:
+        return
+    pool = ThreadPool(max(1, min(jobs, len(items))))
+    try:
+        for result in pool.imap_unordered(lambda item: _call(function, item), items):
+            if isinstance(result, _Exit):
+                pool.terminate()
+                sys.exit(result.code)
+            yield result
+    finally:
+        pool.close()
+
+
+def run_until_stopped(function, items, duration=None, join_timeout=JOIN_TIMEOUT):
+    """
+    Runs function for every item in own thread till all of them return, the duration passes or Ctrl+C is pressed,
+    e.g. to sample several devices till the user is done. Then asks threads to stop and waits for them not longer than
+    join_timeout: a thread stuck in a device command (e.g. "adb shell" which hung) is left behind, it doesn't keep the
+    process alive as it's a daemon.
+
+    :param function: function(item, stop) to run, it must return soon after stop (threading.Event) is set.
+    :param items: list of items, e.g. devices.
+    :param duration: float, how long to run, seconds, None to run till Ctrl+C is pressed.
+    :param join_timeout: float, how long to wait for threads after they are asked to stop, seconds.
+    """
+    stop = threading.Event()
+    threads = [threading.Thread(target=function, args=(item, stop)) for item in items]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    started = time.time()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            if duration is not None and time.time() - started >= duration:
+                break
+            console.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        deadline = time.time() + join_timeout
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+        stuck = sum(1 for thread in threads if thread.is_alive())
+        if stuck:
+            log.warning("{0} threads didn't stop in {1:.0f}s, leaving them behind".format(stuck, join_timeout))
+
+
+def _call(function, item):
+    """
+    Calls function, converts exit into a result.
+
+    :param function: function to call.
+    :param item: the only argument to pass.
+    :returns: function result.
+    """
+    try:
+        return function(item)
+    except SystemExit as e:
+        return _Exit(e.code)
@@ -0,0 +1,141 @@
+"""
+This module contains a list of utilities related to querying properties of Android devices. Every property declares
+where it can be read from in priority order, and properties requested together are read by a single adb command, see
+PropertyQuery.
+"""
+
+from framework.classes.PropertyQuery import PropertyQuery, Source
+import framework.utils.transport as transport
+import uuid
+import re
+
+# several getprop calls in one round are replaced by one full "getprop" dump from this number on
+GETPROP_DUMP_THRESHOLD = 3
+
+GETPROP_REGEX = re.compile(r"^\[([^\]]+)\]: \[(.*)\]\r?$", re.MULTILINE)
+RESOLUTION_REGEX = re.compile(r"\d{3,}x\d{3,}")
+IFCONFIG_REGEX = re.compile(r"(?<=inet addr:)\d[^2]\d*\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}")
+NETCFG_REGEX = re.compile(r"(?<=wlan0\s{4}UP)\s+[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}")
+IP_ADDR_REGEX = re.compile(r"(?<=inet )(?!127\.)[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}")
+MEM_TOTAL_REGEX = re.compile(r"(?<=MemTotal:)\s+\d+(?= kB)")
+
+
+def _getprop(name, required=False):
+    """
+    :param name: string, name of system property, e.g. "ro.product.model".
+    :param required: boolean, True if empty value means there is no value, so the next source is tried.
+    :returns Source: source of property value.
+    """
+    return Source("getprop " + name, lambda output: output.strip() or (None if required else ""))
+
+
+def _regex_source(command, regex):
+    """
+    :param command: string, shell command.
+    :param regex: compiled regular expression, the first match is the value.
+    :returns Source: source of property value.
+    """
+    def parse(output):
+        matches = regex.findall(output)
+        return matches[0].strip() if matches else None
+    return Source(command, parse)
+
+
+def _parse_locale(output):
+    """
+    :param output: string, output of "getprop persist.sys.language; getprop persist.sys.country".
+    :returns string: locale, e.g. "en-US", None if it's not set.
+    """
+    parts = output.split()
+    return "-".join(parts) if len(parts) == 2 else None
+
+
+def _parse_cpu_frequency(output):
+    """
+    :param output: string, maximum CPU frequency, kHz.
+    :returns string: CPU frequency, GHz, e.g. "2.27".
+    """
+    return "{0:.2f}".format(round(float(output) / 1000000, 2)) if output.strip().isdigit() else None
+
+
+def _parse_ram_size(output):
+    """
+    :param output: string, content of /proc/meminfo.
+    :returns string: RAM size, GB, e.g. "1.90".
+    """
+    matches = MEM_TOTAL_REGEX.findall(output)
+    return "{0:.2f}".format(round(float(matches[0]) / 1000000, 2)) if matches else None
+
+
+ANDROID = {
+    "manufacturer": [_getprop("ro.product.manufacturer")],
+    "model": [_getprop("ro.product.model")],
+    "os_version": [_getprop("ro.build.version.release")],
+    "sdk_version": [_getprop("ro.build.version.sdk")],
+    "language": [_getprop("persist.sys.language")],
+    "country": [_getprop("persist.sys.country")],
+    # Android 5.0+ keeps locale in a single property
+    "locale": [Source("getprop persist.sys.language; getprop persist.sys.country", _parse_locale),
+               _getprop("persist.sys.locale", True), _getprop("ro.product.locale", True)],
+    "boot_id": [Source("cat /proc/sys/kernel/random/boot_id", lambda output: output.strip() or None),
+                _getprop("ro.build.fingerprint")],
+    "cpu_frequency": [Source("cat /sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq", _parse_cpu_frequency)],
+    "ram_size": [Source("cat /proc/meminfo", _parse_ram_size)],
+    # "dumpsys window" is heavy, it is run only on devices without "wm size"
+    "resolution": [_regex_source("wm size", RESOLUTION_REGEX), _regex_source("dumpsys window", RESOLUTION_REGEX)],
+    "ip_address": [_regex_source("ifconfig", IFCONFIG_REGEX), _regex_source("netcfg", NETCFG_REGEX),
+                   _regex_source("ip -f inet addr show wlan0", IP_ADDR_REGEX)],
+}
+
+
+def query(device):
+    """
+    Creates query of properties of the given device. Values are kept by the query, so create a new one to get fresh
+    values.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :returns PropertyQuery: query of device properties, see ANDROID for property names.
+    """
+    system_properties = {}
+    return PropertyQuery(ANDROID, lambda commands: _run(device, commands, system_properties))
+
+
+def get(device, *names):
+    """
+    Gets the given properties of device at once.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param names: strings, property names, e.g. "model", "manufacturer".
+    :returns OrderedDict: values by property name, None if there is no value.
+    """
+    return query(device).get(*names)
+
+
+def _run(device, commands, system_properties):
+    """
+    Runs shell commands on device in one adb call. Many getprop calls are replaced by a single dump of all system
+    properties, and once it is dumped, getprop calls are answered from it without running anything.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param commands: list, shell commands.
+    :param system_properties: dict, system properties dumped for the query, filled by the first dump.
+    :returns list: outputs of commands.
+    """
+    getprops = [command for command in commands if re.match(r"^getprop [\w.-]+$", command)]
+    dump = not system_properties and len(getprops) >= GETPROP_DUMP_THRESHOLD
+    batch = [command for command in commands if command not in getprops] if system_properties or dump else commands
+    batch = (["getprop"] if dump else []) + batch
+    outputs = {}
+    if batch:
+        marker = uuid.uuid4().hex
+        # errors of commands missing on device (e.g. ifconfig) are not interesting, their sources just give no value
+        script = "; ".join("({0}) 2>/dev/null; echo; echo {1}".format(command, marker) for command in batch)
+        stdout = transport.execute(device, ["shell", script])
+        sections = [section.replace("\r\n", "\n").rstrip("\n")
+                    for section in re.split(r"(?:^|\n)" + marker + r"\r?\n?", stdout)]
+        outputs.update(zip(batch, sections))
+    if dump:
+        system_properties.update(GETPROP_REGEX.findall(outputs["getprop"]))
+    if system_properties:
+        outputs.update((command, system_properties.get(command.split(" ", 1)[1], "")) for command in getprops)
+    return [outputs[command] for command in commands]
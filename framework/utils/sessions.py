@@ -0,0 +1,94 @@
+"""
+This module contains a list of utilities related to persistent shell sessions to Android devices. Sessions are off by
+default, long-running processes (e.g. MTH server) enable them so that "adb shell" commands reuse one process per device.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_sessions = {}
+_enabled = False
+
+
+def enable():
+    """
+    Enables persistent sessions, "adb [-H <host> -P <port>] -s <device> shell <command>" commands will be run in them.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Disables persistent sessions and closes all open ones.
+    """
+    global _enabled
+    _enabled = False
+    close_all()
+
+
+def is_enabled():
+    """
+    :returns boolean: True if persistent sessions are enabled, otherwise False.
+    """
+    return _enabled
+
+
+def get(device, command=None):
+    """
+    Returns persistent session to the given device, opens it if needed.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param command: list, command to start shell, by default "adb -s <device> shell".
+    :returns ShellSession: session to device.
+    """
+    # imported here, ShellSession uses console which routes commands through this module
+    from framework.classes.ShellSession import ShellSession
+    command = command or ["adb", "-s", device, "shell"]
+    with _lock:
+        session = _sessions.get(tuple(command))
+        if session is None:
+            session = ShellSession(device, command)
+            _sessions[tuple(command)] = session
+        return session
+
+
+def close(device):
+    """
+    Closes persistent sessions to the given device if they are open.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    """
+    with _lock:
+        keys = [key for key, session in _sessions.items() if session.device == device]
+        closed = [_sessions.pop(key) for key in keys]
+    for session in closed:
+        session.close()
+
+
+def close_all():
+    """
+    Closes all persistent sessions.
+    """
+    with _lock:
+        sessions = _sessions.values()
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def route(command, force=False):
+    """
+    Runs the given adb shell command in persistent session if sessions are enabled.
+
+    :param command: list, command to execute, e.g. ["adb", "-s", "TA9890AMTG", "shell", "getprop"] or
+    ["adb", "-H", "hub1", "-P", "5037", "-s", "emulator-5554", "shell", "getprop"].
+    :param force: boolean, True to run command in session even if sessions are disabled.
+    :returns tuple: exit status and output, or None if command can't be run in session.
+    """
+    if not (_enabled or force) or not command or command[0] != "adb" or "-s" not in command:
+        return None
+    serial = command.index("-s") + 1
+    if len(command) < serial + 3 or command[serial + 1] != "shell":
+        return None
+    return get(command[serial], command[:serial + 2]).run(" ".join(command[serial + 2:]))
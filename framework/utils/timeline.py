@@ -0,0 +1,224 @@
+"""
+This module contains a list of utilities related to putting logs of several devices on one timeline. Device clocks
+drift differently, so the offset of every device clock from the host clock is measured while its log is captured and
+saved next to the log ("<log>.clock.json"). Logs are merged by host time with a heap, reading every log line by line.
+"""
+
+from framework.classes.ShellSession import ShellSession
+from dateutil import parser as date_parser
+import framework.utils.transport as transport
+import framework.utils.ios as ios
+import calendar
+import datetime
+import logging
+import heapq
+import json
+import gzip
+import time
+import os
+import re
+
+log = logging.getLogger("mth.utils")
+
+CLOCK_SUFFIX = ".clock.json"
+
+# how many times device clock is read to measure its offset, the reading with the shortest round trip is used
+OFFSET_SAMPLES = 5
+
+# lines of a log may be slightly out of order (e.g. several logcat buffers), they are reordered within this window
+REORDER_WINDOW = 256
+
+# half a year, seconds: log line farther than that from the previous one belongs to the neighbouring year
+HALF_YEAR = 183 * 24 * 60 * 60
+
+LOGCAT_TIME_REGEX = re.compile(r"^(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{3}) ")
+SYSLOG_TIME_REGEX = re.compile(r"^([A-Z][a-z]{2}) +(\d{1,2}) (\d\d):(\d\d):(\d\d) ")
+DEVICE_DATE_REGEX = re.compile(r"^(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)(?:\.(\d+))?")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def measure_offset(device, platform, samples=OFFSET_SAMPLES):
+    """
+    Measures offset of device wall clock from host clock. Wall clock is the local time devices print in logs, so the
+    offset includes time zone difference too. Device clock is read several times and the reading with the shortest
+    round trip is taken, as its moment is known best. Android clock is read in one shell session, so the readings
+    don't pay for starting adb.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param platform: string, "android" or "ios".
+    :param samples: int, how many times to read device clock.
+    :returns dict: "host_time" (seconds since epoch), "offset" (seconds to subtract from device wall time to get host
+    time) and "round_trip" (seconds, the error of offset is not bigger than half of it), None if device clock can't
+    be read (e.g. device is detached or idevicedate is not installed).
+    """
+    session = ShellSession(device, transport.command(device, "shell")) if platform == "android" else None
+    best = None
+    try:
+        for _ in range(samples):
+            before = time.time()
+            try:
+                wall_time = _read_wall_time(device, platform, session)
+            except (IOError, ValueError) as e:
+                log.debug(e)
+                continue
+            after = time.time()
+            if best is None or after - before < best["round_trip"]:
+                host_time = (before + after) / 2
+                best = {"host_time": host_time, "offset": wall_time - host_time, "round_trip": after - before}
+    finally:
+        if session:
+            session.close()
+    return best
+
+
+def save_offsets(log_path, device, platform, offsets):
+    """
+    Saves clock offsets measured while log was captured next to it.
+
+    :param log_path: string, path to log.
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param platform: string, "android" or "ios".
+    :param offsets: list, offsets measured during capture, see measure_offset.
+    """
+    with open(log_path + CLOCK_SUFFIX, "w") as clock_file:
+        json.dump({"device": device, "platform": platform, "offsets": offsets}, clock_file, indent=2)
+
+
+def load_offsets(log_path):
+    """
+    :param log_path: string, path to log.
+    :returns dict: "device", "platform" and "offsets" saved for log, None if they were not saved.
+    """
+    if not os.path.exists(log_path + CLOCK_SUFFIX):
+        return None
+    with open(log_path + CLOCK_SUFFIX) as clock_file:
+        return json.load(clock_file)
+
+
+def merge(sources):
+    """
+    Merges logs into one stream ordered by host time. Only one window of lines per log is kept in memory. Lines
+    without time (e.g. continuation of multi-line message) follow the line before them.
+
+    :param sources: list, tuples of path to log, name to tag its lines with, and offsets measured during capture (see
+    measure_offset), empty list if they are unknown.
+    :returns generator: tuples of host time (seconds since epoch, None for lines before the first timed line of log),
+    name of log and line without its ending.
+    """
+    streams = [_read(path, name, offsets, index) for index, (path, name, offsets) in enumerate(sources)]
+    for host_time, _, _, name, line in heapq.merge(*streams):
+        yield (host_time if host_time > 0 else None), name, line
+
+
+def format_time(host_time):
+    """
+    :param host_time: float, seconds since epoch, or None.
+    :returns string: local host time with milliseconds, e.g. "2018-03-12 10:11:12.345".
+    """
+    if host_time is None:
+        return " " * 23
+    moment = datetime.datetime.fromtimestamp(host_time)
+    return moment.strftime("%Y-%m-%d %H:%M:%S.") + "{0:03d}".format(moment.microsecond // 1000)
+
+
+def _read_wall_time(device, platform, session=None):
+    """
+    :param device: string, device identifier.
+    :param platform: string, "android" or "ios".
+    :param session: ShellSession, shell session to Android device.
+    :returns float: current device wall time as seconds since epoch as if it were UTC.
+    """
+    if platform == "android":
+        # old devices don't support format or %N, they print the default format or "%N" as is
+        status, output = session.run("date '+%Y-%m-%d %H:%M:%S.%N'")
+        if status != 0:
+            raise IOError("Failed to read clock of device '{0}': {1}".format(device, output))
+    else:
+        output = ios.get_time(device)
+    match = DEVICE_DATE_REGEX.match(output.strip())
+    if match:
+        moment = datetime.datetime(*[int(part) for part in match.groups()[:6]])
+        fraction = float("0." + match.group(7)) if match.group(7) else 0.0
+    else:
+        moment = date_parser.parse(output, ignoretz=True)
+        fraction = moment.microsecond / 1e6
+    return calendar.timegm(moment.timetuple()) + fraction
+
+
+def _read(path, name, offsets, index):
+    """
+    Reads log line by line and yields its lines with host time, reordered within a window. Logs don't print year, so
+    every line gets the year which puts it nearest to the line before it, starting from the time of the first offset
+    measurement, or from the time log file was written last if offsets are unknown.
+
+    :param path: string, path to log, gzipped if it ends with ".gz".
+    :param name: string, name to tag lines with.
+    :param offsets: list, offsets measured during capture, if it's empty device is assumed to be in the time zone of
+    host.
+    :param index: int, index of log, it keeps order of lines with the same time from different logs stable.
+    :returns generator: tuples of host time, index, number of line, name and line, ordered by host time.
+    """
+    offsets = sorted(offsets, key=lambda offset: offset["host_time"])
+    # wall time of device at the moment offset was measured and the offset
+    points = [(offset["host_time"] + offset["offset"], offset["offset"]) for offset in offsets]
+    previous = points[0][0] if points else calendar.timegm(time.localtime(os.path.getmtime(path)))
+    year = time.gmtime(previous).tm_year
+    window = []
+    host_time = 0
+    with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as log_file:
+        for number, line in enumerate(log_file):
+            wall_time = _parse_time(line, year)
+            if wall_time is not None:
+                if abs(wall_time - previous) > HALF_YEAR:
+                    # New Year is between the lines (or line is out of order right after it)
+                    year += 1 if wall_time < previous else -1
+                    wall_time = _parse_time(line, year)
+                previous = wall_time
+                host_time = wall_time - (_interpolate(points, wall_time) if points else _local_offset(wall_time))
+            heapq.heappush(window, (host_time, index, number, name, line.rstrip("\r\n")))
+            if len(window) > REORDER_WINDOW:
+                yield heapq.heappop(window)
+    while window:
+        yield heapq.heappop(window)
+
+
+def _local_offset(wall_time):
+    """
+    :param wall_time: float, wall time as seconds since epoch as if it were UTC.
+    :returns float: offset of host time zone at the given wall time (including daylight saving), seconds.
+    """
+    return int(wall_time) - time.mktime(time.gmtime(wall_time)[:8] + (-1,))
+
+
+def _parse_time(line, year):
+    """
+    :param line: string, log line of logcat ("01-15 10:11:12.345 ...") or idevicesyslog ("Mar 12 10:11:12 ...").
+    :param year: int, year of log, logs don't print it.
+    :returns float: wall time of line as seconds since epoch as if it were UTC, None if line has no time.
+    """
+    match = LOGCAT_TIME_REGEX.match(line)
+    if match:
+        month, day, hour, minute, second, millisecond = [int(part) for part in match.groups()]
+        return calendar.timegm((year, month, day, hour, minute, second)) + millisecond / 1000.0
+    match = SYSLOG_TIME_REGEX.match(line)
+    if match and match.group(1) in MONTHS:
+        month = MONTHS.index(match.group(1)) + 1
+        day, hour, minute, second = [int(part) for part in match.groups()[1:]]
+        return calendar.timegm((year, month, day, hour, minute, second))
+    return None
+
+
+def _interpolate(points, wall_time):
+    """
+    Interpolates clock offset linearly between measurements, so drift during long capture is compensated.
+
+    :param points: list, tuples of device wall time and offset measured at it, ordered by time.
+    :param wall_time: float, device wall time.
+    :returns float: offset at the given time.
+    """
+    if wall_time <= points[0][0]:
+        return points[0][1]
+    for (start, start_offset), (end, end_offset) in zip(points, points[1:]):
+        if wall_time <= end:
+            return start_offset + (end_offset - start_offset) * (wall_time - start) / (end - start)
+    return points[-1][1]
@@ -0,0 +1,300 @@
+"""
+This module contains a list of utilities related to the way adb commands reach Android devices. Every Android helper
+runs its adb commands through this module, so devices of the local adb server, network devices ("adb connect") and
+devices of other adb servers (e.g. a device hub) are used the same way. Remote devices get persistent shell sessions,
+reconnection when their connection drops and a limit of concurrent commands per host.
+
+Remote devices and servers are configured in "adb.json" of the MTH configuration directory, e.g.:
+{"servers": ["hub1:5037"], "connect": ["192.168.1.20:5555"], "host_limit": 4, "pool": true}
+"""
+
+from framework.classes.AdbTransport import AdbTransport, TcpAdbTransport, ServerAdbTransport
+import framework.utils.constants as constants
+import framework.utils.sessions as sessions
+import framework.utils.console as console
+import subprocess
+import threading
+import logging
+import socket
+import json
+import os
+import re
+
+log = logging.getLogger("mth.utils")
+
+CONFIG_FILE = "adb.json"
+DEFAULT_HOST_LIMIT = 4
+RECONNECT_DELAY = 1.0
+SERVER_TIMEOUT = 5.0
+
+_lock = threading.Lock()
+_transports = {}
+_limits = {}
+_reconnect_locks = {}
+_config = None
+
+
+def configure(servers=None, connect=None, host_limit=None, pool=None):
+    """
+    Overrides configuration from "adb.json", e.g. to use a local fake adb server.
+
+    :param servers: list, addresses of other adb servers, e.g. ["hub1:5037"].
+    :param connect: list, addresses of network devices to connect to local adb server, e.g. ["192.168.1.20:5555"].
+    :param host_limit: int, maximum number of commands running at the same time per remote host, at least 1.
+    :param pool: boolean, True to run shell commands to remote devices in persistent sessions.
+    """
+    global _config
+    if host_limit is not None and host_limit < 1:
+        raise ValueError("host_limit must be at least 1, got {0}".format(host_limit))
+    config = dict(_get_config())
+    for key, value in (("servers", servers), ("connect", connect), ("host_limit", host_limit), ("pool", pool)):
+        if value is not None:
+            config[key] = value
+    with _lock:
+        _config = config
+        _limits.clear()
+
+
+def get(device):
+    """
+    Returns transport to the given device by its identifier: "<serial>@<host>:<port>" for device of other adb server,
+    "<host>:<port>" for network device, anything else for device of the local adb server.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :returns AdbTransport: transport to device.
+    """
+    with _lock:
+        transport = _transports.get(device)
+        if transport is None:
+            if re.match(r"^.+@[\w.-]+:\d+$", device):
+                transport = ServerAdbTransport(device)
+            elif re.match(r"^[\w.-]+:\d+$", device):
+                transport = TcpAdbTransport(device)
+            else:
+                transport = AdbTransport(device)
+            _transports[device] = transport
+        return transport
+
+
+def command(device, *arguments):
+    """
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param arguments: strings, adb arguments, e.g. "shell", "getprop".
+    :returns list: full adb command for the device, e.g. ["adb", "-s", "TA9890AMTG", "shell", "getprop"].
+    """
+    return get(device).command(*arguments)
+
+
+def execute(device, arguments, suppress_errors=False, out=subprocess.PIPE):
+    """
+    Executes adb command for the given device, see console.execute. Commands to remote devices wait for a free slot of
+    their host and are retried once after reconnection if connection to device dropped. Commands with output redirected
+    to file (e.g. logcat) run as long as the device is in use, so they are neither limited nor retried.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param arguments: string or list, adb arguments, e.g. "shell getprop ro.product.model" or
+    ["shell", "cat /proc/meminfo | grep MemTotal"].
+    :param suppress_errors: boolean, set True if you don't want to see errors in output, by default False.
+    :param out: string, optional, file path to redirect stdout to, by default stdout is returned as text.
+    :returns: stdout as string (if the file path is not given), None if command was interrupted by Ctrl+C.
+    """
+    transport = get(device)
+    full_command = transport.command(*(arguments.split() if isinstance(arguments, str) else arguments))
+    if out is not subprocess.PIPE:
+        return console.execute(full_command, suppress_errors, out)
+    try:
+        with _limit(transport):
+            result = _run(transport, full_command)
+            if result[0] != 0 and transport.reconnects and transport.is_dropped(result[1] + "\n" + result[2]):
+                log.warning("Connection to device '{0}' dropped, reconnecting...".format(device))
+                reconnect(device)
+                result = _run(transport, full_command)
+    except KeyboardInterrupt:
+        # as console.execute: the command is killed already, caller goes on (e.g. pulls recorded video)
+        return None
+    return console.check(full_command, result, suppress_errors)
+
+
+def stream(device, arguments, chunk_size=None, encoding=None, check=True):
+    """
+    Executes adb command for the given device and yields its output as it arrives, see console.stream. Output may be
+    endless (e.g. logcat), so the command is neither limited nor retried.
+
+    :param device: string, device identifier, e.g. "TA9890AMTG".
+    :param arguments: string or list, adb arguments, e.g. "shell pm list packages".
+    :param chunk_size: int, maximum size of chunk to yield raw output by, by default output is yielded line by line.
+    :param encoding: string, encoding to decode output with, by default output is not decoded.
+    :param check: boolean, True to exit if command failed.
+    :returns generator: lines or chunks of stdout.
+    """
+    full_command = command(device, *(arguments.split() if isinstance(arguments, str) else arguments))
+    return console.stream(full_command, chunk_size, encoding, check)
+
+
+def reconnect(device):
+    """
+    Restores connection to remote device. Concurrent calls for the same device reconnect it once.
+
+    :param device: string, device identifier, e.g. "192.168.1.20:5555".
+    """
+    transport = get(device)
+    with _lock:
+        reconnect_lock = _reconnect_locks.setdefault(device, threading.Lock())
+    if not reconnect_lock.acquire(False):
+        # other thread is reconnecting the device, wait till it's done
+        with reconnect_lock:
+            return
+    try:
+        sessions.close(device)
+        for reconnect_command in transport.reconnect_commands():
+            returncode, stdout, stderr = console.run(reconnect_command)
+            log.debug("'{0}': {1}{2}".format(" ".join(reconnect_command), stdout, stderr))
+        console.sleep(RECONNECT_DELAY)
+    finally:
+        reconnect_lock.release()
+
+
+def has_servers():
+    """
+    :returns boolean: True if other adb servers are configured.
+    """
+    return bool(_get_config().get("servers"))
+
+
+def list_devices():
+    """
+    Lists Android devices of the local adb server and of configured adb servers, connects configured network devices
+    which are not connected yet.
+
+    :returns list: device identifiers, e.g. ["TA9890AMTG", "192.168.1.20:5555", "emulator-5554@hub1:5037"].
+    """
+    config = _get_config()
+    devices = _list_local_devices()
+    missing = [address for address in config.get("connect", []) if address not in devices]
+    for address in missing:
+        returncode, stdout, stderr = console.run(["adb", "connect", address])
+        log.debug("'adb connect {0}': {1}{2}".format(address, stdout, stderr))
+    if missing:
+        devices = _list_local_devices()
+    for server in config.get("servers", []):
+        host, port = server.rsplit(":", 1)
+        try:
+            devices += ["{0}@{1}".format(serial, server) for serial in list_server_devices(host, int(port))]
+        except (socket.error, IOError, ValueError) as e:
+            log.warning("Failed to list devices of adb server '{0}': {1}".format(server, e))
+    return devices
+
+
+def list_server_devices(host, port):
+    """
+    Lists devices of adb server talking to it directly, so no adb client is needed (e.g. to query a fake server).
+
+    :param host: string, host of adb server.
+    :param port: int, port of adb server.
+    :returns list: serials of devices.
+    """
+    connection = socket.create_connection((host, port), SERVER_TIMEOUT)
+    try:
+        service = "host:devices"
+        connection.sendall("{0:04x}{1}".format(len(service), service))
+        status = read_exactly(connection, 4)
+        length = int(read_exactly(connection, 4), 16)
+        payload = read_exactly(connection, length)
+    finally:
+        connection.close()
+    if status != "OKAY":
+        raise IOError("adb server refused to list devices: " + payload)
+    return [line.split("\t")[0] for line in payload.split("\n") if line.strip()]
+
+
+def read_exactly(connection, size):
+    """
+    Reads exactly size bytes from socket, e.g. from adb server or usbmuxd.
+
+    :param connection: socket.socket, connected socket.
+    :param size: int, number of bytes to read.
+    :returns string: bytes read.
+    """
+    data = ""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise IOError("Connection closed")
+        data += chunk
+    return data
+
+
+def _list_local_devices():
+    """
+    :returns list: serials of devices of the local adb server.
+    """
+    stdout = console.execute("adb devices")
+    return [line.split("\t")[0] for line in stdout.split("\n")[1:] if line.strip()]
+
+
+def _run(transport, full_command):
+    """
+    Runs command, shell commands to remote devices are run in persistent sessions if pooling is configured.
+
+    :param transport: AdbTransport, transport to device.
+    :param full_command: list, adb command.
+    :returns tuple: exit status, stdout and stderr.
+    """
+    if transport.remote and _get_config().get("pool", True):
+        routed = sessions.route(full_command, True)
+        if routed:
+            return routed[0], routed[1], ""
+    return console.run(full_command)
+
+
+class _Unlimited(object):
+    """
+    Context manager which doesn't limit anything, for devices of the local adb server.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def _limit(transport):
+    """
+    :param transport: AdbTransport, transport to device.
+    :returns: context manager which holds a slot of the device host while command runs.
+    """
+    if not transport.remote:
+        return _Unlimited()
+    with _lock:
+        limit = _limits.get(transport.host)
+        if limit is None:
+            limit = threading.BoundedSemaphore(int(_get_config().get("host_limit", DEFAULT_HOST_LIMIT)))
+            _limits[transport.host] = limit
+        return limit
+
+
+def _get_config():
+    """
+    :returns dict: configuration of remote devices and servers, empty if there is no "adb.json".
+    """
+    global _config
+    if _config is None:
+        config = {}
+        path = os.path.join(constants.config_dir(), CONFIG_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path) as config_file:
+                    config = json.load(config_file)
+            except ValueError as e:
+                log.warning("Ignoring invalid '{0}': {1}".format(path, e))
+        if "host_limit" in config:
+            # a limit below 1 would block every command to remote devices forever
+            try:
+                config["host_limit"] = int(config["host_limit"])
+                if config["host_limit"] < 1:
+                    raise ValueError("must be at least 1")
+            except (TypeError, ValueError) as e:
+                log.warning("Ignoring invalid host_limit {0!r} in '{1}': {2}".format(config.pop("host_limit"), path, e))
+        _config = config
+    return _config